@@ -0,0 +1,105 @@
+"""Streaming diff stats parser benchmark.
+
+Builds synthetic git diffs of increasing size (modified, added, renamed and
+binary files with several hunks each), feeds them to the parser in 64 KB
+chunks as a streamed response would, and reports throughput and the peak
+memory allocated while parsing. Throughput should stay flat and peak memory
+should grow with the number of files, not with the size of the diff.
+
+    python benchmarks/diff_stats.py
+    python benchmarks/diff_stats.py --mb 1 4 16 64
+"""
+import os
+import sys
+import time
+import json
+import argparse
+import statistics
+import tracemalloc
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.diff_stats import DEFAULT_CHUNK_SIZE, diff_stats
+
+LINE = 'the quick brown fox jumps over the lazy dog in the design review'
+
+
+def file_diff(index):
+    name = f'src/module_{index}/file_{index}.py'
+    kind = index % 10
+    if kind == 8:
+        return f'diff --git a/{name} b/{name}\nindex 1111111..2222222 100644\nBinary files a/{name} and b/{name} differ\n'
+    if kind == 9:
+        header = (f'diff --git a/{name} b/{name}.new\nsimilarity index 92%\nrename from {name}\nrename to {name}.new\n'
+                  f'--- a/{name}\n+++ b/{name}.new\n')
+    else:
+        header = f'diff --git a/{name} b/{name}\nindex 1111111..2222222 100644\n--- a/{name}\n+++ b/{name}\n'
+    hunks = []
+    for hunk in range(4):
+        start = hunk * 100 + 1
+        body = [f' {LINE} {i}' for i in range(3)] + [f'-{LINE} old {i}' for i in range(6)] \
+            + [f'+{LINE} new {i}' for i in range(8)] + [f' {LINE} {i}' for i in range(3)]
+        hunks.append(f'@@ -{start},12 +{start},14 @@ def function_{hunk}():\n' + '\n'.join(body) + '\n')
+    return header + ''.join(hunks)
+
+
+def synthetic_diff(megabytes):
+    parts = []
+    size = 0
+    index = 0
+    while size < megabytes * 1e6:
+        part = file_diff(index)
+        parts.append(part)
+        size += len(part)
+        index += 1
+    return ''.join(parts).encode('utf-8')
+
+
+def chunks(data):
+    for start in range(0, len(data), DEFAULT_CHUNK_SIZE):
+        yield data[start:start + DEFAULT_CHUNK_SIZE]
+
+
+def measure(megabytes, runs):
+    data = synthetic_diff(megabytes)
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = diff_stats(chunks(data))
+        samples.append(time.perf_counter() - start)
+    tracemalloc.start()
+    diff_stats(chunks(data))
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    elapsed = statistics.median(samples)
+    return {
+        'input_mb': len(data) / 1e6,
+        'files': result['totals']['files'],
+        'lines': data.count(b'\n'),
+        'ms': elapsed * 1000,
+        'mb_per_s': len(data) / 1e6 / elapsed,
+        'peak_kb': peak / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure the streaming diff stats parser on synthetic diffs')
+    parser.add_argument('--mb', type=float, nargs='+', default=[1, 4, 16, 64],
+                        help='Diff sizes in megabytes (default: 1 4 16 64)')
+    parser.add_argument('--runs', type=int, default=3, help='Runs per size (default: 3)')
+    parser.add_argument('--json', action='store_true', help='Print the raw report as JSON')
+    args = parser.parse_args()
+
+    reports = [measure(megabytes, args.runs) for megabytes in args.mb]
+    if args.json:
+        print(json.dumps(reports, indent=2))
+        return
+
+    print(f"{'input MB':>10}{'files':>9}{'lines':>11}{'ms':>10}{'MB/s':>8}{'peak KB':>10}")
+    for report in reports:
+        print(f"{report['input_mb']:>10.1f}{report['files']:>9}{report['lines']:>11}"
+              f"{report['ms']:>10.1f}{report['mb_per_s']:>8.1f}{report['peak_kb']:>10.0f}")
+
+
+if __name__ == '__main__':
+    main()
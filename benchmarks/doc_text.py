@@ -0,0 +1,90 @@
+"""Google Doc text extraction benchmark.
+
+Builds synthetic Docs API document JSON of increasing size (paragraphs,
+headings, nested lists and tables, about 40 structural elements per page),
+and times the text extraction alone, without any request. The time per page
+should stay flat as the document grows.
+
+    python benchmarks/doc_text.py
+    python benchmarks/doc_text.py --pages 100 200 400 800 --structured
+"""
+import os
+import sys
+import time
+import json
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.google_doc_reader import GoogleDocReader
+
+SENTENCE = 'The quick brown fox jumps over the lazy dog while the design review drags on. '
+
+
+def paragraph(text, style=None, bullet=None):
+    result = {'elements': [{'textRun': {'content': text[:len(text) // 2]}}, {'textRun': {'content': text[len(text) // 2:]}}]}
+    if style:
+        result['paragraphStyle'] = {'namedStyleType': style}
+    if bullet is not None:
+        result['bullet'] = {'listId': 'list', 'nestingLevel': bullet}
+    return {'paragraph': result}
+
+
+def table(rows, columns):
+    return {'table': {'tableRows': [
+        {'tableCells': [{'content': [paragraph(f'cell {row}.{column}\n')]} for column in range(columns)]}
+        for row in range(rows)
+    ]}}
+
+
+def synthetic_document(pages):
+    content = [{'sectionBreak': {}}]
+    for page in range(pages):
+        content.append(paragraph(f'Section {page}\n', style='HEADING_2'))
+        content.extend(paragraph(SENTENCE * 6 + '\n') for _ in range(20))
+        content.extend(paragraph(f'item {i}\n', bullet=i % 3) for i in range(12))
+        content.append(table(5, 4))
+    return {'title': 'Synthetic', 'body': {'content': content}}
+
+
+def measure(pages, structured, runs):
+    document = synthetic_document(pages)
+    reader = GoogleDocReader()
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        info = reader._document_info(document, structured)
+        samples.append(time.perf_counter() - start)
+    elapsed = statistics.median(samples)
+    return {
+        'pages': pages,
+        'input_mb': len(json.dumps(document)) / 1e6,
+        'output_chars': len(info['content']),
+        'ms': elapsed * 1000,
+        'ms_per_page': elapsed * 1000 / pages,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure Google Doc text extraction on synthetic documents')
+    parser.add_argument('--pages', type=int, nargs='+', default=[50, 100, 200, 400, 800],
+                        help='Document sizes in pages (default: 50 100 200 400 800)')
+    parser.add_argument('--structured', action='store_true', help='Also build structured blocks')
+    parser.add_argument('--runs', type=int, default=5, help='Runs per size (default: 5)')
+    parser.add_argument('--json', action='store_true', help='Print the raw report as JSON')
+    args = parser.parse_args()
+
+    reports = [measure(pages, args.structured, args.runs) for pages in args.pages]
+    if args.json:
+        print(json.dumps(reports, indent=2))
+        return
+
+    print(f"{'pages':>8}{'input MB':>10}{'chars':>12}{'ms':>10}{'ms/page':>10}")
+    for report in reports:
+        print(f"{report['pages']:>8}{report['input_mb']:>10.1f}{report['output_chars']:>12}"
+              f"{report['ms']:>10.1f}{report['ms_per_page']:>10.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+"""Full-text index benchmark.
+
+Builds a corpus of synthetic Jira tickets, Confluence pages and PRs of a few
+hundred words each, drawn from a Zipf-distributed vocabulary. It indexes the
+corpus into a fresh SQLite FTS5 index in batches (as --crawl or a large -b
+run would) and one document per transaction (as single reads do), then
+indexes it again unchanged, which should only cost the digest comparison. Reports documents per second for each, the index
+size, and the median and 95th percentile latency of a mix of queries.
+
+    python benchmarks/search_index.py
+    python benchmarks/search_index.py --docs 10000 50000 --queries 200
+"""
+import os
+import sys
+import time
+import json
+import random
+import argparse
+import tempfile
+import statistics
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.records import Record
+from src.search_index import SearchIndex
+
+COMMON = ('deploy rollout service timeout login session cache index query schema migration rollback latency '
+          'dashboard alert incident customer billing invoice export import retry queue worker scheduler token '
+          'permission audit release branch review design runbook outage database replica shard backup restore '
+          'config flag experiment metric trace log error warning fix bug feature test coverage build pipeline').split()
+SYLLABLES = ('ka', 'lo', 'mi', 'ner', 'sto', 'vu', 'pra', 'den', 'qui', 'tal', 'bes', 'ro', 'fen', 'gul', 'hax')
+# Word frequencies follow Zipf's law, as in real text: a few words are everywhere, most are rare
+VOCABULARY = COMMON + [a + b + c for a in SYLLABLES for b in SYLLABLES for c in SYLLABLES]
+CUMULATIVE_WEIGHTS = []
+for rank in range(len(VOCABULARY)):
+    CUMULATIVE_WEIGHTS.append((CUMULATIVE_WEIGHTS[-1] if CUMULATIVE_WEIGHTS else 0) + 1 / (rank + 1))
+QUERIES = ('timeout', 'login session', 'rollback migration', 'PROJ-1234', 'replica restore backup', 'kaloner',
+           'billing invoice export', 'stovupra denqui')
+
+
+def text(rng, words):
+    return ' '.join(rng.choices(VOCABULARY, cum_weights=CUMULATIVE_WEIGHTS, k=words))
+
+
+def corpus(count, seed=0):
+    rng = random.Random(seed)
+    records = []
+    for i in range(count):
+        kind = i % 3
+        if kind == 0:
+            records.append(Record('jira', f'PROJ-{i}', text(rng, 6), text(rng, 150),
+                                  [text(rng, 40) for _ in range(3)]))
+        elif kind == 1:
+            records.append(Record('confluence', str(i), text(rng, 4), text(rng, 600),
+                                  url=f'https://x.atlassian.net/wiki/spaces/ENG/pages/{i}'))
+        else:
+            records.append(Record('github', f'owner/repo#{i}', text(rng, 8), f'Fixes PROJ-{i - 2}. ' + text(rng, 80),
+                                  [text(rng, 30) for _ in range(5)]))
+    return records
+
+
+def measure(count, batch, queries):
+    records = corpus(count)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'index.sqlite')
+        index = SearchIndex(path)
+        start = time.perf_counter()
+        for offset in range(0, count, batch):
+            index.add_records(records[offset:offset + batch])
+        batched = time.perf_counter() - start
+
+        start = time.perf_counter()
+        unchanged = sum(index.add_records(records[offset:offset + batch]) for offset in range(0, count, batch))
+        reindexed = time.perf_counter() - start
+        assert unchanged == 0
+
+        single_count = min(count, 2000)
+        single = SearchIndex(os.path.join(directory, 'single.sqlite'))
+        start = time.perf_counter()
+        for record in records[:single_count]:
+            single.add_records([record])
+        one_by_one = time.perf_counter() - start
+        single.close()
+
+        samples = []
+        for i in range(queries):
+            query = QUERIES[i % len(QUERIES)]
+            start = time.perf_counter()
+            index.search(query, sources=['jira'] if i % 4 == 0 else None)
+            samples.append(time.perf_counter() - start)
+        index.close()
+        size = os.path.getsize(path) + (os.path.getsize(path + '-wal') if os.path.exists(path + '-wal') else 0)
+
+    samples.sort()
+    return {
+        'docs': count,
+        'batched_docs_per_s': count / batched,
+        'single_docs_per_s': single_count / one_by_one,
+        'unchanged_docs_per_s': count / reindexed,
+        'index_mb': size / 1e6,
+        'query_median_ms': statistics.median(samples) * 1000,
+        'query_p95_ms': samples[int(len(samples) * 0.95) - 1] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure indexing throughput and query latency of the full-text index')
+    parser.add_argument('--docs', type=int, nargs='+', default=[10000, 50000],
+                        help='Corpus sizes in documents (default: 10000 50000)')
+    parser.add_argument('--batch', type=int, default=500, help='Documents per transaction when batching (default: 500)')
+    parser.add_argument('--queries', type=int, default=200, help='Queries timed per corpus (default: 200)')
+    parser.add_argument('--json', action='store_true', help='Print the raw report as JSON')
+    args = parser.parse_args()
+
+    reports = [measure(count, args.batch, args.queries) for count in args.docs]
+    if args.json:
+        print(json.dumps(reports, indent=2))
+        return
+
+    print(f"{'docs':>8}{'batched/s':>11}{'single/s':>10}{'unchanged/s':>13}{'MB':>8}{'query ms':>10}{'p95 ms':>8}")
+    for report in reports:
+        print(f"{report['docs']:>8}{report['batched_docs_per_s']:>11.0f}{report['single_docs_per_s']:>10.0f}"
+              f"{report['unchanged_docs_per_s']:>13.0f}{report['index_mb']:>8.1f}"
+              f"{report['query_median_ms']:>10.2f}{report['query_p95_ms']:>8.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""Startup benchmark for the multi-source-reader CLI.
+
+For each source, a fresh interpreter runs under `python -X importtime` and
+times importing the CLI, building that source's reader and (when a reference
+is given) the first read. The report lists the median of each phase over
+several runs and the heaviest imports of the last run.
+
+    python benchmarks/startup.py
+    python benchmarks/startup.py --jira PROJ-123 --github https://github.com/owner/repo/pull/1 --runs 10
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+SOURCES = ('github', 'google', 'jira', 'confluence')
+
+CHILD = """
+import json, sys, time
+start = time.perf_counter()
+import src.main
+from src.sources import SourceReaders
+src.main.load_environment()
+cli_ready = time.perf_counter()
+readers = SourceReaders()
+readers.get({source!r})
+reader_ready = time.perf_counter()
+first_read = None
+if {ref!r}:
+    readers.read({source!r}, {ref!r})
+    first_read = (time.perf_counter() - reader_ready) * 1000
+print(json.dumps({{
+    'cli_import_ms': (cli_ready - start) * 1000,
+    'reader_ms': (reader_ready - cli_ready) * 1000,
+    'first_read_ms': first_read,
+}}))
+"""
+
+
+def parse_importtime(stderr):
+    """Return (total_ms, [(module, cumulative_ms)]) for the top-level imports in an -X importtime log."""
+    top_level = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # Nested imports are indented below the module that triggered them
+        if not name[1:].startswith(' '):
+            top_level.append((name.strip(), int(cumulative) / 1000))
+    return sum(ms for _, ms in top_level), sorted(top_level, key=lambda item: -item[1])
+
+
+def run_once(source, ref):
+    code = CHILD.format(source=source, ref=ref)
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                          cwd=ROOT, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"{source} run failed:\n{proc.stderr[-2000:]}")
+    timings = json.loads(proc.stdout.strip().splitlines()[-1])
+    timings['import_ms'], timings['top_imports'] = parse_importtime(proc.stderr)
+    return timings
+
+
+def benchmark(source, ref, runs):
+    samples = [run_once(source, ref) for _ in range(runs)]
+    report = {'source': source, 'runs': runs}
+    for phase in ('import_ms', 'cli_import_ms', 'reader_ms', 'first_read_ms'):
+        values = [sample[phase] for sample in samples if sample[phase] is not None]
+        report[phase] = statistics.median(values) if values else None
+    report['top_imports'] = samples[-1]['top_imports'][:5]
+    return report
+
+
+def format_ms(value):
+    return '-' if value is None else f"{value:8.1f}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure import and first-request latency per source')
+    for source in SOURCES:
+        parser.add_argument(f'--{source}', metavar='REF', help=f'Also time a first read of this {source} reference')
+    parser.add_argument('--runs', type=int, default=5, help='Runs per source (default: 5)')
+    parser.add_argument('--json', action='store_true', help='Print the raw report as JSON')
+    args = parser.parse_args()
+
+    reports = [benchmark(source, getattr(args, source), args.runs) for source in SOURCES]
+    if args.json:
+        print(json.dumps(reports, indent=2))
+        return
+
+    print(f"{'source':<12}{'imports ms':>12}{'cli ms':>10}{'reader ms':>12}{'first read ms':>15}")
+    for report in reports:
+        print(f"{report['source']:<12}{format_ms(report['import_ms']):>12}{format_ms(report['cli_import_ms']):>10}"
+              f"{format_ms(report['reader_ms']):>12}{format_ms(report['first_read_ms']):>15}")
+    for report in reports:
+        heaviest = ', '.join(f"{name} {ms:.0f}ms" for name, ms in report['top_imports'])
+        print(f"  {report['source']}: {heaviest}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+"""Confluence storage format converter benchmark.
+
+Builds a corpus of synthetic pages of increasing size from the kinds of
+content real pages mix (headings, formatted paragraphs with links and
+mentions, nested lists, task lists, tables, code and info macros), converts
+each to text and to Markdown feeding 64 KB chunks, and reports throughput
+and the peak memory allocated while converting, excluding the output. Peak
+memory should stay flat as pages grow, since only the current line, table
+row or code line is held.
+
+    python benchmarks/storage_format.py
+    python benchmarks/storage_format.py --kb 16 256 4096 16384
+"""
+import os
+import sys
+import time
+import json
+import argparse
+import statistics
+import tracemalloc
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.storage_format import DEFAULT_CHUNK_SIZE, StorageConverter
+
+SENTENCE = ('The <strong>rollout</strong> of the <em>new</em> service depends on '
+            '<a href="https://example.com/design">the design</a> agreed with '
+            '<ac:link><ri:user ri:account-id="5b10ac8d82e05b22cc7d4ef5" /></ac:link> &amp; the on-call team.')
+
+
+def section(index):
+    kind = index % 6
+    heading = f'<h2>Section {index}</h2>'
+    if kind == 0:
+        body = ''.join(f'<p>{SENTENCE} {SENTENCE}</p>' for _ in range(4))
+    elif kind == 1:
+        body = '<ul>' + ''.join(f'<li>{SENTENCE}<ul><li>detail {i}</li><li>detail <code>x{i}</code></li></ul></li>'
+                                for i in range(6)) + '</ul>'
+    elif kind == 2:
+        rows = ''.join(f'<tr><td><p>service-{i}</p></td><td>{i * 3}</td><td>{SENTENCE}</td></tr>' for i in range(12))
+        body = f'<table><tbody><tr><th>Name</th><th>Count</th><th>Notes</th></tr>{rows}</tbody></table>'
+    elif kind == 3:
+        code = '\n'.join(f'    result_{i} = compute(values[{i}]) if values[{i}] < limit else None' for i in range(30))
+        body = ('<ac:structured-macro ac:name="code"><ac:parameter ac:name="language">python</ac:parameter>'
+                f'<ac:plain-text-body><![CDATA[def run(values, limit):\n{code}\n]]></ac:plain-text-body>'
+                '</ac:structured-macro>')
+    elif kind == 4:
+        body = ('<ac:structured-macro ac:name="info"><ac:rich-text-body>'
+                f'<p>{SENTENCE}</p><p>{SENTENCE}</p></ac:rich-text-body></ac:structured-macro>')
+    else:
+        body = '<ac:task-list>' + ''.join(
+            f'<ac:task><ac:task-id>{i}</ac:task-id><ac:task-status>{"complete" if i % 2 else "incomplete"}'
+            f'</ac:task-status><ac:task-body>follow up {i} with {SENTENCE}</ac:task-body></ac:task>'
+            for i in range(8)) + '</ac:task-list>'
+    return heading + body
+
+
+def synthetic_page(kilobytes):
+    parts = []
+    size = 0
+    index = 0
+    while size < kilobytes * 1000:
+        part = section(index)
+        parts.append(part)
+        size += len(part)
+        index += 1
+    return ''.join(parts)
+
+
+def convert(page, markdown):
+    """Convert `page` in 64 KB chunks, discarding the output as a writer would; returns its length."""
+    converter = StorageConverter(markdown)
+    written = 0
+    for start in range(0, len(page), DEFAULT_CHUNK_SIZE):
+        converter.feed(page[start:start + DEFAULT_CHUNK_SIZE])
+        written += len(converter.drain())
+    converter.close()
+    return written + len(converter.drain())
+
+
+def measure(kilobytes, content_format, runs):
+    page = synthetic_page(kilobytes)
+    markdown = content_format == 'markdown'
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        output = convert(page, markdown)
+        samples.append(time.perf_counter() - start)
+    tracemalloc.start()
+    convert(page, markdown)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    elapsed = statistics.median(samples)
+    return {
+        'format': content_format,
+        'input_kb': len(page) / 1000,
+        'output_kb': output / 1000,
+        'ms': elapsed * 1000,
+        'mb_per_s': len(page) / 1e6 / elapsed,
+        'peak_kb': peak / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure the storage format converter on synthetic Confluence pages')
+    parser.add_argument('--kb', type=float, nargs='+', default=[16, 256, 4096, 16384],
+                        help='Page sizes in kilobytes (default: 16 256 4096 16384)')
+    parser.add_argument('--format', dest='formats', choices=['text', 'markdown'], action='append',
+                        help='Output format to measure (repeatable; default: both)')
+    parser.add_argument('--runs', type=int, default=3, help='Runs per page (default: 3)')
+    parser.add_argument('--json', action='store_true', help='Print the raw report as JSON')
+    args = parser.parse_args()
+
+    reports = [measure(kilobytes, content_format, args.runs)
+               for content_format in args.formats or ['text', 'markdown'] for kilobytes in args.kb]
+    if args.json:
+        print(json.dumps(reports, indent=2))
+        return
+
+    print(f"{'format':>10}{'input KB':>11}{'output KB':>11}{'ms':>10}{'MB/s':>8}{'peak KB':>10}")
+    for report in reports:
+        print(f"{report['format']:>10}{report['input_kb']:>11.0f}{report['output_kb']:>11.0f}"
+              f"{report['ms']:>10.1f}{report['mb_per_s']:>8.1f}{report['peak_kb']:>10.0f}")
+
+
+if __name__ == '__main__':
+    main()
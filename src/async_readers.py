@@ -0,0 +1,66 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from src.sources import SourceReaders
+
+DEFAULT_MAX_CONNECTIONS = 64
+
+
+class AsyncReaders:
+    """asyncio interface over the readers.
+
+    The underlying clients (PyGithub, jira, atlassian, googleapiclient) are
+    synchronous, so each read runs on a shared executor. Every client is built
+    once with a keep-alive connection pool per host sized to
+    `max_connections`, which is also the number of reads kept in flight.
+    """
+
+    def __init__(self, max_connections=DEFAULT_MAX_CONNECTIONS, readers=None, **reader_options):
+        self.max_connections = max_connections
+        self.readers = readers or SourceReaders(max_connections=max_connections, **reader_options)
+        self._executor = ThreadPoolExecutor(max_workers=max_connections, thread_name_prefix='async-read')
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+    async def _run(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+    async def read(self, source, ref):
+        return await self._run(self.readers.read, source, ref)
+
+    async def read_many(self, refs):
+        """Read (source, ref) pairs concurrently; failed reads come back as their exception."""
+        return await asyncio.gather(*(self.read(source, ref) for source, ref in refs), return_exceptions=True)
+
+    def _call(self, source, method, *args, **kwargs):
+        # Runs on the executor, so building a reader never blocks the event loop
+        return getattr(self.readers.get(source), method)(*args, **kwargs)
+
+    async def read_pr_by_url(self, url, **kwargs):
+        return await self._run(self._call, 'github', 'read_pr_by_url', url, **kwargs)
+
+    async def read_pr_by_title(self, title, **kwargs):
+        return await self._run(self._call, 'github', 'read_pr_by_title', title, **kwargs)
+
+    async def read_ticket(self, ticket_key):
+        return await self._run(self._call, 'jira', 'read_ticket', ticket_key)
+
+    async def read_confluence_page_by_url(self, url):
+        return await self._run(self._call, 'confluence', 'read_confluence_page_by_url', url)
+
+    async def read_document(self, url, **kwargs):
+        return await self._run(self._call, 'google', 'read_document', url, **kwargs)
+
+    async def read_sheet(self, url, **kwargs):
+        return await self._run(self._call, 'google', 'read_sheet', url, **kwargs)
+
+    async def read_sheet_ranges(self, url, ranges, **kwargs):
+        return await self._run(self._call, 'google', 'read_sheet_ranges', url, ranges, **kwargs)
@@ -0,0 +1,134 @@
+import sys
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from src.sources import SOURCES, detect_source
+from src.output import write_ndjson
+from src.rate_limit import BATCH, request_priority
+
+DEFAULT_WORKERS = 16
+DEFAULT_SOURCE_LIMITS = {
+    'github': 8,
+    # Google reads share one reader, but each request checks out its own httplib2 client from the reader's pool
+    'google': 4,
+    'jira': 8,
+    'confluence': 8,
+}
+
+
+def read_manifest(path):
+    if path == '-':
+        return parse_manifest(sys.stdin.read())
+    with open(path, 'r') as f:
+        text = f.read()
+    fmt = None
+    if path.endswith('.json'):
+        fmt = 'json'
+    elif path.endswith(('.yaml', '.yml')):
+        fmt = 'yaml'
+    return parse_manifest(text, fmt)
+
+
+def parse_manifest(text, fmt=None):
+    """Parse a manifest into a list of (source, ref) pairs.
+
+    A manifest is either a JSON/YAML list (optionally under a `sources` key)
+    or plain text with one reference per line. Entries are a bare reference,
+    `{"source": ..., "ref": ...}` or `{<source>: <ref>}`; bare references are
+    either prefixed with `<source>:` or have their source detected.
+    """
+    stripped = text.lstrip()
+    if fmt is None:
+        if stripped.startswith(('[', '{')):
+            fmt = 'json'
+        elif stripped.startswith(('- ', 'sources:')):
+            fmt = 'yaml'
+        else:
+            fmt = 'lines'
+
+    if fmt == 'json':
+        entries = json.loads(text)
+    elif fmt == 'yaml':
+        try:
+            import yaml
+        except ImportError:
+            raise RuntimeError("Reading YAML manifests requires PyYAML (pip install pyyaml)")
+        entries = yaml.safe_load(text)
+    else:
+        entries = [line.strip() for line in text.splitlines()]
+        entries = [line for line in entries if line and not line.startswith('#')]
+
+    if isinstance(entries, dict):
+        entries = entries.get('sources', [])
+    if not isinstance(entries, list):
+        raise ValueError("Manifest must be a list of references")
+    return [_parse_entry(entry) for entry in entries]
+
+
+def _parse_entry(entry):
+    if isinstance(entry, dict):
+        if 'ref' in entry:
+            source = entry.get('source') or detect_source(entry['ref'])
+            ref = entry['ref']
+        elif len(entry) == 1:
+            source, ref = next(iter(entry.items()))
+        else:
+            raise ValueError(f"Invalid manifest entry: {entry}")
+    else:
+        ref = str(entry)
+        prefix, sep, rest = ref.partition(':')
+        if sep and prefix in SOURCES:
+            source, ref = prefix, rest.strip()
+        else:
+            source = detect_source(ref)
+    if source not in SOURCES:
+        raise ValueError(f"Unknown source in manifest entry: {entry}")
+    return source, ref
+
+
+def run_batch(entries, readers, workers=DEFAULT_WORKERS, source_limits=None, write=write_ndjson, read=None):
+    """Read every entry concurrently and write one record per entry as it finishes.
+
+    Each source gets its own pool sized to its concurrency limit, and a shared
+    semaphore caps the total number of reads in flight at `workers`. `read`
+    replaces `readers.read(source, ref)` for each entry.
+    Returns the number of entries that failed.
+    """
+    limits = dict(DEFAULT_SOURCE_LIMITS)
+    limits.update(source_limits or {})
+    in_flight = threading.BoundedSemaphore(workers)
+    read_entry = read or readers.read
+
+    def read_one(index, source, ref):
+        record = {'index': index, 'source': source, 'ref': ref}
+        # Batch reads yield to interactive requests sharing the same rate limits
+        with in_flight, request_priority(BATCH):
+            try:
+                record['result'] = read_entry(source, ref)
+            except Exception as e:
+                record['error'] = str(e)
+        return record
+
+    pools = {}
+    futures = []
+    try:
+        for index, (source, ref) in enumerate(entries):
+            if source not in pools:
+                pools[source] = ThreadPoolExecutor(
+                    max_workers=max(1, min(limits.get(source, workers), workers)),
+                    thread_name_prefix=f"batch-{source}"
+                )
+            futures.append(pools[source].submit(read_one, index, source, ref))
+
+        failures = 0
+        for future in as_completed(futures):
+            record = future.result()
+            if 'error' in record:
+                failures += 1
+            write(record)
+        return failures
+    finally:
+        for future in futures:
+            future.cancel()
+        for pool in pools.values():
+            pool.shutdown(wait=False)
@@ -0,0 +1,144 @@
+import os
+import json
+import time
+import hashlib
+import tempfile
+import threading
+from src.metrics import metrics
+
+DEFAULT_TTL = 300
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+def default_cache_dir():
+    return os.path.join(os.path.expanduser('~'), '.multi-source-reader', 'cache')
+
+
+class ResponseCache:
+    """Size-bounded on-disk cache shared by all readers.
+
+    Entries are keyed by `<source>:<id>` and stored one JSON file each. An
+    entry younger than `ttl` seconds is served as is. An older one is
+    revalidated against the backend with a cheap conditional or metadata call
+    when the reader provides one. If the backend cannot be reached, entries
+    are served up to `max_stale` seconds past their TTL. The least recently
+    used entries are evicted once the cache grows beyond `max_bytes`.
+    """
+
+    def __init__(self, cache_dir=None, ttl=DEFAULT_TTL, max_bytes=DEFAULT_MAX_BYTES, max_stale=0):
+        self.cache_dir = cache_dir or default_cache_dir()
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.max_stale = max_stale
+        self._size = None
+        self._lock = threading.Lock()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, hashlib.sha256(key.encode('utf-8')).hexdigest() + '.json')
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'r') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry.get('key') != key:
+            return None
+        try:
+            # The file's mtime doubles as its last-use time for LRU eviction
+            os.utime(path)
+        except OSError:
+            pass
+        return entry
+
+    def set(self, key, value, validator=None):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        data = json.dumps({'key': key, 'stored_at': time.time(), 'validator': validator, 'value': value})
+        path = self._path(key)
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        with self._lock:
+            if self._size is not None:
+                self._size += len(data)
+            self._evict()
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def _entries(self):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith('.json'):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def _evict(self):
+        if self._size is not None and self._size <= self.max_bytes:
+            return
+        entries = self._entries()
+        self._size = sum(size for _, size, _ in entries)
+        if self._size <= self.max_bytes:
+            return
+        # Evict down to 90% so that every write after the limit does not rescan the directory
+        for _, size, path in sorted(entries):
+            if self._size <= self.max_bytes * 0.9:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            self._size -= size
+
+    def fetch(self, key, fetch, revalidate=None, should_store=None):
+        """Return the value cached under `key`, going to the backend only when needed.
+
+        `fetch()` returns `(value, validator)`. `revalidate(validator)` returns
+        True when the backend object is unchanged. Values for which
+        `should_store(value)` is false are returned but not cached.
+        """
+        entry = self.get(key)
+        if entry is None:
+            metrics.count('cache_misses')
+            return self._fetch_and_store(key, fetch, should_store)
+
+        age = time.time() - entry['stored_at']
+        if age <= self.ttl:
+            metrics.count('cache_hits')
+            return entry['value']
+
+        try:
+            if revalidate is not None and entry.get('validator') is not None:
+                if revalidate(entry['validator']):
+                    metrics.count('cache_revalidated')
+                    self.set(key, entry['value'], entry['validator'])
+                    return entry['value']
+            metrics.count('cache_misses')
+            return self._fetch_and_store(key, fetch, should_store)
+        except Exception:
+            if age <= self.ttl + self.max_stale:
+                metrics.count('cache_stale')
+                return entry['value']
+            raise
+
+    def _fetch_and_store(self, key, fetch, should_store):
+        value, validator = fetch()
+        if should_store is None or should_store(value):
+            self.set(key, value, validator)
+        return value
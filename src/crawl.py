@@ -0,0 +1,92 @@
+import os
+import re
+import json
+import tempfile
+
+
+def default_checkpoint_path(target):
+    name = re.sub(r'[^A-Za-z0-9._-]+', '_', target).strip('_')[:100] or 'crawl'
+    return os.path.join(os.path.expanduser('~'), '.multi-source-reader', 'crawl', name + '.json')
+
+
+class CrawlCheckpoint:
+    """Where an interrupted crawl resumes, kept in a JSON file.
+
+    It holds the crawl's query and content format, the link to the first
+    listing page that is not finished yet and the ids of the pages already
+    written from it. The ids of pages that could not be read are kept until
+    a later run reads them, along with whether the listing was walked to the
+    end. A checkpoint for a different query or format is ignored, and a crawl
+    that finishes without failed pages removes its checkpoint.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.query = None
+        self.content_format = None
+        self.next = None
+        self.done = set()
+        self.failed = set()
+        self.listed = False
+        self.count = 0
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r') as f:
+                    data = json.load(f)
+                self.query = data.get('query')
+                self.content_format = data.get('content_format')
+                self.next = data.get('next')
+                self.done = set(data.get('done', []))
+                self.failed = set(data.get('failed', []))
+                self.listed = data.get('listed', False)
+                self.count = data.get('count', 0)
+            except (OSError, ValueError):
+                # A corrupt checkpoint just means the crawl starts over
+                pass
+
+    @property
+    def resumed(self):
+        return self.next is not None or bool(self.done) or bool(self.failed) or self.listed
+
+    def start(self, query, content_format=None):
+        if query != self.query or content_format != self.content_format:
+            self.query = query
+            self.content_format = content_format
+            self.next = None
+            self.done = set()
+            self.failed = set()
+            self.listed = False
+            self.count = 0
+
+    def mark(self, page_id):
+        self.done.add(page_id)
+        self.failed.discard(page_id)
+        self.count += 1
+
+    def fail(self, page_id):
+        self.failed.add(page_id)
+
+    def advance(self, next_link):
+        """Record that every page of the current listing page was written; `next_link` is the following one."""
+        self.next = next_link
+        self.done = set()
+        self.save()
+
+    def save(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump({'query': self.query, 'content_format': self.content_format, 'next': self.next,
+                           'done': sorted(self.done), 'failed': sorted(self.failed), 'listed': self.listed,
+                           'count': self.count}, f)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def finish(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
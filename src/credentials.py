@@ -0,0 +1,195 @@
+import os
+import json
+import pickle
+import logging
+import tempfile
+import datetime
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# google-auth refreshes on the request path within 3m45s of expiry; refreshing
+# well before that keeps requests from ever waiting on a refresh
+REFRESH_MARGIN = datetime.timedelta(minutes=10)
+RETRY_DELAY = 30.0
+
+
+@contextmanager
+def file_lock(path, exclusive=True):
+    """Hold an advisory lock on `path` (created if needed) across processes; a no-op without fcntl."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        yield
+    finally:
+        # Closing the descriptor releases the lock
+        os.close(fd)
+
+
+def _utcnow():
+    # google-auth keeps expiry as a naive UTC datetime
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+
+class CredentialManager:
+    """Keeps Google credentials fresh, sharing OAuth tokens between processes.
+
+    OAuth user tokens live in a JSON token file written atomically under a
+    lock file, so concurrent processes never see (or write) a half-written
+    token. Before refreshing, the file is read again under the lock: when
+    another process has already refreshed, its token is adopted instead of
+    refreshing again. `start()` refreshes credentials in a background thread
+    `REFRESH_MARGIN` ahead of their expiry, updating the live credentials
+    object in place, so reads never wait on a refresh.
+    """
+
+    def __init__(self, token_path=None, scopes=None, legacy_path=None):
+        self.token_path = token_path
+        self.scopes = scopes
+        self.legacy_path = legacy_path
+        self.credentials = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def lock_path(self):
+        return self.token_path + '.lock'
+
+    def load(self):
+        """Return usable credentials from the token file (refreshing them if expired), or None."""
+        from google.auth.exceptions import RefreshError
+        with file_lock(self.lock_path, exclusive=False):
+            credentials = self._read()
+        if credentials is None:
+            credentials = self._migrate()
+        if credentials is None:
+            return None
+        self.credentials = credentials
+        if credentials.valid:
+            return credentials
+        if not credentials.refresh_token:
+            return None
+        try:
+            self.refresh()
+        except RefreshError as e:
+            logger.warning("Could not refresh the stored Google token: %s", e)
+            return None
+        return credentials
+
+    def store(self, credentials):
+        self.credentials = credentials
+        with file_lock(self.lock_path):
+            self._write(credentials)
+
+    def refresh(self):
+        """Refresh the credentials now, unless another process already stored a newer token."""
+        from google.auth.transport.requests import Request
+        with self._lock:
+            credentials = self.credentials
+            if self.token_path is None:
+                credentials.refresh(Request())
+                return
+            with file_lock(self.lock_path):
+                stored = self._read()
+                if stored is not None and stored.token != credentials.token and not self._due(stored):
+                    credentials.token = stored.token
+                    credentials.expiry = stored.expiry
+                    logger.debug("Using the Google token refreshed by another process")
+                    return
+                credentials.refresh(Request())
+                self._write(credentials)
+
+    def start(self, credentials=None):
+        """Refresh `credentials` (default: the loaded ones) in the background from now on."""
+        if credentials is not None:
+            self.credentials = credentials
+        if self._thread is None and self.credentials is not None:
+            self._thread = threading.Thread(target=self._run, name='google-credentials', daemon=True)
+            self._thread.start()
+        return self.credentials
+
+    def close(self):
+        self._stop.set()
+
+    def _run(self):
+        while True:
+            delay = self._seconds_until_due(self.credentials)
+            if delay is None or self._stop.wait(delay):
+                return
+            try:
+                self.refresh()
+            except Exception as e:
+                # A failed background refresh leaves google-auth to refresh on the next request
+                logger.warning("Background refresh of the Google token failed: %s", e)
+                if self._stop.wait(RETRY_DELAY):
+                    return
+
+    def _seconds_until_due(self, credentials):
+        expiry = getattr(credentials, 'expiry', None)
+        if not isinstance(expiry, datetime.datetime):
+            # Credentials that were never issued a token are due now; ones without an expiry never are
+            return 0.0 if getattr(credentials, 'token', 0) is None else None
+        return max(0.0, (expiry - REFRESH_MARGIN - _utcnow()).total_seconds())
+
+    def _due(self, credentials):
+        return self._seconds_until_due(credentials) == 0.0
+
+    def _read(self):
+        from google.oauth2.credentials import Credentials
+        if self.token_path is None or not os.path.exists(self.token_path):
+            return None
+        try:
+            with open(self.token_path, 'r') as f:
+                info = json.load(f)
+            return Credentials.from_authorized_user_info(info, self.scopes)
+        except (OSError, ValueError) as e:
+            logger.warning("Ignoring unreadable Google token file %s: %s", self.token_path, e)
+            return None
+
+    def _write(self, credentials):
+        directory = os.path.dirname(os.path.abspath(self.token_path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write(credentials.to_json())
+            os.replace(tmp_path, self.token_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def _migrate(self):
+        """Move a token.pickle left by older versions into the JSON token file."""
+        if not self.legacy_path or not os.path.exists(self.legacy_path):
+            return None
+        with file_lock(self.lock_path):
+            # Another process may have migrated the pickle since this one looked for the token
+            credentials = self._read()
+            if credentials is not None:
+                return credentials
+            try:
+                with open(self.legacy_path, 'rb') as f:
+                    credentials = pickle.load(f)
+            except FileNotFoundError:
+                # Migrated and removed by another process, which failed to write the token
+                return None
+            except (OSError, pickle.UnpicklingError, AttributeError, EOFError):
+                logger.warning("Error loading token, proceeding with new authentication.")
+                return None
+            if credentials is None or not getattr(credentials, 'refresh_token', None):
+                return None
+            self._write(credentials)
+            try:
+                os.remove(self.legacy_path)
+            except FileNotFoundError:
+                pass
+        return credentials
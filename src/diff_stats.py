@@ -0,0 +1,177 @@
+import re
+import codecs
+
+# Unified diff hunk header; a missing line count means 1
+HUNK_RE = re.compile(rb'^@@ -\d+(?:,(\d+))? \+\d+(?:,(\d+))? @@')
+DEV_NULL = b'/dev/null'
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+
+def iter_lines(chunks):
+    """Split an iterable of byte chunks into lines (without the newline), holding one partial line at a time."""
+    pending = b''
+    for chunk in chunks:
+        if not chunk:
+            continue
+        lines = (pending + chunk).split(b'\n')
+        pending = lines.pop()
+        yield from lines
+    if pending:
+        yield pending
+
+
+def _unquote(path):
+    # git C-quotes paths with special characters: "a/caf\303\251 menu.txt"
+    if path[:1] == b'"' and path[-1:] == b'"':
+        path = codecs.escape_decode(path[1:-1])[0]
+    return path.decode('utf-8', errors='replace')
+
+
+def _strip_prefix(path):
+    return path[2:] if path[:2] in ('a/', 'b/') else path
+
+
+def _split_git_paths(rest):
+    """Return (old, new) from the `a/<old> b/<new>` part of a `diff --git` line."""
+    if rest[:1] == b'"':
+        end = rest.index(b'"', 1)
+        while rest[end - 1:end] == b'\\':
+            end = rest.index(b'"', end + 1)
+        return _strip_prefix(_unquote(rest[:end + 1])), _strip_prefix(_unquote(rest[end + 2:]))
+    # Without a rename both halves are the same path, which may itself contain " b/"
+    half = (len(rest) - 1) // 2
+    if len(rest) % 2 and rest[half:half + 1] == b' ' and rest[2:half] == rest[half + 3:]:
+        path = _strip_prefix(_unquote(rest[:half]))
+        return path, path
+    old, _, new = rest.partition(b' b/')
+    return _strip_prefix(_unquote(old)), _unquote(new)
+
+
+def _header_path(line):
+    path = line[4:].split(b'\t', 1)[0]
+    if path == DEV_NULL:
+        return None
+    return _strip_prefix(_unquote(path))
+
+
+class _FileStats:
+    __slots__ = ('file', 'previous_file', 'status', 'additions', 'deletions', 'binary', 'hunks')
+
+    def __init__(self, old=None, new=None):
+        self.file = new or old
+        self.previous_file = old
+        self.status = 'modified'
+        self.additions = 0
+        self.deletions = 0
+        self.binary = False
+        self.hunks = 0
+
+    def record(self):
+        record = {'file': self.file, 'status': self.status, 'additions': self.additions,
+                  'deletions': self.deletions, 'changes': self.additions + self.deletions}
+        if self.status in ('renamed', 'copied') and self.previous_file:
+            record['previous_file'] = self.previous_file
+        if self.binary:
+            record['binary'] = True
+        return record
+
+
+def iter_diff_stats(lines):
+    """Yield a GitHub-style stats record per file of a unified (git) diff, one line at a time.
+
+    `lines` are bytes without newlines (see `iter_lines`). Records have
+    `file`, `status` (added, removed, modified, renamed, copied or changed
+    for a mode change only), `additions`, `deletions` and `changes`, plus
+    `previous_file` for renames and copies and `binary` for binary files.
+    Lines inside a hunk are counted against the hunk header, so content
+    lines starting with `---`, `+++` or `diff` are not mistaken for headers.
+    """
+    current = None
+    old_left = new_left = 0
+    mode_change = False
+    for line in lines:
+        if old_left > 0 or new_left > 0:
+            first = line[:1]
+            if first == b'+':
+                current.additions += 1
+                new_left -= 1
+            elif first == b'-':
+                current.deletions += 1
+                old_left -= 1
+            elif first != b'\\':
+                # Context lines; some tools strip the space of blank ones
+                old_left -= 1
+                new_left -= 1
+            continue
+
+        if line.startswith(b'@@'):
+            match = HUNK_RE.match(line)
+            if match is None or current is None:
+                continue
+            old_left = int(match.group(1) or 1)
+            new_left = int(match.group(2) or 1)
+            current.hunks += 1
+        elif line.startswith(b'diff --git '):
+            if current is not None:
+                yield _finish(current, mode_change)
+            current = _FileStats(*_split_git_paths(line[len(b'diff --git '):]))
+            mode_change = False
+        elif line.startswith(b'--- '):
+            if current is None or current.hunks:
+                # A plain (non-git) diff starts each file with its --- header
+                if current is not None:
+                    yield _finish(current, mode_change)
+                current = _FileStats()
+                mode_change = False
+            path = _header_path(line)
+            if path is None:
+                current.status = 'added'
+            elif current.file is None:
+                current.file = current.previous_file = path
+        elif line.startswith(b'+++ ') and current is not None:
+            path = _header_path(line)
+            if path is None:
+                current.status = 'removed'
+            elif current.status != 'renamed' or current.file is None:
+                current.file = path
+        elif current is None:
+            continue
+        elif line.startswith(b'new file mode'):
+            current.status = 'added'
+        elif line.startswith(b'deleted file mode'):
+            current.status = 'removed'
+        elif line.startswith(b'rename from ') or line.startswith(b'copy from '):
+            current.status = 'renamed' if line[:1] == b'r' else 'copied'
+            current.previous_file = _unquote(line.split(b' from ', 1)[1])
+        elif line.startswith(b'rename to ') or line.startswith(b'copy to '):
+            current.file = _unquote(line.split(b' to ', 1)[1])
+        elif line.startswith(b'Binary files ') or line.startswith(b'GIT binary patch'):
+            current.binary = True
+        elif line.startswith(b'old mode') or line.startswith(b'new mode'):
+            mode_change = True
+    if current is not None:
+        yield _finish(current, mode_change)
+
+
+def _finish(current, mode_change):
+    if mode_change and current.status == 'modified' and not current.hunks and not current.binary:
+        current.status = 'changed'
+    return current.record()
+
+
+def summarize(records):
+    """Return (records as a list, totals) for stats records."""
+    records = list(records)
+    totals = {
+        'files': len(records),
+        'additions': sum(record['additions'] for record in records),
+        'deletions': sum(record['deletions'] for record in records),
+    }
+    totals['changes'] = totals['additions'] + totals['deletions']
+    return records, totals
+
+
+def diff_stats(chunks):
+    """Per-file stats and totals for a unified diff given as byte chunks, e.g. `response.iter_content()`."""
+    files, totals = summarize(iter_diff_stats(iter_lines(chunks)))
+    return {'files': files, 'totals': totals}
@@ -0,0 +1,330 @@
+import json
+import math
+import threading
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from src.github_pr_reader import DEFAULT_PR_FIELDS, PR_FIELDS, GitHubPRReader
+from src.metrics import metrics
+from src.search_index import indexed
+from src.timestamps import parse_timestamp
+
+PAGE_SIZE = 100
+# PRs (or follow-up pages) per aliased query; each PR may select up to 100 x 100 review comments,
+# well under the 500,000 node limit
+DEFAULT_BATCH_SIZE = 10
+# How long a single read waits for concurrent reads to share its query
+DEFAULT_BATCH_WINDOW = 0.005
+
+
+def _connection(name, nodes, after=None):
+    arguments = f'first: {PAGE_SIZE}' + (f', after: {json.dumps(after)}' if after else '')
+    return f'{name}({arguments}) {{ totalCount pageInfo {{ hasNextPage endCursor }} nodes {{ {nodes} }} }}'
+
+
+ISSUE_COMMENTS = 'body'
+REVIEW_COMMENTS = 'databaseId body'
+
+
+def _reviews(after=None):
+    return _connection('reviews', 'id ' + _connection('comments', REVIEW_COMMENTS), after)
+
+
+# Follow-up page kind -> (type of the node holding the connection, selection of the next page)
+FOLLOW_UPS = {
+    'issue_comments': ('PullRequest', lambda after: _connection('comments', ISSUE_COMMENTS, after)),
+    'reviews': ('PullRequest', _reviews),
+    'review_comments': ('PullRequestReview', lambda after: _connection('comments', REVIEW_COMMENTS, after)),
+}
+
+
+def graphql_url_for(api_url):
+    """GraphQL endpoint of a REST API base URL (https://api.github.com, or https://HOST/api/v3 for Enterprise)."""
+    api_url = api_url.rstrip('/')
+    if api_url.endswith('/v3'):
+        return api_url[:-len('/v3')] + '/graphql'
+    return api_url + '/graphql'
+
+
+class _Batch:
+    __slots__ = ('items', 'results', 'full', 'done')
+
+    def __init__(self):
+        self.items = []
+        self.results = None
+        self.full = threading.Event()
+        self.done = threading.Event()
+
+
+class _Batcher:
+    """Gathers concurrent single reads into one `fetch_many(group, items)` call.
+
+    The first read of a batch waits up to `window` seconds (less once the
+    batch holds `size` items) for other reads of the same group to join,
+    then fetches all of them and hands each caller its own result or error.
+    """
+
+    def __init__(self, fetch_many, size, window):
+        self.fetch_many = fetch_many
+        self.size = size
+        self.window = window
+        self._lock = threading.Lock()
+        self._open = {}
+
+    def call(self, group, item):
+        with self._lock:
+            batch = self._open.get(group)
+            leader = batch is None
+            if leader:
+                batch = self._open[group] = _Batch()
+            slot = len(batch.items)
+            batch.items.append(item)
+            if len(batch.items) >= self.size:
+                del self._open[group]
+                batch.full.set()
+
+        if leader:
+            batch.full.wait(self.window)
+            with self._lock:
+                if self._open.get(group) is batch:
+                    del self._open[group]
+            try:
+                batch.results = self.fetch_many(group, batch.items)
+            except Exception as e:
+                batch.results = [e] * len(batch.items)
+            finally:
+                if batch.results is None:
+                    batch.results = [RuntimeError("The batched read was interrupted")] * len(batch.items)
+                batch.done.set()
+        else:
+            batch.done.wait()
+
+        result = batch.results[slot]
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+
+class _PRState:
+    __slots__ = ('repo_name', 'number', 'pr', 'issue_comments', 'review_comments', 'error')
+
+    def __init__(self, repo_name, number):
+        self.repo_name = repo_name
+        self.number = number
+        self.pr = None
+        self.issue_comments = []
+        self.review_comments = []
+        self.error = None
+
+
+class GitHubGraphQLReader(GitHubPRReader):
+    """GitHubPRReader that reads PRs by URL through the GraphQL API.
+
+    A PR's metadata, description, review comments and issue comments come
+    from one query, with further pages of any connection fetched by cursor
+    and several PRs aliased into the same query (`read_prs_by_url`, or
+    concurrent `read_pr_by_url` calls arriving within `batch_window`).
+    GraphQL has no file patches, so file changes still come from the REST
+    files listing, all of its pages at once. Results have the same shape as
+    GitHubPRReader's; title lookups, streaming and sync use REST.
+    """
+
+    def __init__(self, index_dir=None, per_page=100, max_workers=8, cache=None, max_connections=None,
+                 scheduler=None, api_url=None, graphql_url=None, batch_size=DEFAULT_BATCH_SIZE,
+                 batch_window=DEFAULT_BATCH_WINDOW, search_index=None):
+        super().__init__(index_dir=index_dir, per_page=per_page, max_workers=max_workers, cache=cache,
+                         max_connections=max_connections, scheduler=scheduler, search_index=search_index)
+        self.api_url = (api_url or self.github.requester.base_url).rstrip('/')
+        self.graphql_url = graphql_url or graphql_url_for(self.api_url)
+        self.batch_size = batch_size
+        self._batcher = _Batcher(self._fetch_group, batch_size, batch_window)
+        self._session_lock = threading.Lock()
+
+    @indexed('github')
+    @metrics.instrument('github')
+    def read_pr_by_url(self, url, fields=None, patch_filter=None):
+        repo_name, pr_number = self._parse_pr_url(url)
+        group = (tuple(fields or DEFAULT_PR_FIELDS), patch_filter)
+        if self.cache is None:
+            return self._batcher.call(group, (repo_name, pr_number))[0]
+
+        def revalidate(updated_at):
+            owner, name = repo_name.split('/', 1)
+            data, _ = self._graphql(f'{{ p0: repository(owner: {json.dumps(owner)}, name: {json.dumps(name)}) '
+                                    f'{{ pullRequest(number: {int(pr_number)}) {{ updatedAt }} }} }}')
+            pr = (data.get('p0') or {}).get('pullRequest') or {}
+            return pr.get('updatedAt') == updated_at
+
+        key = self._cache_key(repo_name, pr_number, fields, patch_filter) + f'&api={self.graphql_url}'
+        return self.cache.fetch(key, lambda: self._batcher.call(group, (repo_name, pr_number)), revalidate)
+
+    @metrics.instrument('github')
+    def read_prs_by_url(self, urls, fields=None, patch_filter=None):
+        """Read several PRs, `batch_size` per query, returning their results in order (without the cache)."""
+        refs = [self._parse_pr_url(url) for url in urls]
+        results = self._fetch_prs(refs, fields, patch_filter)
+        for result in results:
+            if isinstance(result, Exception):
+                raise result
+        return [info for info, _ in results]
+
+    def _fetch_group(self, group, refs):
+        fields, patch_filter = group
+        return self._fetch_prs(refs, fields, patch_filter)
+
+    def _fetch_prs(self, refs, fields=None, patch_filter=None):
+        """Return (info, updatedAt) or an exception for each (repo_name, number) in `refs`."""
+        if fields is None:
+            fields = DEFAULT_PR_FIELDS
+        unknown = [field for field in fields if field not in PR_FIELDS]
+        if unknown:
+            raise ValueError(f"Unknown PR fields: {', '.join(unknown)}")
+
+        states = [_PRState(repo_name, number) for repo_name, number in refs]
+        selection = ['id number title body changedFiles updatedAt']
+        if 'comments' in fields:
+            selection.append(_reviews())
+        if 'issue_comments' in fields:
+            selection.append(_connection('comments', ISSUE_COMMENTS))
+        selection = ' '.join(selection)
+
+        pending = []
+        for start in range(0, len(states), self.batch_size):
+            group = states[start:start + self.batch_size]
+            aliases = []
+            for i, state in enumerate(group):
+                owner, name = state.repo_name.split('/', 1)
+                aliases.append(f'p{i}: repository(owner: {json.dumps(owner)}, name: {json.dumps(name)}) '
+                               f'{{ pullRequest(number: {int(state.number)}) {{ {selection} }} }}')
+            data, errors = self._graphql('{ ' + ' '.join(aliases) + ' }')
+            for i, state in enumerate(group):
+                pr = (data.get(f'p{i}') or {}).get('pullRequest')
+                if pr is None:
+                    message = next((error.get('message') for error in errors if (error.get('path') or [None])[0] == f'p{i}'),
+                                   None)
+                    state.error = RuntimeError(message or f"Pull request not found: {state.repo_name}#{state.number}")
+                    continue
+                state.pr = pr
+                if 'comments' in fields:
+                    self._collect(state, 'reviews', pr['id'], pr['reviews'], pending)
+                if 'issue_comments' in fields:
+                    self._collect(state, 'issue_comments', pr['id'], pr['comments'], pending)
+
+        # Every connection with more pages gets its next page in the same round of aliased queries
+        while pending:
+            rounds, pending = pending, []
+            for start in range(0, len(rounds), self.batch_size):
+                group = rounds[start:start + self.batch_size]
+                aliases = []
+                for i, (state, kind, node_id, cursor) in enumerate(group):
+                    node_type, page = FOLLOW_UPS[kind]
+                    aliases.append(f'f{i}: node(id: {json.dumps(node_id)}) {{ ... on {node_type} {{ {page(cursor)} }} }}')
+                data, _ = self._graphql('{ ' + ' '.join(aliases) + ' }')
+                for i, (state, kind, node_id, cursor) in enumerate(group):
+                    node = data.get(f'f{i}') or {}
+                    connection = node.get('reviews' if kind == 'reviews' else 'comments')
+                    if connection is None:
+                        state.error = RuntimeError(f"Could not page through {kind} of {state.repo_name}#{state.number}")
+                        continue
+                    self._collect(state, kind, node_id, connection, pending)
+
+        files = {}
+        if 'file_changes' in fields:
+            files = self._fetch_files([state for state in states if state.error is None], patch_filter)
+
+        results = []
+        for index, state in enumerate(states):
+            if state.error is not None:
+                results.append(state.error)
+                continue
+            pr = state.pr
+            info = {}
+            if 'title' in fields:
+                info['title'] = pr['title']
+            if 'number' in fields:
+                info['number'] = pr['number']
+            if 'description' in fields:
+                # REST reports an empty description as null
+                info['description'] = pr['body'] or None
+            if 'updated_at' in fields:
+                # Written as REST writes it
+                info['updated_at'] = parse_timestamp(pr['updatedAt']).isoformat()
+            if 'comments' in fields:
+                # REST lists review comments in creation order, across reviews
+                info['comments'] = [comment['body'] for comment in sorted(state.review_comments,
+                                                                          key=lambda comment: comment['databaseId'])]
+            if 'issue_comments' in fields:
+                info['issue_comments'] = [comment['body'] for comment in state.issue_comments]
+            if 'file_changes' in fields:
+                info['file_changes'] = files[id(state)]
+            results.append((info, pr['updatedAt']))
+        return results
+
+    def _collect(self, state, kind, node_id, connection, pending):
+        nodes = connection.get('nodes') or []
+        if kind == 'reviews':
+            for review in nodes:
+                self._collect(state, 'review_comments', review['id'], review['comments'], pending)
+        elif kind == 'review_comments':
+            state.review_comments.extend(nodes)
+        else:
+            state.issue_comments.extend(nodes)
+        page_info = connection.get('pageInfo') or {}
+        if page_info.get('hasNextPage'):
+            metrics.pages(1)
+            pending.append((state, kind, node_id, page_info['endCursor']))
+
+    def _fetch_files(self, states, patch_filter):
+        """Fetch every REST files page of every PR at once; returns {id(state): file changes}."""
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            pages = {}
+            for state in states:
+                page_count = math.ceil((state.pr.get('changedFiles') or 0) / self.per_page)
+                metrics.pages(page_count)
+                pages[id(state)] = [pool.submit(metrics.bind(self._files_page), state.repo_name, state.number, page)
+                                    for page in range(1, page_count + 1)]
+            return {key: [self._file_change_from_json(item, patch_filter) for page in futures for item in page.result()]
+                    for key, futures in pages.items()}
+
+    def _files_page(self, repo_name, pr_number, page):
+        response = self.scheduler.send(
+            'github',
+            lambda: self._session().get(f"{self.api_url}/repos/{repo_name}/pulls/{pr_number}/files",
+                                        params={'per_page': self.per_page, 'page': page},
+                                        headers=self._headers(), timeout=60),
+            credential=self.credential,
+            size=lambda response: len(response.content)
+        )
+        response.raise_for_status()
+        return response.json()
+
+    def _file_change_from_json(self, item, patch_filter=None):
+        if patch_filter is None:
+            return {'file': item['filename'], 'patch': item.get('patch')}
+        return patch_filter.apply(item['filename'], item.get('patch'))
+
+    def _graphql(self, query):
+        """Run one query and return (data, errors); fails only when there is no data at all."""
+        response = self.scheduler.send(
+            'github-graphql',
+            lambda: self._session().post(self.graphql_url, json={'query': query}, headers=self._headers(), timeout=60),
+            credential=self.credential,
+            size=lambda response: len(response.content)
+        )
+        response.raise_for_status()
+        payload = response.json()
+        errors = payload.get('errors') or []
+        if payload.get('data') is None:
+            raise RuntimeError('; '.join(error.get('message', '') for error in errors) or "GraphQL request failed")
+        return payload['data'], errors
+
+    def _headers(self):
+        headers = {'Accept': 'application/vnd.github+json'}
+        if self.token:
+            headers['Authorization'] = f'bearer {self.token}'
+        return headers
+
+    def _session(self):
+        with self._session_lock:
+            if self._http is None:
+                self._http = requests.Session()
+            return self._http
@@ -1,37 +1,571 @@
 import os
-from github import Github
+import math
+import time
+import fnmatch
+import hashlib
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from github import Auth, Github, GithubRetry
 from urllib.parse import urlparse
+from src.pr_title_index import PRTitleIndex, title_matches
+from src.timestamps import parse_timestamp
+from src.rate_limit import credential_id, default_scheduler
+from src.metrics import metrics
+from src.search_index import indexed
+from src.diff_stats import DEFAULT_CHUNK_SIZE, diff_stats
+from src.sources import DEFAULT_PR_FIELDS, PR_FIELDS
+PR_STATES = ('open', 'closed', 'merged')
+# The search API returns at most 1000 results per query
+SEARCH_RESULT_CAP = 1000
+# Repository qualifiers per search query, keeping URLs short
+REPOS_PER_QUERY = 40
+DIFF_STATS_SOURCES = ('files', 'diff')
+DIFF_MEDIA_TYPE = 'application/vnd.github.diff'
+
+# Paginated listings: field -> (PullRequest method, PullRequest attribute holding the item count)
+PR_LISTINGS = {
+    'comments': ('get_comments', 'review_comments'),
+    'issue_comments': ('get_issue_comments', 'comments'),
+    'file_changes': ('get_files', 'changed_files'),
+}
+# The files listing stops at this many files however many the PR changes
+MAX_LISTED_FILES = 3000
+
+class PatchFilter:
+    """Decides per file whether a patch body is kept, truncated or dropped."""
+
+    def __init__(self, max_bytes=None, skip_patterns=(), oversized='truncate'):
+        if oversized not in ('truncate', 'skip'):
+            raise ValueError(f"Unknown oversized patch handling: {oversized}")
+        self.max_bytes = max_bytes
+        self.skip_patterns = tuple(skip_patterns)
+        self.oversized = oversized
+
+    def key(self):
+        return f"{self.max_bytes}:{self.oversized}:{','.join(self.skip_patterns)}"
+
+    def apply(self, filename, patch):
+        change = {'file': filename, 'patch': patch}
+        if patch is None:
+            return change
+        if any(fnmatch.fnmatch(filename, pattern) for pattern in self.skip_patterns):
+            change['patch'] = None
+            change['patch_skipped'] = 'pattern'
+            return change
+        if self.max_bytes is not None:
+            encoded = patch.encode('utf-8')
+            if len(encoded) > self.max_bytes:
+                if self.oversized == 'skip':
+                    change['patch'] = None
+                    change['patch_skipped'] = 'size'
+                else:
+                    change['patch'] = encoded[:self.max_bytes].decode('utf-8', errors='ignore')
+                    change['patch_truncated'] = len(encoded)
+        return change
+
+def title_score(candidate, title):
+    """How closely `candidate` matches the searched `title`, from 1.0 (identical) down to 0.0."""
+    if not title:
+        return 0.0
+    if candidate == title:
+        return 1.0
+    candidate, title = candidate.casefold(), title.casefold()
+    if candidate == title:
+        return 0.9
+    if candidate.startswith(title):
+        return 0.8
+    words = title.split()
+    found = sum(word in candidate for word in words)
+    return round(0.7 * found / len(words), 3) if words else 0.0
+
+class _ScheduledAuth(Auth.Auth):
+    """Token auth that first waits for the scheduler, feeding it the rate limit budget PyGithub last saw."""
+
+    def __init__(self, token, scheduler, credential):
+        self._token = token
+        self.scheduler = scheduler
+        self.credential = credential
+        self.requester = None
+
+    @property
+    def token_type(self):
+        return 'token'
+
+    @property
+    def token(self):
+        return self._token
+
+    @property
+    def _masked_token(self):
+        return 'token (oauth token removed)'
+
+    def authentication(self, headers):
+        if self.requester is not None:
+            remaining, limit = self.requester.rate_limiting
+            if remaining >= 0:
+                self.scheduler.update_budget('github', self.credential, remaining, limit,
+                                             self.requester.rate_limiting_resettime)
+        self.scheduler.acquire('github', self.credential)
+        metrics.request_started()
+        if self._token:
+            super().authentication(headers)
+
+class _ScheduledRetry(GithubRetry):
+    """GithubRetry that backs off through the scheduler, so every thread using the token waits together."""
+
+    scheduler = None
+    credential = None
+
+    def new(self, **kw):
+        retry = super().new(**kw)
+        retry.scheduler = self.scheduler
+        retry.credential = self.credential
+        return retry
+
+    def is_retry(self, method, status_code, has_retry_after=False):
+        # urllib3 asks this of every response that is not a redirect, so it marks the end of a request
+        metrics.request_finished('github', status_code)
+        return super().is_retry(method, status_code, has_retry_after)
+
+    def sleep(self, response=None):
+        headers = response.headers if response is not None else None
+        # For primary rate limits GithubRetry sets the backoff to the time until the reset
+        time.sleep(self.scheduler.backoff('github', self.credential, len(self.history) - 1, headers,
+                                          minimum=self.get_backoff_time()))
 
 class GitHubPRReader:
-    def __init__(self):
+    def __init__(self, index_dir=None, per_page=100, max_workers=8, cache=None, max_connections=None,
+                 scheduler=None, search_index=None):
         self.token = os.getenv('GITHUB_TOKEN')
         self.repo_owner = os.getenv('GITHUB_REPO_OWNER')
         self.repo_name = os.getenv('GITHUB_REPO')
-        self.github = Github(self.token)
-
-    def read_pr_by_title(self, title):
-        repo = self.github.get_repo(f"{self.repo_owner}/{self.repo_name}")
-        pulls = repo.get_pulls(state='all')
-        for pr in pulls:
-            if pr.title == title:
-                return self._get_pr_info(pr)
+        self.index_dir = index_dir
+        self.per_page = per_page
+        self.max_workers = max_workers
+        self.cache = cache
+        self.search_index = search_index
+        self.scheduler = scheduler or default_scheduler()
+        credential = credential_id(self.token)
+        self.credential = credential
+        self._http = None
+        auth = _ScheduledAuth(self.token, self.scheduler, credential)
+        retry = _ScheduledRetry(total=self.scheduler.max_retries)
+        retry.scheduler = self.scheduler
+        retry.credential = credential
+        self.github = Github(auth=auth, per_page=per_page, pool_size=max_connections, retry=retry)
+        auth.requester = self.github.requester
+
+    @indexed('github', ref=lambda reader, result: reader._title_pr_url(result))
+    @metrics.instrument('github')
+    def read_pr_by_title(self, title, match='exact', fields=None, patch_filter=None):
+        pr = self._find_pr_by_title(title, match)
+        if self.cache is None:
+            return self._get_pr_info(pr, fields, patch_filter)
+
+        # The lookup has just fetched the PR, so its ETag revalidates the cached entry for free
+        key = self._cache_key(f"{self.repo_owner}/{self.repo_name}", pr.number, fields, patch_filter)
+        return self.cache.fetch(
+            key,
+            lambda: (self._get_pr_info(pr, fields, patch_filter), pr.etag),
+            lambda etag: etag == pr.etag
+        )
+
+    @indexed('github')
+    @metrics.instrument('github')
+    def read_pr_by_url(self, url, fields=None, patch_filter=None):
+        repo_name, pr_number = self._parse_pr_url(url)
+        if self.cache is None:
+            return self._get_pr_info(self._get_pull(repo_name, pr_number), fields, patch_filter)
+
+        def fetch():
+            pr = self._get_pull(repo_name, pr_number)
+            return self._get_pr_info(pr, fields, patch_filter), pr.etag
+
+        def revalidate(etag):
+            status, _, _ = self.github.requester.requestJson(
+                'GET', f"/repos/{repo_name}/pulls/{pr_number}", headers={'If-None-Match': etag}
+            )
+            return status == 304
+
+        return self.cache.fetch(self._cache_key(repo_name, pr_number, fields, patch_filter), fetch, revalidate)
+
+    @metrics.instrument('github')
+    def stream_pr_by_title(self, title, match='exact', fields=None, patch_filter=None):
+        return self._stream_pr_info(self._find_pr_by_title(title, match), fields, patch_filter)
+
+    @metrics.instrument('github')
+    def stream_pr_by_url(self, url, fields=None, patch_filter=None):
+        return self._stream_pr_info(self._get_pull(*self._parse_pr_url(url)), fields, patch_filter)
+
+    @metrics.instrument('github')
+    def sync_pr(self, ref, watermark=None, since=None, match='exact', fields=None, patch_filter=None):
+        """Return (changes, watermark) for a PR URL or title, given the watermark of the previous sync.
+
+        changes is None when nothing changed; an unchanged PR costs a single
+        conditional request. Otherwise it holds the new comments (by comment
+        id), the files whose blob sha changed, the removed files and the
+        description if it was edited (on a first sync, the description as
+        it is). Files are only listed when the head commit moved. On a first sync, `since` drops older comments, and a PR
+        not updated after `since` reports no changes.
+        """
+        if fields is None:
+            fields = DEFAULT_PR_FIELDS
+        watermark = watermark or {}
+        # The ETag only vouches for what the previous sync looked at
+        same_fields = watermark.get('fields', list(fields)) == list(fields)
+        if ref.startswith('http'):
+            repo_name, pr_number = self._parse_pr_url(ref)
+            if watermark.get('etag') and same_fields:
+                status, _, _ = self.github.requester.requestJson(
+                    'GET', f"/repos/{repo_name}/pulls/{pr_number}", headers={'If-None-Match': watermark['etag']}
+                )
+                if status == 304:
+                    return None, watermark
+            pr = self._get_pull(repo_name, pr_number)
+        else:
+            pr = self._find_pr_by_title(ref, match)
+            if watermark.get('etag') and same_fields and watermark['etag'] == pr.etag:
+                return None, watermark
+
+        updated_at = parse_timestamp(pr.updated_at)
+        # Without a previous watermark, `since` decides what counts as new
+        cutoff = parse_timestamp(watermark['updated_at']) if watermark.get('updated_at') else since
+        description_hash = hashlib.sha1((pr.body or '').encode('utf-8')).hexdigest()
+        # What this sync does not look at keeps its previous watermark, for a later sync that does
+        new_watermark = dict(watermark, etag=pr.etag, updated_at=updated_at.isoformat(), fields=list(fields))
+        new_watermark.setdefault('files', {})
+        if 'description' in fields:
+            new_watermark['description_hash'] = description_hash
+        changes = {}
+        # Like the files, a first sync reports the description unless the PR was last updated before `since`
+        if 'description' in fields and description_hash != watermark.get('description_hash') \
+                and (watermark or since is None or updated_at > since):
+            changes['description'] = pr.body
+
+        for field in ('comments', 'issue_comments'):
+            if field not in fields:
+                continue
+            last_id = watermark.get(f'last_{field}_id', 0)
+            new_comments = []
+            if getattr(pr, PR_LISTINGS[field][1]):
+                if field == 'comments' and cutoff is not None:
+                    # Review comments can be listed from a date; the id check below drops edited old ones
+                    listing = pr.get_comments(since=cutoff)
+                else:
+                    listing = getattr(pr, PR_LISTINGS[field][0])()
+                for comment in listing:
+                    if comment.id <= last_id:
+                        continue
+                    if not watermark and since is not None and parse_timestamp(comment.created_at) <= since:
+                        continue
+                    new_comments.append(comment)
+            last_id = max([last_id] + [comment.id for comment in new_comments])
+            new_watermark[f'last_{field}_id'] = last_id
+            if new_comments:
+                changes[f'new_{field}'] = [{'id': comment.id, 'body': comment.body} for comment in new_comments]
+
+        if 'file_changes' in fields and pr.head.sha != watermark.get('head_sha'):
+            previous = watermark.get('files', {})
+            files = {}
+            changed_files = []
+            for file in pr.get_files():
+                files[file.filename] = file.sha
+                if previous.get(file.filename) != file.sha:
+                    changed_files.append(self._file_change(file, patch_filter))
+            new_watermark['files'] = files
+            new_watermark['head_sha'] = pr.head.sha
+            removed_files = [filename for filename in previous if filename not in files]
+            if since is not None and not watermark and updated_at <= since:
+                changed_files = []
+            if changed_files:
+                changes['changed_files'] = changed_files
+            if removed_files:
+                changes['removed_files'] = removed_files
+
+        if not changes:
+            return None, new_watermark
+        return dict({'number': pr.number, 'title': pr.title, 'updated_at': new_watermark['updated_at']}, **changes), new_watermark
+
+    @metrics.instrument('github')
+    def read_pr_diff_stats(self, ref, match='exact', source='files'):
+        """Per-file status, additions, deletions and renames plus totals for a PR URL or title.
+
+        With source='files' the stats come from the files listing, which the
+        API caps at 3000 files (`truncated` is set beyond that; the totals
+        always cover the whole PR). With source='diff' the raw diff is
+        downloaded in one streamed request and parsed as it arrives, which
+        works for PRs of any size.
+        """
+        if source not in DIFF_STATS_SOURCES:
+            raise ValueError(f"Unknown diff stats source: {source}")
+        if ref.startswith('http'):
+            repo_name, pr_number = self._parse_pr_url(ref)
+            pr = self._get_pull(repo_name, pr_number)
+        else:
+            repo_name = f"{self.repo_owner}/{self.repo_name}"
+            pr = self._find_pr_by_title(ref, match)
+        if self.cache is None:
+            return self._get_diff_stats(repo_name, pr, source)
+        # The PR has just been fetched, so its ETag revalidates the cached entry for free
+        return self.cache.fetch(
+            f"github:{self.github.requester.base_url}/repos/{repo_name}/pulls/{pr.number}?diff-stats={source}",
+            lambda: (self._get_diff_stats(repo_name, pr, source), pr.etag),
+            lambda etag: etag == pr.etag
+        )
+
+    def _get_diff_stats(self, repo_name, pr, source):
+        info = {'title': pr.title, 'number': pr.number}
+        if source == 'diff':
+            info.update(diff_stats(self._iter_diff(repo_name, pr)))
+            return info
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            files = [file for page in self._submit_pages(pool, pr, *PR_LISTINGS['file_changes']) for file in page.result()]
+        info['files'] = []
+        for file in files:
+            record = {'file': file.filename, 'status': file.status, 'additions': file.additions,
+                      'deletions': file.deletions, 'changes': file.changes}
+            if file.previous_filename:
+                record['previous_file'] = file.previous_filename
+            info['files'].append(record)
+        info['totals'] = {'files': pr.changed_files, 'additions': pr.additions, 'deletions': pr.deletions,
+                          'changes': pr.additions + pr.deletions}
+        if len(files) < pr.changed_files:
+            info['truncated'] = True
+        return info
+
+    def _iter_diff(self, repo_name, pr):
+        response = self._get_diff(f"{self.github.requester.base_url}/repos/{repo_name}/pulls/{pr.number}",
+                                  DIFF_MEDIA_TYPE)
+        if response.status_code == 406:
+            # The API refuses diffs over its size limits. The web .diff has no such limit, but
+            # the API token does not sign in to github.com, so it only helps for public repos
+            response.close()
+            response = self._get_diff(pr.diff_url)
+            if response.status_code >= 400:
+                response.close()
+                raise RuntimeError(f"The diff of {repo_name}#{pr.number} is over the GitHub API's size limit, "
+                                   f"and {pr.diff_url} could not be read either (HTTP {response.status_code}); "
+                                   "use --diff-source files instead")
+        with response:
+            response.raise_for_status()
+            yield from response.iter_content(DEFAULT_CHUNK_SIZE)
+
+    def _get_diff(self, url, accept=None):
+        if self._http is None:
+            self._http = requests.Session()
+        headers = {'Accept': accept} if accept else {}
+        if self.token:
+            headers['Authorization'] = f'token {self.token}'
+        return self.scheduler.send(
+            'github',
+            lambda: self._http.get(url, headers=headers, stream=True, timeout=60),
+            credential=self.credential
+        )
+
+    @metrics.instrument('github')
+    def search_prs(self, title=None, author=None, labels=(), head=None, state=None, orgs=None, repos=None,
+                   limit=30):
+        """Find PRs across organizations and repositories through the search API and rank them.
+
+        One query runs per organization (and per group of repositories), all
+        of them concurrently, so a whole organization costs one request per
+        100 results instead of a scan of every repository. Without `orgs` or
+        `repos` the search covers GITHUB_REPO_OWNER. Matches are ranked by how
+        closely their title matches `title`, then by last update.
+        """
+        if state is not None and state not in PR_STATES:
+            raise ValueError(f"Unknown PR state: {state}")
+        orgs = list(orgs or [])
+        repos = list(repos or [])
+        if not orgs and not repos:
+            if not self.repo_owner:
+                raise ValueError("Pass orgs or repos, or set GITHUB_REPO_OWNER")
+            orgs = [self.repo_owner]
+
+        qualifiers = ['is:pr']
+        if title:
+            qualifiers.append('"' + title.replace('"', ' ').strip() + '" in:title')
+        if author:
+            qualifiers.append(f'author:{author}')
+        qualifiers.extend(f'label:"{label}"' for label in labels)
+        if head:
+            qualifiers.append(f'head:{head}')
+        if state == 'merged':
+            qualifiers.append('is:merged')
+        elif state:
+            qualifiers.append(f'state:{state}')
+        scopes = [f'org:{org}' for org in orgs]
+        scopes += [' '.join(f'repo:{repo}' for repo in repos[i:i + REPOS_PER_QUERY])
+                   for i in range(0, len(repos), REPOS_PER_QUERY)]
+        queries = [' '.join(qualifiers + [scope]) for scope in scopes]
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            first_pages = [pool.submit(metrics.bind(self._search_page), query, 0) for query in queries]
+            issues = []
+            next_pages = []
+            # The first page of a query tells how many more it needs
+            for query, future in zip(queries, first_pages):
+                listing, items = future.result()
+                issues.extend(items)
+                wanted = min(limit, listing.totalCount or 0, SEARCH_RESULT_CAP)
+                page_count = max(1, math.ceil(wanted / self.per_page))
+                metrics.pages(page_count)
+                next_pages.extend(pool.submit(metrics.bind(self._search_page), query, page, listing)
+                                  for page in range(1, page_count))
+            for future in next_pages:
+                issues.extend(future.result()[1])
+
+        matches = {}
+        for issue in issues:
+            match = self._search_match(issue, title)
+            # Overlapping org and repo scopes return the same PR more than once
+            matches[(match['repo'], match['number'])] = match
+        ranked = sorted(matches.values(), key=lambda match: (match['score'], match['updated_at'] or ''), reverse=True)
+        return ranked[:limit]
+
+    def _search_page(self, query, page, listing=None):
+        if listing is None:
+            listing = self.github.search_issues(query)
+        self.scheduler.acquire('github-search', self.credential)
+        return listing, listing.get_page(page)
+
+    def _search_match(self, issue, title=None):
+        # The repository is taken from the URL: reading issue.repository would cost a request per result
+        repo_name, number = self._parse_pr_url(issue.html_url)
+        updated_at = issue.updated_at
+        return {
+            'repo': repo_name,
+            'number': number,
+            'title': issue.title,
+            'url': issue.html_url,
+            'author': issue.user.login if issue.user else None,
+            'state': issue.state,
+            'labels': [label.name for label in issue.labels],
+            'updated_at': updated_at.isoformat() if updated_at else None,
+            'score': title_score(issue.title, title),
+        }
+
+    def _cache_key(self, repo_name, pr_number, fields, patch_filter):
+        # The API base URL tells a GitHub Enterprise PR from the github.com one with the same name
+        key = (f"github:{self.github.requester.base_url}/repos/{repo_name}/pulls/{pr_number}"
+               f"?fields={','.join(fields or DEFAULT_PR_FIELDS)}")
+        if patch_filter is not None:
+            key += f"&patches={patch_filter.key()}"
+        return key
+
+    def _title_pr_url(self, result):
+        if result.get('number') is None:
+            return None
+        return f"https://github.com/{self.repo_owner}/{self.repo_name}/pull/{result['number']}"
+
+    def _find_pr_by_title(self, title, match='exact'):
+        repo_full_name = f"{self.repo_owner}/{self.repo_name}"
+        repo = self.github.get_repo(repo_full_name)
+        index = PRTitleIndex(repo_full_name, self.index_dir)
+
+        numbers = index.lookup(title, match)
+        if numbers:
+            pr = repo.get_pull(numbers[0])
+            # The PR may have been renamed since it was indexed
+            if title_matches(pr.title, title, match):
+                return pr
+
+        # Miss: only now go to the API, and only for PRs updated since the last refresh
+        fetched = index.refresh(repo)
+        numbers = index.lookup(title, match)
+        if numbers:
+            return fetched.get(numbers[0]) or repo.get_pull(numbers[0])
         raise ValueError(f"No pull request found with title: {title}")
 
-    def read_pr_by_url(self, url):
+    def _parse_pr_url(self, url):
         parts = urlparse(url)
         path_parts = parts.path.split('/')
         repo_name = '/'.join(path_parts[1:3])
         pr_number = int(path_parts[-1])
-        
+        return repo_name, pr_number
+
+    def _get_pull(self, repo_name, pr_number):
         repo = self.github.get_repo(repo_name)
-        pr = repo.get_pull(pr_number)
-        return self._get_pr_info(pr)
+        return repo.get_pull(pr_number)
 
-    def _get_pr_info(self, pr):
-        return {
-            'title': pr.title,
-            'number': pr.number,
-            'description': pr.body,
-            'comments': [comment.body for comment in pr.get_comments()],
-            'file_changes': [{'file': file.filename, 'patch': file.patch} for file in pr.get_files()]
-        }
\ No newline at end of file
+    def _get_pr_info(self, pr, fields=None, patch_filter=None):
+        if fields is None:
+            fields = DEFAULT_PR_FIELDS
+        unknown = [field for field in fields if field not in PR_FIELDS]
+        if unknown:
+            raise ValueError(f"Unknown PR fields: {', '.join(unknown)}")
+
+        info = {}
+        if 'title' in fields:
+            info['title'] = pr.title
+        if 'number' in fields:
+            info['number'] = pr.number
+        if 'description' in fields:
+            info['description'] = pr.body
+        if 'updated_at' in fields:
+            info['updated_at'] = parse_timestamp(pr.updated_at).isoformat() if pr.updated_at else None
+
+        listings = [field for field in PR_FIELDS if field in fields and field in PR_LISTINGS]
+        if not listings:
+            return info
+
+        # Every page of every requested listing is fetched at once
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            pages = {field: self._submit_pages(pool, pr, *PR_LISTINGS[field]) for field in listings}
+            items = {field: [item for page in pages[field] for item in page.result()] for field in listings}
+
+        if 'comments' in items:
+            info['comments'] = [comment.body for comment in items['comments']]
+        if 'issue_comments' in items:
+            info['issue_comments'] = [comment.body for comment in items['issue_comments']]
+        if 'file_changes' in items:
+            info['file_changes'] = [self._file_change(file, patch_filter) for file in items['file_changes']]
+        return info
+
+    def _stream_pr_info(self, pr, fields=None, patch_filter=None):
+        """Like _get_pr_info, but 'file_changes' is a generator that holds at most two pages of files."""
+        if fields is None:
+            fields = DEFAULT_PR_FIELDS
+        info = self._get_pr_info(pr, [field for field in fields if field != 'file_changes'])
+        if 'file_changes' in fields:
+            info['file_changes'] = self.iter_file_changes(pr, patch_filter)
+        return info
+
+    def iter_file_changes(self, pr, patch_filter=None):
+        listing = pr.get_files()
+        total = pr.changed_files
+        if not isinstance(total, int) or not hasattr(listing, 'get_page'):
+            for file in listing:
+                yield self._file_change(file, patch_filter)
+            return
+        total = min(total, MAX_LISTED_FILES)
+
+        # Iterating a PaginatedList keeps every page it has seen, so walk the
+        # pages by hand and fetch the next one while the current one is consumed
+        page_count = math.ceil(total / self.per_page)
+        metrics.pages(page_count)
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            get_page = metrics.bind(listing.get_page)
+            next_page = pool.submit(get_page, 0) if page_count else None
+            for page in range(page_count):
+                files = next_page.result()
+                next_page = pool.submit(get_page, page + 1) if page + 1 < page_count else None
+                for file in files:
+                    yield self._file_change(file, patch_filter)
+
+    def _file_change(self, file, patch_filter=None):
+        if patch_filter is None:
+            return {'file': file.filename, 'patch': file.patch}
+        return patch_filter.apply(file.filename, file.patch)
+
+    def _submit_pages(self, pool, pr, method, count_attribute):
+        listing = getattr(pr, method)()
+        total = getattr(pr, count_attribute)
+        if not isinstance(total, int) or not hasattr(listing, 'get_page'):
+            return [pool.submit(metrics.bind(list), listing)]
+        if method == 'get_files':
+            total = min(total, MAX_LISTED_FILES)
+        page_count = math.ceil(total / self.per_page)
+        metrics.pages(page_count)
+        return [pool.submit(metrics.bind(listing.get_page), page) for page in range(page_count)]
\ No newline at end of file
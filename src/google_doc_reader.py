@@ -1,45 +1,348 @@
 import os
 import json
-import pickle
+import math
+import time
+import queue
+import logging
+import threading
+from array import array
+from concurrent.futures import ThreadPoolExecutor
 from google.oauth2 import service_account
-from google.oauth2.credentials import Credentials
-from google.auth.transport.requests import Request
 from google_auth_oauthlib.flow import Flow, InstalledAppFlow
 from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
+from googleapiclient.http import build_http
+from google_auth_httplib2 import AuthorizedHttp
+import httplib2
 from google.auth.exceptions import MalformedError
 from urllib.parse import urlparse, parse_qs
+from src.credentials import CredentialManager
+from src.rate_limit import RETRY_STATUSES, default_scheduler
+from src.metrics import metrics
+from src.search_index import indexed
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_ROWS = 5000
+DEFAULT_READ_WORKERS = 8
+SCOPES = ['https://www.googleapis.com/auth/documents.readonly', 'https://www.googleapis.com/auth/spreadsheets.readonly']
+
+def _a1_range(sheet=None, cell_range=None):
+    if sheet is None:
+        return cell_range or 'A1:ZZ'
+    quoted = "'" + sheet.replace("'", "''") + "'"
+    return f"{quoted}!{cell_range}" if cell_range else quoted
+
+def _render_options(value_render_option):
+    if value_render_option is None:
+        return {}
+    options = {'valueRenderOption': value_render_option}
+    if value_render_option == 'UNFORMATTED_VALUE':
+        # Keep dates readable instead of returning spreadsheet serial numbers
+        options['dateTimeRenderOption'] = 'FORMATTED_STRING'
+    return options
+
+def _extract_gid(url):
+    parsed_url = urlparse(url)
+    for part in (parsed_url.fragment, parsed_url.query):
+        gid = parse_qs(part).get('gid', [None])[0]
+        if gid is not None:
+            return gid
+    return None
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+def rows_to_columns(rows, header=True, as_numpy=False):
+    """Turn rows into a dict of columns.
+
+    Columns that only hold numbers (or blanks) are packed into `array('d')`
+    buffers with NaN for blanks, so no Python object is kept per cell. Any
+    other column is a list with None for blanks. With `as_numpy`, columns
+    become NumPy arrays (float64 without copying, object otherwise).
+    """
+    names = None
+    columns = []
+    row_count = 0
+    for row in rows:
+        if header and names is None:
+            names = [str(name) for name in row]
+            continue
+        while len(columns) < len(row):
+            columns.append(array('d', [math.nan]) * row_count)
+        for i, column in enumerate(columns):
+            value = row[i] if i < len(row) and row[i] != '' else None
+            if isinstance(column, array):
+                if value is None:
+                    column.append(math.nan)
+                    continue
+                if _is_number(value):
+                    column.append(value)
+                    continue
+                # The buffer holds ints as floats; give back the whole numbers the sheet had as ints
+                column = columns[i] = [None if math.isnan(number) else int(number) if number.is_integer() else number
+                                       for number in column]
+            column.append(value)
+        row_count += 1
+
+    names = list(names or [])
+    while len(names) < len(columns):
+        names.append(f"column_{len(names) + 1}")
+    while len(columns) < len(names):
+        columns.append(array('d', [math.nan]) * row_count)
+    result = {}
+    for name, column in zip(names, columns):
+        unique_name = name
+        suffix = 2
+        while unique_name in result:
+            unique_name = f"{name}_{suffix}"
+            suffix += 1
+        result[unique_name] = column
+
+    if as_numpy:
+        try:
+            import numpy
+        except ImportError:
+            raise RuntimeError("as_numpy requires NumPy (pip install numpy)")
+        result = {
+            name: numpy.frombuffer(column, dtype=numpy.float64) if isinstance(column, array) else numpy.array(column, dtype=object)
+            for name, column in result.items()
+        }
+    return result
+
+HEADING_LEVELS = {'TITLE': 0, 'HEADING_1': 1, 'HEADING_2': 2, 'HEADING_3': 3,
+                  'HEADING_4': 4, 'HEADING_5': 5, 'HEADING_6': 6}
+
+class _DocumentText:
+    """Extracts the text of Docs API structural elements in a single pass.
+
+    Pieces are collected in a list and joined once, so the cost is linear in
+    the size of the document. Table cells are tab separated, one row per
+    line, and list items are indented by nesting level. With `structured`,
+    `blocks` also gets one dict per heading, paragraph, list item, table
+    (as a grid of cell texts) and section break. Hyperlink targets are
+    collected in `links`, in order of first appearance.
+    """
+
+    def __init__(self, structured=False):
+        self.blocks = [] if structured else None
+        self.footnote_ids = []
+        self.links = []
+
+    def text(self, content):
+        parts = []
+        self._walk(content, parts, self.blocks)
+        return ''.join(parts)
+
+    def _walk(self, content, parts, blocks):
+        for element in content:
+            if 'paragraph' in element:
+                self._paragraph(element['paragraph'], parts, blocks)
+            elif 'table' in element:
+                self._table(element['table'], parts, blocks)
+            elif 'tableOfContents' in element:
+                self._walk(element['tableOfContents'].get('content', []), parts, None)
+            elif 'sectionBreak' in element and blocks:
+                # Every body starts with a section break, so only the ones after content are kept
+                blocks.append({'type': 'section_break'})
+
+    def _paragraph(self, paragraph, parts, blocks):
+        pieces = []
+        for element in paragraph.get('elements', []):
+            if 'textRun' in element:
+                pieces.append(element['textRun'].get('content', ''))
+                # Link targets are only in the text style, so they are kept separately
+                url = element['textRun'].get('textStyle', {}).get('link', {}).get('url')
+                if url and url not in self.links:
+                    self.links.append(url)
+            elif 'footnoteReference' in element:
+                reference = element['footnoteReference']
+                self.footnote_ids.append(reference.get('footnoteId'))
+                pieces.append(f"[{reference.get('footnoteNumber', '')}]")
+        text = ''.join(pieces)
+
+        bullet = paragraph.get('bullet')
+        level = bullet.get('nestingLevel', 0) if bullet is not None else 0
+        if bullet is not None:
+            parts.append('  ' * level + '* ')
+        parts.append(text)
+
+        text = text.rstrip('\n')
+        if blocks is None or not text:
+            return
+        style = paragraph.get('paragraphStyle', {}).get('namedStyleType')
+        if style in HEADING_LEVELS:
+            blocks.append({'type': 'heading', 'level': HEADING_LEVELS[style], 'text': text})
+        elif bullet is not None:
+            blocks.append({'type': 'list_item', 'level': level, 'list_id': bullet.get('listId'), 'text': text})
+        else:
+            blocks.append({'type': 'paragraph', 'text': text})
+
+    def _table(self, table, parts, blocks):
+        rows = []
+        for row in table.get('tableRows', []):
+            cells = []
+            for cell in row.get('tableCells', []):
+                cell_parts = []
+                # Nested tables are flattened into the text of their cell
+                self._walk(cell.get('content', []), cell_parts, None)
+                cells.append(''.join(cell_parts).rstrip('\n'))
+            parts.append('\t'.join(cells))
+            parts.append('\n')
+            rows.append(cells)
+        if blocks is not None:
+            blocks.append({'type': 'table', 'rows': rows})
+
+def _describe_google_response(result):
+    response, content = result
+    status = response.status
+    # Older quota errors come back as 403 with a rateLimitExceeded/userRateLimitExceeded reason
+    if status == 403 and isinstance(content, bytes) and (b'rateLimitExceeded' in content or b'RateLimitExceeded' in content):
+        status = 429
+    return status, response
+
+def _is_transient(error):
+    """Whether a failed read is worth retrying: server errors, throttling and network failures."""
+    if isinstance(error, HttpError):
+        return error.resp.status in RETRY_STATUSES
+    return isinstance(error, (OSError, httplib2.HttpLib2Error))
+
+class _ScheduledHttp:
+    """Wraps authorized httplib2 clients so every API request goes through the request scheduler.
+
+    httplib2 clients are not thread-safe, so each request checks one out of
+    a pool of at most `size` clients from `new_http()`, while the service
+    built on top of this one is shared. Clients outlive the threads that use
+    them, so the server's thread per request and read_many's worker threads
+    reuse open TLS connections.
+    """
+
+    def __init__(self, new_http, scheduler, source, credential, size=DEFAULT_READ_WORKERS):
+        self.new_http = new_http
+        self.scheduler = scheduler
+        self.source = source
+        self.credential = credential
+        self.size = size
+        # LIFO, so that the most recently used clients, whose connections are most likely still open, go first
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _checkout(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            create = self._created < self.size
+            if create:
+                self._created += 1
+        if not create:
+            return self._idle.get()
+        try:
+            return self.new_http()
+        except BaseException:
+            with self._lock:
+                self._created -= 1
+            raise
+
+    def _send(self, uri, method, body, headers, kwargs):
+        http = self._checkout()
+        try:
+            return http.request(uri, method=method, body=body, headers=headers, **kwargs)
+        finally:
+            self._idle.put(http)
+
+    def request(self, uri, method='GET', body=None, headers=None, **kwargs):
+        return self.scheduler.send(
+            self.source,
+            lambda: self._send(uri, method, body, headers, kwargs),
+            credential=self.credential,
+            describe=_describe_google_response,
+            size=lambda result: len(result[1] or b'')
+        )
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        http = self._checkout()
+        try:
+            return getattr(http, name)
+        finally:
+            self._idle.put(http)
 
 class GoogleDocReader:
-    def __init__(self):
-        self.docs_service = None
-        self.sheets_service = None
+    def __init__(self, cache=None, scheduler=None, search_index=None, max_connections=None):
+        self.cache = cache
+        self.max_connections = max_connections
+        self.search_index = search_index
+        self.scheduler = scheduler or default_scheduler()
+        # Credentials and services are only set up on first use, so constructing a reader is free
+        self._credentials = None
+        self._credentials_loaded = False
+        self._credential_manager = None
+        self._services = {}
+        self._lock = threading.Lock()
+
+    @property
+    def docs_service(self):
+        return self._get_service('docs', 'v1')
+
+    @property
+    def sheets_service(self):
+        return self._get_service('sheets', 'v4')
+
+    def _get_service(self, name, version):
+        with self._lock:
+            if name not in self._services:
+                credentials = self._load_credentials()
+                service = None
+                if credentials is not None:
+                    try:
+                        # Use the discovery documents bundled with googleapiclient instead of fetching them
+                        credential = getattr(credentials, 'service_account_email', None) or 'oauth'
+                        # build_http() sets googleapiclient's socket timeout, which a bare httplib2.Http() lacks
+                        http = _ScheduledHttp(lambda: AuthorizedHttp(credentials, http=build_http()),
+                                              self.scheduler, f'google-{name}', credential,
+                                              size=self.max_connections or DEFAULT_READ_WORKERS)
+                        service = build(name, version, http=http, static_discovery=True, cache_discovery=False)
+                    except Exception as e:
+                        logger.warning("Could not build the Google %s service: %s", name, e)
+                self._services[name] = service
+            return self._services[name]
+
+    def _load_credentials(self):
+        if self._credentials_loaded:
+            return self._credentials
+        self._credentials_loaded = True
         try:
             credentials_path = self._find_credentials_file()
-            token_path = os.path.join(os.path.dirname(credentials_path), 'token.pickle')
+            token_dir = os.path.dirname(credentials_path)
             
             if not os.path.exists(credentials_path):
                 raise FileNotFoundError(f"Credentials file not found at {credentials_path}")
 
             with open(credentials_path, 'r') as f:
                 cred_data = json.load(f)
-                print("Credential file contents:")
-                self._print_nested_keys(cred_data)
 
             if 'installed' in cred_data:
-                print("OAuth 2.0 Client ID detected. Using OAuth flow.")
-                credentials = self._get_oauth_credentials(cred_data['installed'], token_path)
+                logger.debug("OAuth 2.0 Client ID detected. Using OAuth flow.")
+                self._credential_manager = CredentialManager(os.path.join(token_dir, 'token.json'), SCOPES,
+                                                             legacy_path=os.path.join(token_dir, 'token.pickle'))
+                self._credentials = self._get_oauth_credentials(cred_data['installed'])
             else:
-                print("Attempting to use Service Account credentials.")
-                credentials = service_account.Credentials.from_service_account_file(
+                logger.debug("Attempting to use Service Account credentials.")
+                self._credential_manager = CredentialManager()
+                self._credentials = service_account.Credentials.from_service_account_file(
                     credentials_path,
-                    scopes=['https://www.googleapis.com/auth/documents.readonly', 'https://www.googleapis.com/auth/spreadsheets.readonly']
+                    scopes=SCOPES
                 )
-
-            self.docs_service = build('docs', 'v1', credentials=credentials)
-            self.sheets_service = build('sheets', 'v4', credentials=credentials)
+            # Refreshed ahead of expiry from now on, so requests never wait on a token refresh
+            self._credential_manager.start(self._credentials)
         except Exception as e:
-            print(f"An error occurred during initialization: {str(e)}")
-            # Don't raise an exception here, allow the object to be created with uninitialized services
+            logger.warning("Could not load Google credentials: %s", e)
+            # Don't raise an exception here, leave the services uninitialized
+        return self._credentials
 
     def _find_credentials_file(self):
         # Check current directory
@@ -51,78 +354,201 @@ class GoogleDocReader:
             return home_creds
         raise FileNotFoundError("google-credentials.json not found in current or home directory")
 
-    def _print_nested_keys(self, data, prefix=''):
-        if isinstance(data, dict):
-            for key, value in data.items():
-                new_prefix = f"{prefix}.{key}" if prefix else key
-                if isinstance(value, (dict, list)):
-                    self._print_nested_keys(value, new_prefix)
-                else:
-                    print(f"- {new_prefix}")
-        elif isinstance(data, list):
-            for i, item in enumerate(data):
-                new_prefix = f"{prefix}[{i}]"
-                self._print_nested_keys(item, new_prefix)
-
-    def _get_oauth_credentials(self, client_config, token_path):
-        scopes = ['https://www.googleapis.com/auth/documents.readonly', 'https://www.googleapis.com/auth/spreadsheets.readonly']
-        creds = None
-        if os.path.exists(token_path):
+    def _get_oauth_credentials(self, client_config):
+        creds = self._credential_manager.load()
+        if creds is None:
             try:
-                with open(token_path, 'rb') as token:
-                    creds = pickle.load(token)
-            except (pickle.UnpicklingError, AttributeError):
-                print("Error loading token, proceeding with new authentication.")
-                creds = None
-        
-        if not creds or not creds.valid:
-            if creds and creds.expired and creds.refresh_token:
-                creds.refresh(Request())
-            else:
-                try:
-                    flow = Flow.from_client_config(
-                        {"installed": client_config},
-                        scopes=scopes
-                    )
-                    creds = flow.run_local_server(port=0)
-                except AttributeError:
-                    print("Falling back to InstalledAppFlow for OAuth authentication.")
-                    flow = InstalledAppFlow.from_client_config(
-                        {"installed": client_config},
-                        scopes=scopes
-                    )
-                    creds = flow.run_local_server(port=0)
-            
-            with open(token_path, 'wb') as token:
-                pickle.dump(creds, token)
-        
+                flow = Flow.from_client_config(
+                    {"installed": client_config},
+                    scopes=SCOPES
+                )
+                creds = flow.run_local_server(port=0)
+            except AttributeError:
+                logger.debug("Falling back to InstalledAppFlow for OAuth authentication.")
+                flow = InstalledAppFlow.from_client_config(
+                    {"installed": client_config},
+                    scopes=SCOPES
+                )
+                creds = flow.run_local_server(port=0)
+            self._credential_manager.store(creds)
         return creds
 
-    def read_document(self, url):
+    def close(self):
+        """Stop refreshing the credentials in the background."""
+        if self._credential_manager is not None:
+            self._credential_manager.close()
+
+    @indexed('google')
+    @metrics.instrument('google-docs')
+    def read_document(self, url, structured=False):
         if not self.docs_service:
             raise RuntimeError("Google Docs service is not initialized. Check your credentials.")
         doc_id = self._extract_id_from_url(url)
-        document = self.docs_service.documents().get(documentId=doc_id).execute()
-        content = ''
-        for element in document.get('body', {}).get('content', []):
-            if 'paragraph' in element:
-                for para_element in element['paragraph']['elements']:
-                    if 'textRun' in para_element:
-                        content += para_element['textRun']['content']
-        return {
+        if self.cache is None:
+            return self._document_info(self.docs_service.documents().get(documentId=doc_id).execute(), structured)
+
+        def fetch():
+            document = self.docs_service.documents().get(documentId=doc_id).execute()
+            return self._document_info(document, structured), document.get('revisionId')
+
+        def revalidate(revision_id):
+            latest = self.docs_service.documents().get(documentId=doc_id, fields='revisionId').execute()
+            return latest.get('revisionId') == revision_id
+
+        return self.cache.fetch(f"gdoc:{doc_id}" + ('?blocks' if structured else ''), fetch, revalidate)
+
+    def _document_info(self, document, structured=False):
+        body = _DocumentText(structured)
+        info = {
             'title': document.get('title', ''),
-            'content': content
+            'content': body.text(document.get('body', {}).get('content', []))
         }
+        for key in ('headers', 'footers'):
+            sections = document.get(key) or {}
+            if sections:
+                info[key] = [_DocumentText().text(section.get('content', [])) for section in sections.values()]
+        footnotes = document.get('footnotes') or {}
+        if footnotes:
+            # Footnotes in the order they are referenced, then any that never are
+            order = [footnote_id for footnote_id in dict.fromkeys(body.footnote_ids + list(footnotes))
+                     if footnote_id in footnotes]
+            info['footnotes'] = [_DocumentText().text(footnotes[footnote_id].get('content', []))
+                                 for footnote_id in order]
+        if body.links:
+            info['links'] = body.links
+        if structured:
+            info['blocks'] = body.blocks
+        return info
 
-    def read_sheet(self, url):
+    @metrics.instrument('google-sheets')
+    def read_sheet(self, url, cell_range=None, sheet=None, value_render_option=None):
         if not self.sheets_service:
             raise RuntimeError("Google Sheets service is not initialized. Check your credentials.")
         sheet_id = self._extract_id_from_url(url)
-        result = self.sheets_service.spreadsheets().values().get(
+        a1_range = _a1_range(sheet, cell_range)
+
+        def fetch():
+            result = self.sheets_service.spreadsheets().values().get(
+                spreadsheetId=sheet_id,
+                range=a1_range,
+                **_render_options(value_render_option)
+            ).execute()
+            # The Sheets API has no cheap revision check, so sheets are cached for the TTL only
+            return result.get('values', []), None
+
+        if self.cache is None:
+            return fetch()[0]
+        return self.cache.fetch(f"gsheet:{sheet_id}?range={a1_range}&render={value_render_option or ''}", fetch)
+
+    @metrics.instrument('google')
+    def read_many(self, urls, workers=DEFAULT_READ_WORKERS, retries=2, return_exceptions=False):
+        """Read Docs and Sheets concurrently, returning their results in the order of `urls`.
+
+        Reads run on `workers` threads, each with its own HTTP client, and a
+        URL given more than once is read once. A read that fails with a
+        server or network error is retried on its own up to `retries` times
+        (throttling is already retried by the scheduler). With
+        `return_exceptions`, failed reads are returned as their exception
+        instead of raising the first one.
+        """
+        unique = list(dict.fromkeys(urls))
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(unique)))) as pool:
+            futures = {url: pool.submit(metrics.bind(self._read_with_retries), url, retries) for url in unique}
+            results = {}
+            for url, future in futures.items():
+                try:
+                    results[url] = future.result()
+                except Exception as e:
+                    if not return_exceptions:
+                        raise
+                    results[url] = e
+        return [results[url] for url in urls]
+
+    def _read_with_retries(self, url, retries):
+        for attempt in range(retries + 1):
+            try:
+                return self.read_url(url)
+            except Exception as e:
+                if attempt >= retries or not _is_transient(e):
+                    raise
+                time.sleep(self.scheduler.base_delay * 2 ** attempt)
+
+    def read_url(self, url):
+        if 'document' in url:
+            return self.read_document(url)
+        if 'spreadsheets' in url:
+            return self.read_sheet(url)
+        raise ValueError(f"Invalid Google URL: {url}")
+
+    @metrics.instrument('google-sheets')
+    def read_sheet_ranges(self, url, ranges, sheet=None, value_render_option=None):
+        """Read several ranges with a single batchGet request, in the order given."""
+        if not self.sheets_service:
+            raise RuntimeError("Google Sheets service is not initialized. Check your credentials.")
+        sheet_id = self._extract_id_from_url(url)
+        result = self.sheets_service.spreadsheets().values().batchGet(
+            spreadsheetId=sheet_id,
+            ranges=[_a1_range(sheet, cell_range) for cell_range in ranges],
+            **_render_options(value_render_option)
+        ).execute()
+        return [
+            {'range': value_range.get('range'), 'values': value_range.get('values', [])}
+            for value_range in result.get('valueRanges', [])
+        ]
+
+    @metrics.instrument('google-sheets')
+    def iter_sheet_rows(self, url, sheet=None, chunk_rows=DEFAULT_CHUNK_ROWS, value_render_option=None):
+        """Yield the rows of a tab, fetching them `chunk_rows` at a time.
+
+        The tab is `sheet`, else the tab in the URL's `gid`, else the first
+        one. Blank rows between data rows are yielded as empty lists and
+        trailing blank rows are dropped, just like a single values().get().
+        """
+        if not self.sheets_service:
+            raise RuntimeError("Google Sheets service is not initialized. Check your credentials.")
+        sheet_id = self._extract_id_from_url(url)
+        title, row_count = self._sheet_properties(sheet_id, sheet, _extract_gid(url))
+
+        metrics.pages(math.ceil(row_count / chunk_rows))
+        blank_rows = 0
+        for start in range(1, row_count + 1, chunk_rows):
+            end = min(start + chunk_rows - 1, row_count)
+            result = self.sheets_service.spreadsheets().values().get(
+                spreadsheetId=sheet_id,
+                range=_a1_range(title, f"A{start}:ZZ{end}"),
+                **_render_options(value_render_option)
+            ).execute()
+            values = result.get('values', [])
+            for row in values:
+                if not row:
+                    blank_rows += 1
+                    continue
+                for _ in range(blank_rows):
+                    yield []
+                blank_rows = 0
+                yield row
+            # The API leaves out blank rows at the end of a window
+            blank_rows += (end - start + 1) - len(values)
+
+    @metrics.instrument('google-sheets')
+    def read_sheet_columns(self, url, sheet=None, header=True, chunk_rows=DEFAULT_CHUNK_ROWS, as_numpy=False):
+        """Read a tab as typed columns, see rows_to_columns."""
+        rows = self.iter_sheet_rows(url, sheet, chunk_rows, value_render_option='UNFORMATTED_VALUE')
+        return rows_to_columns(rows, header=header, as_numpy=as_numpy)
+
+    def _sheet_properties(self, sheet_id, sheet=None, gid=None):
+        metadata = self.sheets_service.spreadsheets().get(
             spreadsheetId=sheet_id,
-            range='A1:ZZ'
+            fields='sheets.properties(sheetId,title,gridProperties.rowCount)'
         ).execute()
-        return result.get('values', [])
+        tabs = [tab['properties'] for tab in metadata.get('sheets', [])]
+        for properties in tabs:
+            if sheet is not None and properties['title'] != sheet:
+                continue
+            if sheet is None and gid is not None and str(properties.get('sheetId')) != gid:
+                continue
+            return properties['title'], properties.get('gridProperties', {}).get('rowCount', 0)
+        raise ValueError(f"Sheet not found: {sheet if sheet is not None else f'gid={gid}'}")
 
     def _extract_id_from_url(self, url):
         parsed_url = urlparse(url)
@@ -1,21 +1,91 @@
 import os
+import hashlib
+import functools
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from urllib.parse import urlparse, unquote
 from jira import JIRA
 from atlassian import Confluence
 from atlassian.errors import ApiError
+from requests.adapters import DEFAULT_POOLSIZE, HTTPAdapter
+from src.timestamps import parse_timestamp
+from src.rate_limit import default_scheduler
+from src.metrics import metrics
+from src.search_index import indexed
+from src.storage_format import convert_storage
+
+TICKET_FIELDS = 'summary,description,comment,updated'
+# Keeps `key in (...)` queries well under URL length limits
+KEYS_PER_QUERY = 100
+CRAWL_PAGE_SIZE = 100
+# Page metadata listed by a crawl; bodies are fetched separately, concurrently
+CRAWL_EXPAND = 'version,ancestors,space'
+
+logger = logging.getLogger(__name__)
+
+class _ScheduledAdapter(HTTPAdapter):
+    """Sends every request of a session through the request scheduler."""
+
+    def __init__(self, scheduler, source, credential, **kwargs):
+        self.scheduler = scheduler
+        self.source = source
+        self.credential = credential
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        # Reading the body here costs nothing extra unless the caller streams it
+        size = None if kwargs.get('stream') else (lambda response: len(response.content))
+        return self.scheduler.send(self.source, functools.partial(HTTPAdapter.send, self, request, **kwargs),
+                                   credential=self.credential, size=size)
+
+def _mount_scheduled_adapter(session, scheduler, source, credential, max_connections=None):
+    # One keep-alive pool per host, large enough for every concurrent request
+    pool_size = max_connections or DEFAULT_POOLSIZE
+    adapter = _ScheduledAdapter(scheduler, source, credential, pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+
+def _text_hash(text):
+    return hashlib.sha1((text or '').encode('utf-8')).hexdigest()
 
 class JiraAndConfluenceReader:
-    def __init__(self):
+    def __init__(self, cache=None, max_connections=None, scheduler=None, search_index=None):
+        self.cache = cache
+        self.search_index = search_index
+        self.scheduler = scheduler or default_scheduler()
+        self._spaces = {}
+        self._page_ids = {}
         self.domain = os.getenv('JIRA_DOMAIN')
         self.email = os.getenv('JIRA_EMAIL')
         self.token = os.getenv('JIRA_TOKEN')
-        self.jira = JIRA(server=self.domain, basic_auth=(self.email, self.token))
-        self.confluence = Confluence(
-            url=self.domain,
-            username=self.email,
-            password=self.token,
-            cloud=True
-        )
+        self.max_connections = max_connections
+        # JIRA() contacts the server as soon as it is built, so the clients are only created on first use
+        self._jira = None
+        self._confluence = None
+        self._lock = threading.Lock()
+
+    @property
+    def jira(self):
+        with self._lock:
+            if self._jira is None:
+                self._jira = JIRA(server=self.domain, basic_auth=(self.email, self.token))
+                _mount_scheduled_adapter(self._jira._session, self.scheduler, 'jira', self.email, self.max_connections)
+            return self._jira
+
+    @property
+    def confluence(self):
+        with self._lock:
+            if self._confluence is None:
+                self._confluence = Confluence(
+                    url=self.domain,
+                    username=self.email,
+                    password=self.token,
+                    cloud=True
+                )
+                _mount_scheduled_adapter(self._confluence._session, self.scheduler, 'confluence', self.email,
+                                         self.max_connections)
+            return self._confluence
 
     def check_confluence_connection(self):
         try:
@@ -24,66 +94,428 @@ class JiraAndConfluenceReader:
         except Exception as e:
             return str(e)
 
+    @indexed('jira')
+    @metrics.instrument('jira')
     def read_ticket(self, ticket_key):
-        issue = self.jira.issue(ticket_key)
+        if self.cache is None:
+            return self._ticket_info(self.jira.issue(ticket_key))
+
+        def fetch():
+            issue = self.jira.issue(ticket_key)
+            return self._ticket_info(issue), issue.fields.updated
+
+        def revalidate(updated):
+            return self.jira.issue(ticket_key, fields='updated').fields.updated == updated
+
+        # Keyed by the ticket's URL, so that the same key on another Jira site is another entry
+        return self.cache.fetch(f"jira:{self.domain}/browse/{ticket_key}", fetch, revalidate)
+
+    @metrics.instrument('jira')
+    def sync_ticket(self, ticket_key, watermark=None, since=None):
+        """Return (changes, watermark) for a ticket, given the watermark of the previous sync.
+
+        An unchanged ticket costs one request for its `updated` field.
+        Otherwise changes holds the comments newer than the last seen comment
+        id, plus the summary and description if they were edited. On a first
+        sync, `since` drops older comments, and a ticket not updated after
+        `since` reports no changes.
+        """
+        watermark = watermark or {}
+        if watermark.get('updated'):
+            if self.jira.issue(ticket_key, fields='updated').fields.updated == watermark['updated']:
+                return None, watermark
+
+        issue = self.jira.issue(ticket_key, fields=TICKET_FIELDS)
+        fields = issue.fields
+        comments = fields.comment.comments
+        if getattr(fields.comment, 'total', len(comments)) > len(comments):
+            comments = self.jira.comments(ticket_key)
+
+        new_watermark = {
+            'updated': fields.updated,
+            'summary_hash': _text_hash(fields.summary),
+            'description_hash': _text_hash(fields.description),
+        }
+        first_sync = not watermark
+        last_id = int(watermark.get('last_comment_id', 0))
+        new_comments = [
+            comment for comment in comments
+            if int(comment.id) > last_id
+            and not (first_sync and since is not None and parse_timestamp(comment.created) <= since)
+        ]
+        new_watermark['last_comment_id'] = max([last_id] + [int(comment.id) for comment in comments])
+
+        if first_sync and since is not None and parse_timestamp(fields.updated) <= since:
+            return None, new_watermark
+        changes = {}
+        if new_watermark['summary_hash'] != watermark.get('summary_hash'):
+            changes['summary'] = fields.summary
+        if new_watermark['description_hash'] != watermark.get('description_hash'):
+            changes['description'] = fields.description
+        if new_comments:
+            changes['new_comments'] = [{'id': comment.id, 'body': comment.body} for comment in new_comments]
+        if not changes:
+            return None, new_watermark
+        return dict({'key': issue.key, 'updated': fields.updated}, **changes), new_watermark
+
+    @indexed('jira')
+    @metrics.instrument('jira')
+    def read_tickets(self, keys=None, jql=None, max_results=100):
+        """Yield tickets for `keys` or for every issue matching `jql`, one search page at a time.
+
+        Uses paginated JQL search with only the summary, description and
+        comment fields, so thousands of issues cost a few dozen requests
+        instead of one `issue()` call each.
+        """
+        if (keys is None) == (jql is None):
+            raise ValueError("Pass either keys or jql")
+        if keys is not None:
+            keys = list(keys)
+            queries = [f"key in ({', '.join(keys[i:i + KEYS_PER_QUERY])})" for i in range(0, len(keys), KEYS_PER_QUERY)]
+        else:
+            queries = [jql]
+
+        for query in queries:
+            for issue in self._search_issues(query, max_results):
+                yield self._raw_ticket_info(issue)
+
+    def _search_issues(self, jql, max_results):
+        if self.jira.deploymentType == 'Cloud':
+            return self._search_issues_by_token(jql, max_results)
+        return self._search_issues_by_offset(jql, max_results)
+
+    def _search_issues_by_token(self, jql, max_results):
+        # Jira Cloud only supports token based pagination for search
+        token = None
+        pages = 0
+        try:
+            while True:
+                page = self.jira.enhanced_search_issues(jql, nextPageToken=token, maxResults=max_results,
+                                                        fields=TICKET_FIELDS, json_result=True)
+                pages += 1
+                yield from page.get('issues', [])
+                token = page.get('nextPageToken')
+                if page.get('isLast', True) or not token:
+                    return
+        finally:
+            metrics.pages(pages)
+
+    def _search_issues_by_offset(self, jql, max_results):
+        start = 0
+        pages = 0
+        try:
+            while True:
+                page = self.jira.search_issues(jql, startAt=start, maxResults=max_results,
+                                               fields=TICKET_FIELDS, json_result=True)
+                pages += 1
+                issues = page.get('issues', [])
+                yield from issues
+                start += len(issues)
+                if not issues or start >= page.get('total', 0):
+                    return
+        finally:
+            metrics.pages(pages)
+
+    def _raw_ticket_info(self, issue):
+        fields = issue.get('fields', {})
+        comment = fields.get('comment') or {}
+        comments = [c.get('body') for c in comment.get('comments', [])]
+        if comment.get('total', 0) > len(comments):
+            # Search results only embed the first page of comments
+            comments = [c.body for c in self.jira.comments(issue['key'])]
+        return {
+            'key': issue['key'],
+            'summary': fields.get('summary'),
+            'description': fields.get('description'),
+            'updated': fields.get('updated'),
+            'comments': comments
+        }
+
+    def _ticket_info(self, issue):
         return {
             'key': issue.key,
             'summary': issue.fields.summary,
             'description': issue.fields.description,
+            'updated': issue.fields.updated,
             'comments': [comment.body for comment in issue.fields.comment.comments]
         }
 
-    def read_confluence_page_by_url(self, url):
-        print(f"Attempting to read Confluence page: {url}")
+    @indexed('confluence')
+    @metrics.instrument('confluence')
+    def read_confluence_page_by_url(self, url, content_format='storage'):
+        """Read a page, with its body as storage format XHTML, plain 'text' or 'markdown'."""
+        if self.cache is None:
+            return self._confluence_page_info(self._fetch_confluence_page(url), content_format)
+
+        def fetch():
+            page = self._fetch_confluence_page(url)
+            if 'error' in page:
+                return page, None
+            return self._confluence_page_info(page, content_format), [page['id'], page.get('version', {}).get('number')]
+
+        def revalidate(validator):
+            page_id, version = validator
+            return self.confluence.get_page_by_id(page_id, expand='version')['version']['number'] == version
+
+        # The page is read from JIRA_DOMAIN whatever host the URL names
+        key = f"confluence:{self.domain}?url={url}"
+        if content_format != 'storage':
+            key += f"&format={content_format}"
+        return self.cache.fetch(key, fetch, revalidate,
+                                should_store=lambda result: 'error' not in result)
+
+    @metrics.instrument('confluence')
+    def sync_confluence_page(self, url, watermark=None, since=None):
+        """Return (changes, watermark) for a page, given the watermark of the previous sync.
+
+        An unchanged page costs one request for its version number. A new
+        version is returned in full along with the previous version number. On
+        a first sync, a page last changed before `since` reports no changes.
+        """
+        watermark = watermark or {}
+        if watermark.get('id'):
+            version = self.confluence.get_page_by_id(watermark['id'], expand='version')['version']
+            if version['number'] == watermark['version']:
+                return None, watermark
+
+        page = self._fetch_confluence_page(url)
+        if 'error' in page:
+            raise RuntimeError(page['error'])
+        version = page.get('version', {})
+        new_watermark = {'id': page['id'], 'version': version.get('number')}
+        if not watermark and since is not None and version.get('when') and parse_timestamp(version['when']) <= since:
+            return None, new_watermark
+        changes = self._confluence_page_info(page)
+        changes['version'] = version.get('number')
+        changes['previous_version'] = watermark.get('version')
+        return changes, new_watermark
+
+    @indexed('confluence')
+    @metrics.instrument('confluence')
+    def crawl_confluence(self, target, checkpoint=None, workers=8, page_size=CRAWL_PAGE_SIZE, content_format='storage'):
+        """Yield every page of a space (by key) or under a root page (by URL or id), root included.
+
+        Pages are listed with paginated CQL content search, with the next
+        listing page fetched while the bodies of the current one are fetched
+        `workers` at a time; pages are yielded as their bodies arrive. With a
+        CrawlCheckpoint, progress is saved after every listing page and when
+        the crawl stops, and a crawl of the same target and format resumes
+        where it stopped without yielding pages again. Bodies are converted
+        to `content_format` on the worker threads. A page that cannot be read
+        is yielded as `{'id', 'error'}` and the crawl goes on; its id stays
+        in the checkpoint, and the next crawl of the target reads it again
+        without listing the pages already written.
+        """
+        cql, root_id = self._crawl_query(target)
+        if checkpoint is not None:
+            checkpoint.start(cql, content_format)
+        resume = checkpoint.next if checkpoint is not None else None
+        listed = checkpoint is not None and checkpoint.listed
+        # Pages that failed in an earlier run, read again unless the listing comes across them first
+        retry = set(checkpoint.failed) if checkpoint is not None else set()
+
+        def pending(page_id):
+            return checkpoint is None or page_id not in checkpoint.done
+
+        def settle(record):
+            retry.discard(record['id'])
+            if checkpoint is None:
+                return
+            if 'error' in record:
+                checkpoint.fail(record['id'])
+            else:
+                checkpoint.mark(record['id'])
+
+        listings = 0
+        try:
+            if root_id is not None and resume is None and not listed and pending(root_id):
+                record = self._crawl_page_by_id(root_id, content_format)
+                yield record
+                settle(record)
+
+            if not listed:
+                with ThreadPoolExecutor(max_workers=workers) as pool:
+                    get = metrics.bind(self.confluence.get)
+                    if resume is None:
+                        listing = pool.submit(get, 'rest/api/content/search',
+                                              params={'cql': cql, 'limit': page_size, 'expand': CRAWL_EXPAND})
+                    else:
+                        listing = pool.submit(get, resume.lstrip('/'))
+                    futures = []
+                    try:
+                        while listing is not None:
+                            page = listing.result()
+                            listings += 1
+                            next_link = page.get('_links', {}).get('next')
+                            listing = pool.submit(get, next_link.lstrip('/')) if next_link else None
+                            futures = {pool.submit(metrics.bind(self._crawl_page), item, content_format): item['id']
+                                       for item in page.get('results', []) if pending(item['id'])}
+                            for future in as_completed(futures):
+                                try:
+                                    record = future.result()
+                                except Exception as e:
+                                    record = self._crawl_error(futures[future], e)
+                                yield record
+                                settle(record)
+                            if checkpoint is not None and next_link:
+                                checkpoint.advance(next_link)
+                    except BaseException:
+                        # Leaving the pool waits for queued work, so drop the bodies nobody will read
+                        for future in list(futures) + [listing]:
+                            if future is not None:
+                                future.cancel()
+                        raise
+                if checkpoint is not None:
+                    checkpoint.listed = True
+
+            for page_id in sorted(retry):
+                record = self._crawl_page_by_id(page_id, content_format)
+                yield record
+                settle(record)
+        except BaseException:
+            if checkpoint is not None:
+                checkpoint.save()
+            raise
+        finally:
+            metrics.pages(listings)
+        if checkpoint is not None:
+            if checkpoint.failed:
+                # Kept so that the next run reads only the pages that failed
+                checkpoint.save()
+            else:
+                checkpoint.finish()
+
+    def _crawl_page_by_id(self, page_id, content_format):
+        try:
+            page = self.confluence.get_page_by_id(page_id, expand=CRAWL_EXPAND + ',body.storage')
+            return self._crawl_page(page, content_format)
+        except Exception as e:
+            return self._crawl_error(page_id, e)
+
+    def _crawl_error(self, page_id, error):
+        # One unreadable page must not end the export
+        logger.warning("Could not read Confluence page %s: %s", page_id, error)
+        return {'id': page_id, 'error': str(error)}
+
+    def _crawl_query(self, target):
+        """Return the CQL for a crawl target and the id of its root page, if any."""
+        root_id = None
+        space_key = target
+        if target.isdigit():
+            root_id = target
+        elif target.startswith('http'):
+            space_key, root_id, title = self._parse_confluence_url(target)
+            if root_id is None and title is not None:
+                page = self.confluence.get_page_by_title(space_key, title)
+                if not page:
+                    raise ValueError(f"Page '{title}' not found in space {space_key}")
+                root_id = page['id']
+        if root_id is not None:
+            return f'ancestor = {root_id} and type = page', root_id
+        return f'space = "{space_key}" and type = page', None
+
+    def _crawl_page(self, item, content_format='storage'):
+        body = item.get('body')
+        if not body:
+            body = self.confluence.get_page_by_id(item['id'], expand='body.storage')['body']
+        ancestors = item.get('ancestors') or []
+        version = item.get('version') or {}
+        return {
+            'id': item['id'],
+            'title': item['title'],
+            'space': (item.get('space') or {}).get('key'),
+            'parent_id': ancestors[-1]['id'] if ancestors else None,
+            'version': version.get('number'),
+            'updated': version.get('when'),
+            'content': convert_storage(body['storage']['value'], content_format),
+        }
+
+    def _confluence_page_info(self, page, content_format='storage'):
+        if 'error' in page:
+            return page
+        return {
+            'id': page['id'],
+            'title': page['title'],
+            'updated': (page.get('version') or {}).get('when'),
+            'content': convert_storage(page['body']['storage']['value'], content_format)
+        }
+
+    def _parse_confluence_url(self, url):
+        """Return (space_key, page_id, page_title) from a /spaces/<KEY>/pages/<id>/<title> URL.
+
+        Either page_id or page_title may be None; the last path segment is
+        used as a title when the URL carries no numeric page id.
+        """
+        path_parts = [part for part in urlparse(url).path.split('/') if part]
+        space_index = path_parts.index('spaces')
+        space_key = path_parts[space_index + 1]
+        page_id = None
+        page_title = None
+        rest = path_parts[space_index + 2:]
+        if len(rest) >= 2 and rest[0] == 'pages' and rest[1].isdigit():
+            page_id = rest[1]
+            rest = rest[2:]
+        if rest and rest[-1] != 'pages':
+            page_title = unquote(rest[-1].replace('+', ' '))
+        return space_key, page_id, page_title
+
+    def _fetch_confluence_page(self, url):
+        logger.debug("Attempting to read Confluence page: %s", url)
         try:
-            parsed_url = urlparse(url)
-            path_parts = parsed_url.path.split('/')
-            
-            # Find the index of 'spaces' in the path
             try:
-                space_index = path_parts.index('spaces')
-                space_key = path_parts[space_index + 1]
-                page_id = path_parts[-1]
-            except ValueError:
-                print("Error: Unable to parse space key from URL")
+                space_key, page_id, page_title = self._parse_confluence_url(url)
+            except (ValueError, IndexError):
+                logger.warning("Unable to parse space key from URL: %s", url)
                 return {'error': "Unable to parse space key from URL"}
-            
-            print(f"Extracted page_id: {page_id}, space_key: {space_key}")
-            
-            # Try to get space info to check permissions
-            try:
-                space_info = self.confluence.get_space(space_key)
-                print(f"Successfully accessed space: {space_key}")
-            except Exception as e:
-                print(f"Error accessing space {space_key}: {str(e)}")
-                return {'error': f"Error accessing Confluence space: {str(e)}"}
-            
-            # Try to get page by ID first
-            try:
-                page = self.confluence.get_page_by_id(page_id, expand='body.storage')
-                print(f"Successfully retrieved page with ID: {page_id}")
-                return {
-                    'id': page['id'],
-                    'title': page['title'],
-                    'content': page['body']['storage']['value']
-                }
-            except Exception as e:
-                print(f"Error retrieving page with ID {page_id}: {str(e)}")
-                
-                # If page ID fails, try by title
+
+            if page_id is None and page_title is not None:
+                page_id = self._page_ids.get((space_key, page_title))
+            logger.debug("Extracted page_id: %s, space_key: %s", page_id, space_key)
+
+            # Fast path: fetch the page directly and only look into the space when that fails
+            error = None
+            if page_id is not None:
                 try:
-                    page_title = unquote(page_id.replace('+', ' '))
-                    page = self.confluence.get_page_by_title(space_key, page_title, expand='body.storage')
-                    print(f"Successfully retrieved page by title: {page_title}")
-                    return {
-                        'id': page['id'],
-                        'title': page['title'],
-                        'content': page['body']['storage']['value']
-                    }
+                    page = self.confluence.get_page_by_id(page_id, expand='body.storage,version')
+                    if not page:
+                        raise ValueError(f"Page {page_id} not found")
+                    logger.debug("Retrieved page with ID: %s", page_id)
+                    return page
                 except Exception as e:
-                    print(f"Error retrieving page by title {page_title}: {str(e)}")
-                    return {'error': f"Error reading Confluence page: {str(e)}"}
-        
+                    logger.debug("Error retrieving page with ID %s: %s", page_id, e)
+                    error = e
+
+            if page_title is not None:
+                try:
+                    page = self.confluence.get_page_by_title(space_key, page_title, expand='body.storage,version')
+                    if not page:
+                        raise ValueError(f"Page '{page_title}' not found in space {space_key}")
+                    logger.debug("Retrieved page by title: %s", page_title)
+                    self._page_ids[(space_key, page_title)] = page['id']
+                    return page
+                except Exception as e:
+                    logger.debug("Error retrieving page by title %s: %s", page_title, e)
+                    error = e
+
+            space_error = self._check_space_access(space_key)
+            if space_error:
+                return {'error': f"Error accessing Confluence space: {space_error}"}
+            if error is None:
+                return {'error': "Unable to parse page id or title from URL"}
+            return {'error': f"Error reading Confluence page: {str(error)}"}
+
         except Exception as e:
-            print(f"Unexpected error: {str(e)}")
-            return {'error': f"Unexpected error reading Confluence page: {str(e)}"}
\ No newline at end of file
+            logger.exception("Unexpected error reading Confluence page %s", url)
+            return {'error': f"Unexpected error reading Confluence page: {str(e)}"}
+
+    def _check_space_access(self, space_key):
+        """Return why `space_key` cannot be accessed, or None if it can. Accessible spaces are memoized."""
+        if space_key in self._spaces:
+            return None
+        try:
+            self._spaces[space_key] = self.confluence.get_space(space_key)
+            logger.debug("Accessed space: %s", space_key)
+            return None
+        except Exception as e:
+            logger.warning("Error accessing space %s: %s", space_key, e)
+            return str(e)
@@ -0,0 +1,145 @@
+import re
+import html
+from src.batch import DEFAULT_WORKERS, run_batch
+from src.output import write_ndjson
+
+DEFAULT_MAX_DEPTH = 2
+DEFAULT_FAN_OUT = 20
+
+# Characters that end a URL in plain text, Jira wiki markup ([text|url]), Markdown and XHTML attributes
+_URL_END = r'[^\s"\'<>|\[\]()]*'
+
+GITHUB_PR_RE = re.compile(r'https?://github\.com/([\w.-]+)/([\w.-]+)/pull/(\d+)')
+GOOGLE_RE = re.compile(r'https?://docs\.google\.com/(?:document|spreadsheets)/d/([\w-]+)' + _URL_END)
+CONFLUENCE_RE = re.compile(r'https?://[^\s"\'<>|\[\]()/]+(?:/[^\s"\'<>|\[\]()/]+)*?/wiki/'
+                           r'(?:spaces/|pages/|display/|x/)' + _URL_END)
+JIRA_BROWSE_RE = re.compile(r'https?://[^\s"\'<>|\[\]()/]+(?:/[^\s"\'<>|\[\]()/]+)*?/browse/([A-Z][A-Z0-9_]+-\d+)')
+JIRA_KEY_RE = re.compile(r'(?<![\w/.=-])([A-Z][A-Z0-9_]+-\d+)(?![\w-])')
+CONFLUENCE_PAGE_ID_RE = re.compile(r'(?:/pages/|[?&]pageId=)(\d+)')
+
+# Fields that hold no references worth following, or repeat ones found elsewhere
+SKIPPED_FIELDS = ('file_changes', 'blocks', 'previous_version')
+
+
+def canonical(source, ref):
+    """Return (id, ref) for a reference: the id is the same for every way of writing the same object."""
+    if source == 'github':
+        match = GITHUB_PR_RE.search(ref)
+        if not match:
+            # A PR given by title has no repository until it is read
+            return f"github:title:{ref}", ref
+        owner, repo, number = match.groups()
+        return f"github:{owner.lower()}/{repo.lower()}#{number}", f"https://github.com/{owner}/{repo}/pull/{number}"
+    if source == 'google':
+        match = GOOGLE_RE.search(ref)
+        return f"google:{match.group(1) if match else ref}", ref
+    if source == 'confluence':
+        host = re.sub(r'^https?://', '', ref).split('/', 1)[0].lower()
+        match = CONFLUENCE_PAGE_ID_RE.search(ref)
+        return f"confluence:{host}/{match.group(1) if match else ref.split('#', 1)[0]}", ref
+    if source == 'jira':
+        return f"jira:{ref.upper()}", ref.upper()
+    raise ValueError(f"Unknown source: {source}")
+
+
+def _strings(value, skipped=SKIPPED_FIELDS):
+    if isinstance(value, str):
+        yield value
+    elif isinstance(value, dict):
+        for key, item in value.items():
+            if key not in skipped:
+                yield from _strings(item, skipped)
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            yield from _strings(item, skipped)
+
+
+def extract_links(source, result, projects=None):
+    """Return the (source, ref) pairs referenced by a reader result, in order of first appearance.
+
+    Every text field is scanned for GitHub PR, Google Docs/Sheets and
+    Confluence page URLs, Jira browse URLs and bare Jira keys. Bare keys
+    look like many other things (UTF-8, SHA-256...), so when `projects` is
+    given only keys of those Jira projects are kept. Links to the same
+    object are returned once, the first way they were written.
+    """
+    links = {}
+    for text in _strings(result):
+        if source == 'confluence':
+            # Storage format escapes the & of query strings
+            text = html.unescape(text)
+        matches = []
+        for pattern, kind in ((GITHUB_PR_RE, 'github'), (GOOGLE_RE, 'google'), (CONFLUENCE_RE, 'confluence'),
+                              (JIRA_BROWSE_RE, 'jira'), (JIRA_KEY_RE, 'jira')):
+            for match in pattern.finditer(text):
+                if kind == 'jira':
+                    ref = match.group(1)
+                    if projects is not None and ref.split('-', 1)[0] not in projects:
+                        continue
+                else:
+                    ref = match.group(0).rstrip('.,;:!?')
+                matches.append((match.start(), kind, ref))
+        for _, kind, ref in sorted(matches):
+            node_id, ref = canonical(kind, ref)
+            links.setdefault(node_id, (kind, ref))
+    return links
+
+
+def run_link_graph(seeds, readers, max_depth=DEFAULT_MAX_DEPTH, fan_out=DEFAULT_FAN_OUT, workers=DEFAULT_WORKERS,
+                   source_limits=None, write=write_ndjson, read=None, projects=None):
+    """Read `seeds` and everything they link to, breadth first, writing the graph as it is found.
+
+    Each level of the graph is read concurrently with `run_batch`, so the
+    per-source concurrency limits and batch priority apply. Objects are
+    deduplicated by their canonical id and each is read once. For each
+    object read, a `{"type": "node", "id", "source", "ref", "depth",
+    "result"|"error"}` record is written, followed by one `{"type": "edge",
+    "from", "to"}` record per link. At most `fan_out` links are followed
+    from each object, and objects more than `max_depth` links away from a
+    seed are not read: links from the last level are only written when they
+    point back into the graph. Returns the number of objects that failed.
+    """
+    read_entry = read or readers.read
+    seen = set()
+    level = []
+    for source, ref in seeds:
+        node_id, ref = canonical(source, ref)
+        if node_id not in seen:
+            seen.add(node_id)
+            level.append((node_id, source, ref))
+
+    failures = 0
+    for depth in range(max_depth + 1):
+        if not level:
+            break
+        children = {}
+
+        def write_node(record, level=level, depth=depth):
+            node_id = level[record['index']][0]
+            node = {'type': 'node', 'id': node_id, 'source': record['source'], 'ref': record['ref'], 'depth': depth}
+            if 'error' in record:
+                node['error'] = record['error']
+                write(node)
+                return
+            node['result'] = record['result']
+            links = [(link_id, link) for link_id, link in
+                     extract_links(record['source'], record['result'], projects).items() if link_id != node_id]
+            links = links[:fan_out]
+            # The links are followed once the whole level is read, in seed order rather than completion order
+            children[record['index']] = links
+            write(node)
+            for link_id, _ in links:
+                if depth < max_depth or link_id in seen:
+                    write({'type': 'edge', 'from': node_id, 'to': link_id})
+
+        failures += run_batch([(source, ref) for _, source, ref in level], readers, workers=workers,
+                              source_limits=source_limits, write=write_node, read=read_entry)
+        next_level = []
+        if depth < max_depth:
+            for index in sorted(children):
+                for link_id, (source, ref) in children[index]:
+                    if link_id not in seen:
+                        seen.add(link_id)
+                        next_level.append((link_id, source, ref))
+        level = next_level
+    return failures
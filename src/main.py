@@ -1,11 +1,16 @@
 import argparse
+import atexit
 import sys
 import json
 import os
+import logging
 from dotenv import load_dotenv
-from src.github_pr_reader import GitHubPRReader
-from src.google_doc_reader import GoogleDocReader
-from src.jira_ticket_reader import JiraAndConfluenceReader
+# Reader modules pull in heavy client libraries, so they are imported only for the selected source
+from src.sources import DEFAULT_PR_FIELDS, PR_FIELDS, SOURCES, JIRA_KEY_RE, SourceReaders
+from src.batch import DEFAULT_WORKERS, read_manifest, run_batch
+from src.link_graph import DEFAULT_FAN_OUT, DEFAULT_MAX_DEPTH
+from src.output import write_ndjson, write_json_stream, write_ndjson_stream
+from src.cache import DEFAULT_TTL, ResponseCache
 
 def load_environment():
     # Try to load .env from the current directory
@@ -21,76 +26,552 @@ def main():
     load_environment()
 
     parser = argparse.ArgumentParser(description='Read information from various sources')
+    parser.add_argument('command', nargs='?', choices=['serve', 'search'],
+                        help='serve: keep the readers running as a local server for --server clients; '
+                             'search QUERY: look up documents in the local --index')
+    parser.add_argument('query', nargs='?', help='With search, the words every result must contain')
+    parser.add_argument('--server', metavar='ADDRESS',
+                        help='With serve, where to listen; otherwise read through the server at ADDRESS. '
+                             'A socket path (default: ~/.multi-source-reader/server.sock) or HOST:PORT')
+    parser.add_argument('--server-token-file', metavar='FILE',
+                        help='Where serve writes the token clients must send, and where --server clients read it '
+                             '(default: next to the socket, or in ~/.multi-source-reader for HOST:PORT)')
+    parser.add_argument('--allow-remote', action='store_true',
+                        help='Let serve listen on a non-loopback HOST:PORT. Anyone with the token can then read '
+                             'with your credentials')
     parser.add_argument('-g', '--github', help='GitHub PR title or URL')
-    parser.add_argument('-d', '--google', help='Google Doc/Sheet URL')
-    parser.add_argument('-j', '--jira', help='Jira ticket key')
+    parser.add_argument('-d', '--google', help='Google Doc/Sheet URL, or comma-separated URLs to read concurrently')
+    parser.add_argument('-j', '--jira', help='Jira ticket key, comma-separated keys, or a JQL query')
     parser.add_argument('-c', '--confluence', help='Confluence page URL')
+    parser.add_argument('-b', '--batch', metavar='MANIFEST',
+                        help='Read every reference in a JSON/YAML/newline manifest ("-" for stdin) and print one JSON result per line')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                        help=f'Maximum number of concurrent reads in batch mode (default: {DEFAULT_WORKERS})')
+    parser.add_argument('--source-limit', action='append', default=[], metavar='SOURCE=N',
+                        help='Maximum concurrent reads for one source in batch mode, e.g. google=2 (repeatable)')
+    parser.add_argument('--crawl', metavar='SPACE|PAGE',
+                        help='Export every Confluence page of a space key, or under a page URL or id, as NDJSON')
+    parser.add_argument('--checkpoint', metavar='FILE',
+                        help='Where --crawl saves its progress to resume from (default: ~/.multi-source-reader/crawl/)')
+    parser.add_argument('--content-format', choices=['storage', 'text', 'markdown'], default='storage',
+                        help='Confluence page bodies for -c, --crawl and --records: storage format XHTML, plain text '
+                             'or Markdown (default: storage)')
+    parser.add_argument('--records', nargs='?', const='ndjson', choices=['ndjson', 'msgpack'], metavar='FORMAT',
+                        help='Write -b, --crawl, multi-URL -d and multi-ticket -j results as normalized records '
+                             '(source, id, title, body, comments, updated, url, extra) as ndjson (default) or msgpack')
+    parser.add_argument('--follow-links', action='store_true',
+                        help='Also read the PRs, tickets, pages and docs that -g/-j/-c/-d (or the -b entries) link to, '
+                             'breadth first, and print the link graph as NDJSON node and edge records')
+    parser.add_argument('--max-depth', type=int, default=DEFAULT_MAX_DEPTH, metavar='N',
+                        help=f'With --follow-links, how many links away from the starting references to read '
+                             f'(default: {DEFAULT_MAX_DEPTH})')
+    parser.add_argument('--fan-out', type=int, default=DEFAULT_FAN_OUT, metavar='N',
+                        help=f'With --follow-links, the most links followed from each object (default: {DEFAULT_FAN_OUT})')
+    parser.add_argument('--link-project', dest='link_projects', action='append', metavar='KEY',
+                        help='With --follow-links, only follow bare Jira keys of this project (repeatable)')
+    parser.add_argument('--sync', action='store_true',
+                        help='Print only what changed in -g/-j/-c (or every -b entry) since the last --sync run')
+    parser.add_argument('--state', metavar='FILE',
+                        help='Sync state file (default: ~/.multi-source-reader/sync_state.json)')
+    parser.add_argument('--since', type=parse_since, metavar='TIMESTAMP',
+                        help='On the first --sync of an entry, ignore changes made before this ISO 8601 time')
+    parser.add_argument('--pr-search', nargs='?', const='', metavar='TITLE',
+                        help='Search PRs by title (and --author/--label/--head/--pr-state) across --org and --repo '
+                             '(default: GITHUB_REPO_OWNER), printing ranked matches')
+    parser.add_argument('--author', help='With --pr-search, only PRs opened by this user')
+    parser.add_argument('--label', dest='labels', action='append', default=[],
+                        help='With --pr-search, only PRs with this label (repeatable)')
+    parser.add_argument('--head', metavar='BRANCH', help='With --pr-search, only PRs from this head branch')
+    parser.add_argument('--pr-state', choices=['open', 'closed', 'merged'], help='With --pr-search, only PRs in this state')
+    parser.add_argument('--org', dest='orgs', action='append', default=[], metavar='ORG',
+                        help='Organization or user to search with --pr-search (repeatable)')
+    parser.add_argument('--repo', dest='repos', action='append', default=[], metavar='OWNER/REPO',
+                        help='Repository to search with --pr-search (repeatable)')
+    parser.add_argument('--limit', type=int, default=30, metavar='N',
+                        help='Maximum number of --pr-search matches or search results (default: 30)')
+    parser.add_argument('--title-match', choices=['exact', 'ignorecase', 'prefix'], default='exact',
+                        help='How -g matches a PR title (default: exact)')
+    parser.add_argument('--fields', type=parse_fields, metavar='FIELD,...',
+                        help=f"PR fields to read with -g (default: {','.join(DEFAULT_PR_FIELDS)}; also available: "
+                             f"{','.join(field for field in PR_FIELDS if field not in DEFAULT_PR_FIELDS)})")
+    parser.add_argument('--github-api', choices=['rest', 'graphql'], default='rest',
+                        help='How -g (and -b, serve) read PRs by URL: REST, or GraphQL with the description and comments '
+                             'in one query and concurrent batch reads sharing queries (default: rest)')
+    parser.add_argument('--stream', choices=['json', 'ndjson'],
+                        help='Write -g results incrementally, fetching file changes lazily')
+    parser.add_argument('--diff-stats', action='store_true',
+                        help='With -g, print per-file additions, deletions, status and renames plus totals, without patches')
+    parser.add_argument('--diff-source', choices=['files', 'diff'], default='files',
+                        help='Where --diff-stats come from: the files listing (up to 3000 files) or the raw diff, '
+                             'streamed and parsed in one request (default: files)')
+    parser.add_argument('--max-patch-bytes', type=int, metavar='N',
+                        help='Truncate (or skip, see --oversized-patch) file patches larger than N bytes')
+    parser.add_argument('--oversized-patch', choices=['truncate', 'skip'], default='truncate',
+                        help='What to do with patches over --max-patch-bytes (default: truncate)')
+    parser.add_argument('--skip-patch', action='append', default=[], metavar='GLOB',
+                        help='Drop the patch of files matching GLOB, e.g. "vendor/*" (repeatable)')
+    parser.add_argument('--max-results', type=int, default=100, metavar='N',
+                        help='Issues (or --crawl pages) per search page when -j is a key list or JQL query (default: 100)')
+    parser.add_argument('--blocks', action='store_true',
+                        help='Also return the Google Doc as structured blocks (headings, list items, tables)')
+    parser.add_argument('--range', dest='ranges', action='append', default=[], metavar='A1',
+                        help='Sheet range to read with -d, e.g. B2:D100 (repeatable; several ranges are read in one request)')
+    parser.add_argument('--sheet', metavar='TAB', help='Sheet tab to read with -d (default: the first tab)')
+    parser.add_argument('--unformatted', action='store_true',
+                        help='Return raw sheet values (numbers as numbers) instead of formatted strings')
+    parser.add_argument('--chunk-rows', type=int, metavar='N',
+                        help='Stream the whole sheet tab N rows per request, printing one JSON row per line')
+    parser.add_argument('--columnar', action='store_true',
+                        help='Print the whole sheet tab as {column: values} of unformatted values, '
+                             'using the first row as the header')
+    parser.add_argument('--index', action='store_true',
+                        help='Add every PR, ticket, Confluence page and Google Doc read to the local full-text index')
+    parser.add_argument('--index-file', metavar='FILE',
+                        help='The full-text index for --index and search (default: ~/.multi-source-reader/index.sqlite)')
+    parser.add_argument('--source', dest='search_sources', action='append', choices=SOURCES, metavar='SOURCE',
+                        help=f'With search, only return documents from this source ({", ".join(SOURCES)}; repeatable)')
+    parser.add_argument('--raw-query', action='store_true',
+                        help='With search, pass the query to SQLite FTS5 as is (OR, NOT, prefix*, title:...)')
+    parser.add_argument('--cache-dir', metavar='DIR',
+                        help='Directory for the response cache (default: ~/.multi-source-reader/cache)')
+    parser.add_argument('--no-cache', action='store_true', help='Always fetch from the source, bypassing the cache')
+    parser.add_argument('--cache-ttl', type=int, default=DEFAULT_TTL, metavar='SECONDS',
+                        help=f'Serve cached results younger than this without revalidating (default: {DEFAULT_TTL})')
+    parser.add_argument('--max-stale', type=int, default=0, metavar='SECONDS',
+                        help='Serve cached results up to this long past their TTL when the source cannot be reached')
+    parser.add_argument('--rate-limit', action='append', default=[], metavar='SOURCE=N',
+                        help='Requests per second for one API and credential, e.g. github=5 (repeatable; '
+                             'APIs: github, github-search, github-graphql, jira, confluence, google-docs, google-sheets)')
+    parser.add_argument('--rate-stats', action='store_true',
+                        help='Print request budgets, queue depths and throttling counts to stderr on exit')
+    parser.add_argument('--profile', action='store_true',
+                        help='Print request counts, latencies, bytes, cache hits, retries and pages per source '
+                             'and operation to stderr on exit')
+    parser.add_argument('--trace', metavar='FILE',
+                        help='Write a Chrome trace (chrome://tracing, Perfetto) of every operation and request to FILE')
+    parser.add_argument('--metrics-file', metavar='FILE',
+                        help='Write the metrics in the Prometheus text format to FILE on exit '
+                             '(for the node_exporter textfile collector)')
+    parser.add_argument('--metrics-format', choices=['prometheus', 'openmetrics'], default='prometheus',
+                        help='Format of --metrics-file (default: prometheus)')
     parser.add_argument('--debug', action='store_true', help='Enable debug output')
 
-    args = parser.parse_args()
+    args = parser.parse_intermixed_args()
 
-    # Enable debug mode by default for now
-    args.debug = True
+    logging.basicConfig(level=logging.DEBUG if args.debug else logging.WARNING,
+                        format='%(levelname)s %(name)s: %(message)s')
+    if args.profile or args.trace or args.metrics_file:
+        enable_metrics(args)
 
-    if args.confluence:
-        debug_print(f"Attempting to read Confluence page: {args.confluence}", args.debug)
-        reader = JiraAndConfluenceReader()
-        
-        # Check Confluence connection
-        connection_status = reader.check_confluence_connection()
-        debug_print(f"Confluence connection status: {connection_status}", args.debug)
+    if args.command == 'search':
+        sys.exit(search(args))
+
+    if args.server and args.command != 'serve':
+        sys.exit(read_from_server(args))
+
+    cache = None
+    if not args.no_cache:
+        cache = ResponseCache(args.cache_dir, ttl=args.cache_ttl, max_stale=args.max_stale)
+
+    from src.rate_limit import RequestScheduler, default_scheduler
+    try:
+        scheduler = RequestScheduler(rates=parse_rate_limits(args.rate_limit)) if args.rate_limit else default_scheduler()
+    except ValueError as e:
+        error_print(str(e))
+        sys.exit(1)
+    if args.rate_stats:
+        atexit.register(lambda: print(json.dumps(scheduler.stats(), indent=2), file=sys.stderr))
+
+    search_index = None
+    if args.index:
+        from src.search_index import SearchIndex
+        search_index = SearchIndex(args.index_file)
+
+    patch_filter = None
+    if args.max_patch_bytes is not None or args.skip_patch:
+        from src.github_pr_reader import PatchFilter
+        patch_filter = PatchFilter(args.max_patch_bytes, args.skip_patch, args.oversized_patch)
 
-        if "Connected successfully" not in connection_status:
-            debug_print(f"Error connecting to Confluence: {connection_status}", args.debug)
-            return
+    if args.command == 'serve':
+        from src.server import serve
+        readers = SourceReaders(title_match=args.title_match, pr_fields=args.fields, patch_filter=patch_filter,
+                                cache=cache, max_connections=args.workers, scheduler=scheduler,
+                                github_api=args.github_api, search_index=search_index)
+        try:
+            serve(readers, args.server, scheduler, allow_remote=args.allow_remote, token_file=args.server_token_file)
+        except (OSError, RuntimeError, ValueError) as e:
+            error_print(f"Error starting server: {e}")
+            sys.exit(1)
+
+    elif args.sync:
+        from src.sync import SyncState, run_sync
+        if args.google:
+            error_print("--sync does not support Google Docs or Sheets (-d)")
+            sys.exit(2)
+        if args.jira and not all(JIRA_KEY_RE.match(key.strip()) for key in args.jira.split(',')):
+            error_print("--sync takes Jira ticket keys with -j, not a JQL query")
+            sys.exit(2)
+        try:
+            if args.batch:
+                entries = read_manifest(args.batch)
+            else:
+                entries = [(source, ref.strip()) for source in ('github', 'jira', 'confluence') if getattr(args, source)
+                           for ref in (getattr(args, source).split(',') if source == 'jira' else [getattr(args, source)])]
+            source_limits = parse_source_limits(args.source_limit)
+        except (OSError, ValueError, RuntimeError) as e:
+            error_print(f"Error reading manifest: {e}")
+            sys.exit(1)
+        failures = run_sync(entries, SourceReaders(title_match=args.title_match, pr_fields=args.fields,
+                                                     patch_filter=patch_filter, max_connections=args.workers,
+                                                     scheduler=scheduler),
+                            SyncState(args.state), since=args.since, workers=args.workers, source_limits=source_limits)
+        if failures:
+            sys.exit(1)
 
+    elif args.follow_links:
+        from src.link_graph import run_link_graph
         try:
-            result = reader.read_confluence_page_by_url(args.confluence)
+            if args.batch:
+                entries = read_manifest(args.batch)
+            else:
+                entries = [(source, ref.strip()) for source in SOURCES if getattr(args, source)
+                           for ref in (getattr(args, source).split(',') if source in ('jira', 'google')
+                                       else [getattr(args, source)])]
+            source_limits = parse_source_limits(args.source_limit)
+        except (OSError, ValueError, RuntimeError) as e:
+            error_print(f"Error reading manifest: {e}")
+            sys.exit(1)
+        if not entries:
+            error_print("--follow-links starts from -g, -j, -c, -d or a -b manifest")
+            sys.exit(2)
+        readers = SourceReaders(title_match=args.title_match, pr_fields=args.fields, patch_filter=patch_filter,
+                                cache=cache, max_connections=args.workers, scheduler=scheduler,
+                                github_api=args.github_api, search_index=search_index)
+        write = write_ndjson
+        if args.records:
+            from src.records import to_record
+            write_record = record_writer(args)
+
+            def write(record):
+                # Links are extracted from the raw result, and only the output is normalized
+                if 'result' in record:
+                    record = dict(record, result=to_record(record['source'], record['ref'], record['result'],
+                                                           args.content_format))
+                write_record(record)
+        failures = run_link_graph(entries, readers, max_depth=args.max_depth, fan_out=args.fan_out,
+                                  workers=args.workers, source_limits=source_limits, write=write,
+                                  projects=set(args.link_projects) if args.link_projects else None)
+        if failures:
+            sys.exit(1)
+
+    elif args.batch:
+        try:
+            entries = read_manifest(args.batch)
+            source_limits = parse_source_limits(args.source_limit)
+        except (OSError, ValueError, RuntimeError) as e:
+            error_print(f"Error reading manifest: {e}")
+            sys.exit(1)
+        readers = SourceReaders(title_match=args.title_match, pr_fields=args.fields, patch_filter=patch_filter,
+                                cache=cache, max_connections=args.workers, scheduler=scheduler,
+                                github_api=args.github_api, search_index=search_index)
+        read, write = None, write_ndjson
+        if args.records:
+            from src.records import record_reader
+            read, write = record_reader(readers.read, args.content_format), record_writer(args)
+        failures = run_batch(entries, readers, workers=args.workers, source_limits=source_limits, write=write, read=read)
+        if failures:
+            sys.exit(1)
+
+    elif args.crawl:
+        from src.crawl import CrawlCheckpoint, default_checkpoint_path
+        from src.jira_ticket_reader import JiraAndConfluenceReader
+        reader = JiraAndConfluenceReader(max_connections=args.workers, scheduler=scheduler, search_index=search_index)
+        checkpoint = CrawlCheckpoint(args.checkpoint or default_checkpoint_path(args.crawl))
+        if checkpoint.resumed:
+            error_print(f"Resuming crawl after {checkpoint.count} pages from {checkpoint.path}")
+        write = record_writer(args) if args.records else write_ndjson
+        failures = 0
+        try:
+            for page in reader.crawl_confluence(args.crawl, checkpoint, workers=args.workers, page_size=args.max_results,
+                                                content_format=args.content_format):
+                if 'error' in page:
+                    failures += 1
+                elif args.records:
+                    from src.records import to_record
+                    # Bodies are already converted by the crawl
+                    page = to_record('confluence', '', page, 'storage')
+                write(page)
+        except KeyboardInterrupt:
+            error_print(f"Interrupted after {checkpoint.count} pages; run the same command to resume")
+            sys.exit(130)
+        except Exception as e:
+            error_print(f"Error crawling {args.crawl}: {e}")
+            sys.exit(1)
+        if failures:
+            error_print(f"{failures} pages could not be read; run the same command to retry them")
+            sys.exit(1)
+
+    elif args.confluence:
+        debug_print(f"Attempting to read Confluence page: {args.confluence}", args.debug)
+        from src.jira_ticket_reader import JiraAndConfluenceReader
+        reader = JiraAndConfluenceReader(cache=cache, scheduler=scheduler, search_index=search_index)
+
+        try:
+            result = reader.read_confluence_page_by_url(args.confluence, content_format=args.content_format)
             debug_print("Raw result:", args.debug)
             debug_print(str(result), args.debug)
             if 'error' in result:
-                debug_print(f"Error: {result['error']}", args.debug)
+                error_print(f"Error: {result['error']}")
+                # Only check the connection once the read has failed, to tell bad pages from bad credentials
+                connection_status = reader.check_confluence_connection()
+                error_print(f"Confluence connection status: {connection_status}")
             else:
                 print_result(result)
         except Exception as e:
-            debug_print(f"An unexpected error occurred: {str(e)}", args.debug)
+            error_print(f"An unexpected error occurred: {str(e)}")
+
+    elif args.pr_search is not None:
+        from src.github_pr_reader import GitHubPRReader
+        reader = GitHubPRReader(cache=cache, scheduler=scheduler)
+        try:
+            matches = reader.search_prs(title=args.pr_search or None, author=args.author, labels=args.labels,
+                                        head=args.head, state=args.pr_state, orgs=args.orgs, repos=args.repos,
+                                        limit=args.limit)
+        except ValueError as e:
+            error_print(str(e))
+            sys.exit(1)
+        print_result(matches)
 
     elif args.github:
-        reader = GitHubPRReader()
-        if args.github.startswith('http'):
-            result = reader.read_pr_by_url(args.github)
+        if args.github_api == 'graphql':
+            from src.github_graphql_reader import GitHubGraphQLReader as GitHubPRReader
         else:
-            result = reader.read_pr_by_title(args.github)
-        print_result(result)
+            from src.github_pr_reader import GitHubPRReader
+        reader = GitHubPRReader(cache=cache, scheduler=scheduler, search_index=search_index)
+        if args.diff_stats:
+            print_result(reader.read_pr_diff_stats(args.github, match=args.title_match, source=args.diff_source))
+        elif args.stream:
+            if args.github.startswith('http'):
+                result = reader.stream_pr_by_url(args.github, fields=args.fields, patch_filter=patch_filter)
+            else:
+                result = reader.stream_pr_by_title(args.github, match=args.title_match, fields=args.fields,
+                                                   patch_filter=patch_filter)
+            if args.stream == 'ndjson':
+                write_ndjson_stream(result)
+            else:
+                write_json_stream(result)
+        else:
+            if args.github.startswith('http'):
+                result = reader.read_pr_by_url(args.github, fields=args.fields, patch_filter=patch_filter)
+            else:
+                result = reader.read_pr_by_title(args.github, match=args.title_match, fields=args.fields,
+                                                 patch_filter=patch_filter)
+            print_result(result)
 
     elif args.google:
+        if args.ranges and (args.columnar or args.chunk_rows):
+            error_print("--range cannot be combined with --columnar or --chunk-rows, which read the whole tab")
+            sys.exit(2)
+        if args.unformatted and args.columnar:
+            error_print("--columnar always reads unformatted values; drop --unformatted")
+            sys.exit(2)
         try:
-            reader = GoogleDocReader()
+            from src.google_doc_reader import GoogleDocReader
+            reader = GoogleDocReader(cache=cache, scheduler=scheduler, search_index=search_index)
+            urls = [url.strip() for url in args.google.split(',') if url.strip()]
+            if len(urls) > 1:
+                # Several URLs: read concurrently, one line per URL in the order given
+                write = record_writer(args) if args.records else write_ndjson
+                failed = False
+                for url, result in zip(urls, reader.read_many(urls, workers=args.workers, return_exceptions=True)):
+                    if isinstance(result, Exception):
+                        failed = True
+                        write({'url': url, 'error': str(result)})
+                    elif args.records:
+                        from src.records import to_record
+                        write(to_record('google', url, result))
+                    else:
+                        write({'url': url, 'result': result})
+                if failed:
+                    sys.exit(1)
+                return
             if 'document' in args.google:
-                result = reader.read_document(args.google)
+                result = reader.read_document(args.google, structured=args.blocks)
             elif 'spreadsheets' in args.google:
-                result = reader.read_sheet(args.google)
+                read_sheet(reader, args)
+                return
             else:
-                debug_print("Invalid Google URL", args.debug)
+                error_print("Invalid Google URL")
                 sys.exit(1)
             print_result(result)
         except RuntimeError as e:
-            debug_print(f"Error: {e}", args.debug)
-            debug_print("Please check your google-credentials.json file and ensure it contains the correct information.", args.debug)
+            error_print(f"Error: {e}")
+            error_print("Please check your google-credentials.json file and ensure it contains the correct information.")
         except Exception as e:
-            debug_print(f"An unexpected error occurred: {e}", args.debug)
+            error_print(f"An unexpected error occurred: {e}")
 
     elif args.jira:
-        reader = JiraAndConfluenceReader()
-        result = reader.read_ticket(args.jira)
-        print_result(result)
+        from src.jira_ticket_reader import JiraAndConfluenceReader
+        reader = JiraAndConfluenceReader(cache=cache, scheduler=scheduler, search_index=search_index)
+        keys = [key.strip() for key in args.jira.split(',')]
+        if len(keys) == 1 and JIRA_KEY_RE.match(keys[0]):
+            print_result(reader.read_ticket(keys[0]))
+        else:
+            # Several keys or a JQL query: one ticket per line as search pages arrive
+            if all(JIRA_KEY_RE.match(key) for key in keys):
+                tickets = reader.read_tickets(keys=keys, max_results=args.max_results)
+            else:
+                tickets = reader.read_tickets(jql=args.jira, max_results=args.max_results)
+            write = record_writer(args) if args.records else write_ndjson
+            for ticket in tickets:
+                if args.records:
+                    from src.records import to_record
+                    ticket = to_record('jira', ticket['key'], ticket)
+                write(ticket)
+
+    else:
+        error_print("Please provide a valid argument. Use -h or --help for more information.")
+
+def read_from_server(args):
+    """Send a plain -c/-g/-d/-j or -b read to a `serve` process; returns the exit status."""
+    from src.server import ServerClient, ServerError
+    if args.sync or args.follow_links or args.stream or args.diff_stats or args.blocks or args.ranges or args.sheet or args.unformatted \
+            or args.chunk_rows or args.columnar or args.content_format != 'storage':
+        error_print("--server only supports plain -c, -g, -d, -j and -b reads")
+        return 2
+    client = ServerClient(args.server, token_file=args.server_token_file)
+    if args.batch:
+        try:
+            entries = read_manifest(args.batch)
+            source_limits = parse_source_limits(args.source_limit)
+        except (OSError, ValueError, RuntimeError) as e:
+            error_print(f"Error reading manifest: {e}")
+            return 1
+        read, write = client.read, write_ndjson
+        if args.records:
+            from src.records import record_reader
+            read, write = record_reader(client.read), record_writer(args)
+        return 1 if run_batch(entries, None, workers=args.workers, source_limits=source_limits, write=write, read=read) else 0
 
+    source = next((source for source in ('confluence', 'github', 'google', 'jira') if getattr(args, source)), None)
+    if source is None or (source == 'jira' and not JIRA_KEY_RE.match(args.jira.strip())):
+        error_print("--server reads one reference given with -c, -g, -d or -j (a single Jira key), or a -b manifest")
+        return 2
+    try:
+        print_result(client.read(source, getattr(args, source).strip()))
+    except ServerError as e:
+        error_print(f"Error: {e}")
+        return 1
+    except OSError as e:
+        error_print(f"Cannot reach the server at {client.address}: {e}")
+        return 1
+    return 0
+
+def search(args):
+    """Print the documents of the local full-text index matching the search query; returns the exit status."""
+    from src.search_index import SearchIndex, default_index_path
+    if not args.query:
+        error_print("search needs a query, e.g. multi-source-reader search \"login timeout\"")
+        return 2
+    path = args.index_file or default_index_path()
+    if not os.path.exists(path):
+        error_print(f"No index at {path}; read documents with --index first")
+        return 1
+    try:
+        print_result(SearchIndex(path).search(args.query, sources=args.search_sources, limit=args.limit,
+                                              raw=args.raw_query))
+    except ValueError as e:
+        error_print(str(e))
+        return 1
+    return 0
+
+def read_sheet(reader, args):
+    from src.google_doc_reader import DEFAULT_CHUNK_ROWS
+    render = 'UNFORMATTED_VALUE' if args.unformatted else None
+    if args.columnar:
+        columns = reader.read_sheet_columns(args.google, sheet=args.sheet,
+                                            chunk_rows=args.chunk_rows or DEFAULT_CHUNK_ROWS)
+        # JSON has no NaN, so blank cells in numeric columns are printed as null
+        print_result({name: [None if value != value else value for value in column]
+                      for name, column in columns.items()})
+    elif args.chunk_rows:
+        for row in reader.iter_sheet_rows(args.google, sheet=args.sheet, chunk_rows=args.chunk_rows,
+                                          value_render_option=render):
+            write_ndjson(row)
+    elif len(args.ranges) > 1:
+        print_result(reader.read_sheet_ranges(args.google, args.ranges, sheet=args.sheet,
+                                              value_render_option=render))
     else:
-        debug_print("Please provide a valid argument. Use -h or --help for more information.", args.debug)
+        print_result(reader.read_sheet(args.google, cell_range=args.ranges[0] if args.ranges else None,
+                                       sheet=args.sheet, value_render_option=render))
+
+def enable_metrics(args):
+    from src.metrics import metrics
+    metrics.enable(trace=bool(args.trace))
+
+    def report():
+        if args.profile:
+            print(metrics.summary(), file=sys.stderr)
+        if args.trace:
+            metrics.write_chrome_trace(args.trace)
+        if args.metrics_file:
+            metrics.write_prometheus(args.metrics_file, openmetrics=args.metrics_format == 'openmetrics')
+    atexit.register(report)
+
+def parse_fields(value):
+    fields = tuple(field.strip() for field in value.split(',') if field.strip())
+    unknown = [field for field in fields if field not in PR_FIELDS]
+    if unknown or not fields:
+        raise argparse.ArgumentTypeError(f"unknown PR fields: {', '.join(unknown) or value}")
+    return fields
+
+def parse_since(value):
+    from src.timestamps import parse_timestamp
+    try:
+        return parse_timestamp(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid ISO 8601 timestamp: {value}")
+
+def parse_rate_limits(values):
+    from src.rate_limit import DEFAULT_RATES
+    rates = {}
+    for value in values:
+        source, sep, rate = value.partition('=')
+        try:
+            rate = float(rate)
+        except ValueError:
+            rate = 0
+        if not sep or source not in DEFAULT_RATES or rate <= 0:
+            raise ValueError(f"Invalid --rate-limit: {value}")
+        rates[source] = (rate, max(1, DEFAULT_RATES[source][1] * rate / DEFAULT_RATES[source][0]))
+    return rates
+
+def parse_source_limits(values):
+    limits = {}
+    for value in values:
+        source, sep, limit = value.partition('=')
+        if not sep or source not in SOURCES or not limit.isdigit() or int(limit) < 1:
+            raise ValueError(f"Invalid --source-limit: {value}")
+        limits[source] = int(limit)
+    return limits
+
+def record_writer(args):
+    """Where --records output goes: one JSON line or one msgpack object per record on stdout."""
+    if args.records != 'msgpack':
+        return write_ndjson
+    from src.records import msgpack_writer
+    try:
+        return msgpack_writer()
+    except RuntimeError as e:
+        error_print(str(e))
+        sys.exit(1)
 
 def print_result(result):
     print(json.dumps(result, indent=2))
 
+def error_print(message):
+    print(message, file=sys.stderr)
+
 def debug_print(message, debug_enabled):
     if debug_enabled:
         print(message, file=sys.stderr)
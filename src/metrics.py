@@ -0,0 +1,286 @@
+import os
+import json
+import time
+import inspect
+import tempfile
+import functools
+import threading
+import contextvars
+from contextlib import contextmanager
+
+# Upper bounds of the latency histogram buckets, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNTERS = ('cache_hits', 'cache_revalidated', 'cache_misses', 'cache_stale', 'retries', 'pages')
+
+_operation = contextvars.ContextVar('operation', default=None)
+
+
+class _Series:
+    """Count, total, maximum and histogram of a set of durations, plus the bytes moved."""
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.seconds = 0.0
+        self.max = 0.0
+        self.bytes = 0
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+
+    def observe(self, seconds, size=0, error=False):
+        self.count += 1
+        self.errors += bool(error)
+        self.seconds += seconds
+        self.max = max(self.max, seconds)
+        self.bytes += size
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                self.buckets[i] += 1
+                break
+
+
+class Metrics:
+    """Per source and operation timings, counts and bytes for every read.
+
+    Reader methods run as operations (see `instrument`), and every HTTP
+    request, cache lookup, retry and page fetched while one runs is
+    attributed to it. Nothing is recorded until `enable()` is called.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.tracing = False
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._origin = time.perf_counter()
+        self.operations = {}
+        self.requests = {}
+        self.counters = {}
+        self.max_pages = {}
+        self.events = []
+
+    def enable(self, trace=False):
+        self.enabled = True
+        self.tracing = self.tracing or trace
+
+    def current(self, source=None):
+        operation = _operation.get()
+        if operation is None:
+            return source or 'unknown', 'other'
+        return source or operation[0], operation[1]
+
+    def _trace(self, name, category, started, seconds, args):
+        if self.tracing:
+            self.events.append({
+                'name': name,
+                'cat': category,
+                'ph': 'X',
+                'ts': round((started - self._origin) * 1e6, 1),
+                'dur': round(seconds * 1e6, 1),
+                'pid': os.getpid(),
+                'tid': threading.get_ident(),
+                'args': args,
+            })
+
+    @contextmanager
+    def operation(self, source, name):
+        if not self.enabled:
+            yield
+            return
+        token = _operation.set((source, name))
+        started = time.perf_counter()
+        error = False
+        try:
+            yield
+        except BaseException:
+            error = True
+            raise
+        finally:
+            seconds = time.perf_counter() - started
+            _operation.reset(token)
+            with self._lock:
+                self.operations.setdefault((source, name), _Series()).observe(seconds, error=error)
+                self._trace(name, source, started, seconds, {'error': error})
+
+    def instrument(self, source, name=None):
+        """Decorator running a reader method (or generator) as an operation."""
+        def decorator(func):
+            operation_name = name or func.__name__
+            if inspect.isgeneratorfunction(func):
+                @functools.wraps(func)
+                def generator_wrapper(*args, **kwargs):
+                    def steps():
+                        with self.operation(source, operation_name):
+                            return (yield from func(*args, **kwargs))
+
+                    # Every step runs in a context of the generator's own, so the operation is
+                    # not left set in the caller's context while the generator is suspended
+                    context = contextvars.copy_context()
+                    generator = steps()
+                    step, argument = generator.send, None
+                    try:
+                        while True:
+                            try:
+                                value = context.run(step, argument)
+                            except StopIteration as stop:
+                                return stop.value
+                            try:
+                                step, argument = generator.send, (yield value)
+                            except GeneratorExit:
+                                raise
+                            except BaseException as e:
+                                step, argument = generator.throw, e
+                    finally:
+                        context.run(generator.close)
+                return generator_wrapper
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                with self.operation(source, operation_name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def bind(self, func):
+        """Run `func` (on another thread) inside a copy of the current operation context."""
+        return functools.partial(contextvars.copy_context().run, func)
+
+    def record_request(self, source, started, status=None, size=0):
+        if not self.enabled:
+            return
+        seconds = time.perf_counter() - started
+        source, operation = self.current(source)
+        error = status is None or status >= 400
+        with self._lock:
+            self.requests.setdefault((source, operation), _Series()).observe(seconds, size, error)
+            self._trace(f"HTTP {status}", f"{source}.http", started, seconds, {'operation': operation, 'bytes': size})
+
+    def request_started(self):
+        """Mark the start of a request whose end is reported later on the same thread."""
+        self._local.started = time.perf_counter()
+
+    def request_finished(self, source, status=None, size=0):
+        started = getattr(self._local, 'started', None)
+        if started is not None:
+            self._local.started = None
+            self.record_request(source, started, status, size)
+
+    def count(self, name, n=1, source=None):
+        if not self.enabled:
+            return
+        key = (name,) + self.current(source)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + n
+
+    def pages(self, n, source=None):
+        """Record that one paginated listing took `n` pages."""
+        if not self.enabled:
+            return
+        self.count('pages', n, source)
+        key = self.current(source)
+        with self._lock:
+            self.max_pages[key] = max(self.max_pages.get(key, 0), n)
+
+    def _keys(self):
+        keys = set(self.operations) | set(self.requests) | set(self.max_pages)
+        keys.update((source, operation) for _, source, operation in self.counters)
+        return sorted(keys)
+
+    def summary(self):
+        with self._lock:
+            lines = [f"{'source':<12}{'operation':<28}{'calls':>7}{'mean ms':>10}{'max ms':>10}"
+                     f"{'requests':>10}{'req ms':>9}{'KB':>9}{'cache h/r/m':>13}{'retries':>9}{'pages':>11}"]
+            for key in self._keys():
+                operation = self.operations.get(key, _Series())
+                requests = self.requests.get(key, _Series())
+                counters = {name: self.counters.get((name,) + key, 0) for name in COUNTERS}
+                cache = f"{counters['cache_hits']}/{counters['cache_revalidated']}/{counters['cache_misses']}"
+                pages = f"{counters['pages']}({self.max_pages.get(key, 0)})"
+                lines.append(
+                    f"{key[0]:<12}{key[1]:<28}{operation.count:>7}"
+                    f"{(operation.seconds / operation.count * 1000 if operation.count else 0):>10.1f}"
+                    f"{operation.max * 1000:>10.1f}{requests.count:>10}"
+                    f"{(requests.seconds / requests.count * 1000 if requests.count else 0):>9.1f}"
+                    f"{requests.bytes / 1024:>9.1f}{cache:>13}{counters['retries']:>9}{pages:>11}"
+                )
+            return '\n'.join(lines)
+
+    def chrome_trace(self):
+        with self._lock:
+            return {'traceEvents': list(self.events), 'displayTimeUnit': 'ms'}
+
+    def prometheus(self, openmetrics=False):
+        """Render the metrics in the Prometheus text format (or OpenMetrics)."""
+        lines = []
+
+        def labels(key, **extra):
+            pairs = [('source', key[0]), ('operation', key[1])] + list(extra.items())
+            return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+        def counter(name, help_text, values):
+            family = name if openmetrics else f"{name}_total"
+            lines.append(f"# HELP {family} {help_text}")
+            lines.append(f"# TYPE {family} counter")
+            for key, value in values:
+                lines.append(f"{name}_total{labels(key)} {value}")
+
+        def histogram(name, help_text, series):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} histogram")
+            for key, values in series:
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS, values.buckets):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{labels(key, le=repr(bound))} {cumulative}")
+                lines.append(f"{name}_bucket{labels(key, le='+Inf')} {values.count}")
+                lines.append(f"{name}_sum{labels(key)} {values.seconds}")
+                lines.append(f"{name}_count{labels(key)} {values.count}")
+
+        with self._lock:
+            requests = sorted(self.requests.items())
+            operations = sorted(self.operations.items())
+            counter('msr_requests', 'HTTP requests sent.', [(key, series.count) for key, series in requests])
+            counter('msr_request_errors', 'HTTP requests that failed or returned a 4xx/5xx status.',
+                    [(key, series.errors) for key, series in requests])
+            counter('msr_response_bytes', 'Response body bytes received.', [(key, series.bytes) for key, series in requests])
+            histogram('msr_request_duration_seconds', 'HTTP request latency.', requests)
+            histogram('msr_operation_duration_seconds', 'Reader operation latency.', operations)
+            for name in COUNTERS:
+                values = sorted((key[1:], value) for key, value in self.counters.items() if key[0] == name)
+                counter(f'msr_{name}', f"{name.replace('_', ' ').capitalize()}.", values)
+            lines.append('# HELP msr_pagination_depth_max Most pages fetched for one listing.')
+            lines.append('# TYPE msr_pagination_depth_max gauge')
+            for key, value in sorted(self.max_pages.items()):
+                lines.append(f"msr_pagination_depth_max{labels(key)} {value}")
+        if openmetrics:
+            lines.append('# EOF')
+        return '\n'.join(lines) + '\n'
+
+    def write_chrome_trace(self, path):
+        _write_atomic(path, json.dumps(self.chrome_trace()))
+
+    def write_prometheus(self, path, openmetrics=False):
+        # Written atomically so the node_exporter textfile collector never reads a partial file
+        _write_atomic(path, self.prometheus(openmetrics))
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _write_atomic(path, text):
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+metrics = Metrics()
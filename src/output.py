@@ -0,0 +1,48 @@
+import sys
+import json
+
+
+def _is_lazy(value):
+    return hasattr(value, '__next__')
+
+
+def encode(value):
+    """`default` hook for json.dumps (and msgpack) that serializes Records nested anywhere."""
+    if hasattr(value, 'to_dict'):
+        return value.to_dict()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def write_ndjson(record, stream=None):
+    stream = stream or sys.stdout
+    stream.write(json.dumps(record, default=encode) + '\n')
+    stream.flush()
+
+
+def write_ndjson_stream(result, stream=None):
+    """Write the eager fields of `result` as one line, then one `{field: item}` line per lazy item."""
+    write_ndjson({key: value for key, value in result.items() if not _is_lazy(value)}, stream)
+    for key, value in result.items():
+        if _is_lazy(value):
+            for item in value:
+                write_ndjson({key: item}, stream)
+
+
+def write_json_stream(result, stream=None):
+    """Write `result` as a single JSON object, consuming generator values one item at a time."""
+    stream = stream or sys.stdout
+    stream.write('{')
+    for i, (key, value) in enumerate(result.items()):
+        stream.write(',\n  ' if i else '\n  ')
+        stream.write(json.dumps(key) + ': ')
+        if not _is_lazy(value):
+            stream.write(json.dumps(value))
+            continue
+        stream.write('[')
+        for j, item in enumerate(value):
+            stream.write(',\n    ' if j else '\n    ')
+            stream.write(json.dumps(item))
+            stream.flush()
+        stream.write('\n  ]')
+    stream.write('\n}\n')
+    stream.flush()
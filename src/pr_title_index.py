@@ -0,0 +1,112 @@
+import os
+import json
+import bisect
+import tempfile
+
+MATCH_MODES = ('exact', 'ignorecase', 'prefix')
+
+
+def default_index_dir():
+    return os.path.join(os.path.expanduser('~'), '.multi-source-reader', 'pr_index')
+
+
+class PRTitleIndex:
+    """On-disk title -> PR number index for a single `owner/repo`.
+
+    The index remembers the newest `updated_at` it has seen, so a refresh only
+    walks the PRs updated since then (newest first) and stops at the watermark.
+    """
+
+    def __init__(self, repo_full_name, index_dir=None):
+        self.repo_full_name = repo_full_name
+        self.index_dir = index_dir or default_index_dir()
+        self.path = os.path.join(self.index_dir, repo_full_name.replace('/', '__') + '.json')
+        self.updated_at = None
+        self.titles = {}
+        self._load()
+        self._rebuild()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            # A corrupt index is just rebuilt from scratch on the next refresh
+            return
+        if data.get('repo') != self.repo_full_name:
+            return
+        self.updated_at = data.get('updated_at')
+        self.titles = {int(number): title for number, title in data.get('titles', {}).items()}
+
+    def save(self):
+        os.makedirs(self.index_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.index_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump({
+                    'repo': self.repo_full_name,
+                    'updated_at': self.updated_at,
+                    'titles': {str(number): title for number, title in self.titles.items()}
+                }, f)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def _rebuild(self):
+        self._exact = {}
+        self._lower = {}
+        for number, title in self.titles.items():
+            self._exact.setdefault(title, []).append(number)
+            self._lower.setdefault(title.lower(), []).append(number)
+        self._sorted = sorted((title.lower(), number) for number, title in self.titles.items())
+
+    def refresh(self, repo):
+        """Index every PR updated since the last refresh.
+
+        Returns the PR objects fetched along the way, keyed by number, so the
+        caller can reuse them instead of requesting a match a second time.
+        """
+        fetched = {}
+        watermark = self.updated_at
+        newest = watermark
+        for pr in repo.get_pulls(state='all', sort='updated', direction='desc'):
+            updated_at = pr.updated_at.isoformat() if pr.updated_at else None
+            if watermark and updated_at and updated_at < watermark:
+                break
+            self.titles[pr.number] = pr.title
+            fetched[pr.number] = pr
+            if updated_at and (newest is None or updated_at > newest):
+                newest = updated_at
+        self.updated_at = newest
+        self._rebuild()
+        self.save()
+        return fetched
+
+    def lookup(self, title, match='exact'):
+        """Return matching PR numbers, most recent first."""
+        if match == 'exact':
+            numbers = self._exact.get(title, [])
+        elif match == 'ignorecase':
+            numbers = self._lower.get(title.lower(), [])
+        elif match == 'prefix':
+            prefix = title.lower()
+            numbers = []
+            i = bisect.bisect_left(self._sorted, (prefix, -1))
+            while i < len(self._sorted) and self._sorted[i][0].startswith(prefix):
+                numbers.append(self._sorted[i][1])
+                i += 1
+        else:
+            raise ValueError(f"Unknown title match mode: {match}")
+        return sorted(numbers, reverse=True)
+
+
+def title_matches(candidate, title, match='exact'):
+    if match == 'exact':
+        return candidate == title
+    if match == 'ignorecase':
+        return candidate.lower() == title.lower()
+    return candidate.lower().startswith(title.lower())
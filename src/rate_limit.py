@@ -0,0 +1,286 @@
+import time
+import heapq
+import hashlib
+import random
+import itertools
+import threading
+import contextvars
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from src.metrics import metrics
+from src.timestamps import parse_timestamp
+
+INTERACTIVE = 0
+BATCH = 1
+
+# Sustained requests per second and burst size per source and credential
+DEFAULT_RATES = {
+    'github': (10, 20),
+    # Search has its own budget of 30 requests per minute
+    'github-search': (0.5, 30),
+    # GraphQL has a points budget of its own
+    'github-graphql': (10, 20),
+    'jira': (10, 20),
+    'confluence': (10, 20),
+    'google-docs': (5, 10),
+    'google-sheets': (1, 5),
+}
+FALLBACK_RATE = (10, 20)
+DEFAULT_MAX_RETRIES = 5
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# Below this share of the server's limit, requests are spread evenly until the budget resets
+LOW_BUDGET = 0.1
+
+_priority = contextvars.ContextVar('request_priority', default=INTERACTIVE)
+
+
+@contextmanager
+def request_priority(priority):
+    """Run the requests made in this block (on this thread) at `priority`."""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority():
+    return _priority.get()
+
+
+class TokenBucket:
+    """A token bucket whose waiters are served by priority, then in arrival order."""
+
+    def __init__(self, rate, capacity):
+        self.default_rate = rate
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.blocked_until = 0.0
+        self.requests = 0
+        self.throttled = 0
+        self._updated = time.monotonic()
+        self._waiting = []
+        self._order = itertools.count()
+        self._condition = threading.Condition()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, priority=INTERACTIVE):
+        with self._condition:
+            entry = (priority, next(self._order))
+            heapq.heappush(self._waiting, entry)
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    if self._waiting[0] != entry:
+                        # Only the first waiter watches the clock; the others wait for their turn
+                        self._condition.wait()
+                        continue
+                    if now >= self.blocked_until and self.tokens >= 1:
+                        self.tokens -= 1
+                        self.requests += 1
+                        return
+                    wait = max(self.blocked_until - now, (1 - self.tokens) / self.rate if self.tokens < 1 else 0)
+                    self._condition.wait(wait)
+            finally:
+                self._waiting.remove(entry)
+                heapq.heapify(self._waiting)
+                self._condition.notify_all()
+
+    def block(self, seconds):
+        with self._condition:
+            self.throttled += 1
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+            self._condition.notify_all()
+
+    def update_budget(self, remaining, limit=None, reset_in=None):
+        with self._condition:
+            if reset_in is None or reset_in <= 0:
+                return
+            if remaining <= 0:
+                self.blocked_until = max(self.blocked_until, time.monotonic() + reset_in)
+            elif remaining < max((limit or 0) * LOW_BUDGET, self.capacity):
+                self.rate = min(self.default_rate, remaining / reset_in)
+            else:
+                self.rate = self.default_rate
+            self.tokens = min(self.tokens, remaining)
+            self._condition.notify_all()
+
+    def stats(self):
+        with self._condition:
+            now = time.monotonic()
+            self._refill(now)
+            return {
+                'rate': self.rate,
+                'tokens': round(self.tokens, 2),
+                'queued': len(self._waiting),
+                'blocked_for': round(max(0.0, self.blocked_until - now), 2),
+                'requests': self.requests,
+                'throttled': self.throttled,
+            }
+
+
+def credential_id(secret):
+    """A short stable id for a credential, so buckets can be told apart without keeping the secret."""
+    if not secret:
+        return 'anonymous'
+    return hashlib.sha1(secret.encode('utf-8')).hexdigest()[:8]
+
+
+def _lower_headers(headers):
+    return {str(key).lower(): value for key, value in (headers or {}).items()}
+
+
+def retry_after_seconds(headers):
+    """Return the wait a Retry-After header asks for (delta seconds or HTTP date), or None."""
+    value = _lower_headers(headers).get('retry-after')
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _reset_in(value):
+    # GitHub sends epoch seconds, Atlassian an ISO 8601 timestamp
+    if value is None:
+        return None
+    try:
+        return float(value) - time.time()
+    except ValueError:
+        pass
+    try:
+        return parse_timestamp(value).timestamp() - time.time()
+    except ValueError:
+        return None
+
+
+def _describe_response(response):
+    return response.status_code, response.headers
+
+
+class RequestScheduler:
+    """Paces, prioritizes and retries requests for every reader.
+
+    Each (source, credential) pair gets a token bucket. Requests made inside
+    `request_priority(BATCH)` wait behind interactive ones. Rate limit headers
+    (X-RateLimit-Remaining/Reset) slow a bucket down as its budget runs low
+    and pause it once the budget is spent. Throttled responses (429, 5xx and
+    403 with rate limit hints) pause the whole bucket for the Retry-After
+    time or a jittered exponential backoff, then are retried.
+    """
+
+    def __init__(self, rates=None, max_retries=DEFAULT_MAX_RETRIES, base_delay=0.5, max_delay=60.0):
+        self.rates = dict(DEFAULT_RATES)
+        self.rates.update(rates or {})
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, source, credential=None):
+        key = (source, credential)
+        with self._lock:
+            if key not in self._buckets:
+                rate = self.rates.get(source, FALLBACK_RATE)
+                if not isinstance(rate, tuple):
+                    rate = (rate, max(1, rate * 2))
+                self._buckets[key] = TokenBucket(*rate)
+            return self._buckets[key]
+
+    def acquire(self, source, credential=None, priority=None):
+        self.bucket(source, credential).acquire(current_priority() if priority is None else priority)
+
+    def update_budget(self, source, credential, remaining, limit=None, reset=None):
+        """Record the budget a server reported; `reset` is when it refills, in epoch seconds."""
+        reset_in = reset - time.time() if reset else None
+        self.bucket(source, credential).update_budget(remaining, limit, reset_in)
+
+    def observe(self, source, credential, headers):
+        headers = _lower_headers(headers)
+        remaining = headers.get('x-ratelimit-remaining')
+        if remaining is None:
+            return
+        try:
+            remaining = int(float(remaining))
+            limit = int(float(headers['x-ratelimit-limit'])) if 'x-ratelimit-limit' in headers else None
+        except ValueError:
+            return
+        reset_in = _reset_in(headers.get('x-ratelimit-reset'))
+        self.bucket(source, credential).update_budget(remaining, limit, reset_in)
+
+    def is_throttled(self, status, headers):
+        if status in RETRY_STATUSES:
+            return True
+        if status == 403:
+            headers = _lower_headers(headers)
+            return 'retry-after' in headers or headers.get('x-ratelimit-remaining') == '0'
+        return False
+
+    def backoff(self, source, credential, attempt, headers=None, minimum=0.0):
+        """Pause the bucket before retry `attempt` (0-based) and return the delay in seconds."""
+        delay = retry_after_seconds(headers)
+        if delay is None:
+            reset_in = _reset_in(_lower_headers(headers).get('x-ratelimit-reset'))
+            if _lower_headers(headers).get('x-ratelimit-remaining') == '0' and reset_in and reset_in > 0:
+                delay = reset_in
+            else:
+                # Equal jitter: half the exponential delay plus a random share of the other half
+                exponential = min(self.max_delay, self.base_delay * 2 ** attempt)
+                delay = exponential / 2 + random.uniform(0, exponential / 2)
+        delay = max(delay, minimum)
+        self.bucket(source, credential).block(delay)
+        metrics.count('retries', source=source)
+        return delay
+
+    def send(self, source, send, credential=None, describe=_describe_response, priority=None, size=None):
+        """Call `send()` once a token is free, retrying throttled responses.
+
+        `describe(response)` returns its (status, headers) and `size(response)`
+        its body size for the metrics. Once retries are exhausted the last
+        response is returned as is.
+        """
+        attempt = 0
+        while True:
+            self.acquire(source, credential, priority)
+            started = time.perf_counter()
+            response = send()
+            status, headers = describe(response)
+            if metrics.enabled:
+                metrics.record_request(source, started, status, size(response) if size else 0)
+            self.observe(source, credential, headers)
+            if not self.is_throttled(status, headers) or attempt >= self.max_retries:
+                return response
+            self.backoff(source, credential, attempt, headers)
+            attempt += 1
+
+    def stats(self):
+        with self._lock:
+            buckets = list(self._buckets.items())
+        return {
+            source if credential is None else f"{source}:{credential}": bucket.stats()
+            for (source, credential), bucket in buckets
+        }
+
+
+_default_scheduler = None
+_default_lock = threading.Lock()
+
+
+def default_scheduler():
+    """The scheduler shared by every reader that is not given one."""
+    global _default_scheduler
+    with _default_lock:
+        if _default_scheduler is None:
+            _default_scheduler = RequestScheduler()
+        return _default_scheduler
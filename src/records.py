@@ -0,0 +1,171 @@
+import re
+import sys
+import json
+
+from src.output import encode
+from src.storage_format import convert_storage
+
+RECORD_FIELDS = ('source', 'id', 'title', 'body', 'comments', 'updated', 'url', 'extra')
+RECORD_FORMATS = ('ndjson', 'msgpack')
+
+
+class Record:
+    """One document from any source, with the same fields whatever it came from.
+
+    `body` may be given as a zero-argument callable, which is called the first
+    time the body is read (for example to render a sheet or convert a
+    Confluence page only when it is written), then replaced by its result.
+    Source-specific data the common fields do not cover (file changes, sheet
+    rows, Confluence space and version...) goes in `extra`. Records use
+    `__slots__` and store comments as a tuple, so a large batch of them costs
+    much less memory than the equivalent dicts.
+    """
+
+    __slots__ = ('source', 'id', 'title', '_body', 'comments', 'updated', 'url', 'extra')
+
+    def __init__(self, source, id, title=None, body=None, comments=(), updated=None, url=None, extra=None):
+        self.source = source
+        self.id = id
+        self.title = title
+        self._body = body
+        self.comments = tuple(comments or ())
+        self.updated = updated
+        self.url = url
+        self.extra = extra or None
+
+    @property
+    def body(self):
+        if callable(self._body):
+            self._body = self._body()
+        return self._body
+
+    @body.setter
+    def body(self, value):
+        self._body = value
+
+    @property
+    def loaded(self):
+        """Whether the body has been materialized."""
+        return not callable(self._body)
+
+    def to_dict(self):
+        record = {'source': self.source, 'id': self.id, 'title': self.title, 'body': self.body,
+                  'comments': list(self.comments), 'updated': self.updated}
+        if self.url is not None:
+            record['url'] = self.url
+        if self.extra:
+            record['extra'] = self.extra
+        return record
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**{field: data.get(field) for field in RECORD_FIELDS})
+
+    def __eq__(self, other):
+        if not isinstance(other, Record):
+            return NotImplemented
+        return self.to_dict() == other.to_dict()
+
+    def __repr__(self):
+        return f"Record(source={self.source!r}, id={self.id!r}, title={self.title!r})"
+
+
+def to_record(source, ref, result, content_format='text'):
+    """Normalize a reader result for `ref` into a Record.
+
+    Confluence bodies are converted to `content_format` ('storage' keeps
+    them as XHTML) lazily, when the body is first read. A Confluence result
+    carrying an 'error' raises RuntimeError.
+    """
+    if isinstance(result, Record):
+        return result
+    if source == 'github':
+        return _github_record(ref, result)
+    if source == 'jira':
+        return Record('jira', result['key'], result.get('summary'), result.get('description'),
+                      result.get('comments'), updated=result.get('updated'),
+                      url=ref if ref.startswith('http') else None)
+    if source == 'confluence':
+        return _confluence_record(ref, result, content_format)
+    if source == 'google':
+        return _google_record(ref, result)
+    raise ValueError(f"Unknown source: {source}")
+
+
+def _github_record(ref, result):
+    url = ref if ref.startswith('http') else None
+    match = re.search(r'github\.com/([^/]+/[^/]+)/pull/(\d+)', ref)
+    if match:
+        record_id = f"{match.group(1)}#{match.group(2)}"
+    else:
+        record_id = str(result['number']) if result.get('number') is not None else ref
+    extra = {key: value for key, value in result.items()
+             if key not in ('title', 'number', 'description', 'updated_at', 'comments', 'issue_comments')}
+    if result.get('number') is not None:
+        extra['number'] = result['number']
+    comments = list(result.get('comments') or ()) + list(result.get('issue_comments') or ())
+    return Record('github', record_id, result.get('title'), result.get('description'), comments,
+                  updated=result.get('updated_at'), url=url, extra=extra)
+
+
+def _confluence_record(ref, result, content_format):
+    if 'error' in result:
+        raise RuntimeError(result['error'])
+    content = result.get('content')
+    body = content
+    if content and content_format != 'storage':
+        def body():
+            return convert_storage(content, content_format)
+    extra = {key: result[key] for key in ('space', 'parent_id', 'version', 'previous_version') if result.get(key) is not None}
+    return Record('confluence', result['id'], result.get('title'), body, updated=result.get('updated'),
+                  url=ref if ref.startswith('http') else None, extra=extra)
+
+
+def _google_record(ref, result):
+    match = re.search(r'/d/([a-zA-Z0-9-_]+)', ref)
+    record_id = match.group(1) if match else ref
+    if isinstance(result, list):
+        # A sheet: the rows stay as they are and the body is rendered as TSV only if read
+        def body():
+            return '\n'.join('\t'.join('' if value is None else str(value) for value in row) for row in result)
+        return Record('google', record_id, None, body, url=ref, extra={'rows': result})
+    extra = {key: value for key, value in result.items() if key not in ('title', 'content')}
+    return Record('google', record_id, result.get('title'), result.get('content'), url=ref, extra=extra)
+
+
+def record_reader(read, content_format='text'):
+    """Wrap a `read(source, ref)` function so that it returns Records."""
+    def read_record(source, ref):
+        return to_record(source, ref, read(source, ref), content_format)
+    return read_record
+
+
+def _msgpack():
+    try:
+        import msgpack
+    except ImportError:
+        raise RuntimeError("msgpack output requires msgpack (pip install msgpack)")
+    return msgpack
+
+
+def msgpack_writer(stream=None):
+    """Return a `write(record)` function packing one msgpack object per record onto a binary stream."""
+    msgpack = _msgpack()
+    stream = stream or sys.stdout.buffer
+    packer = msgpack.Packer(default=encode)
+
+    def write(record):
+        stream.write(packer.pack(record))
+        stream.flush()
+    return write
+
+
+def iter_records(stream, fmt='ndjson'):
+    """Read Records back from an NDJSON (text) or msgpack (binary) stream of record dicts."""
+    if fmt == 'msgpack':
+        for data in _msgpack().Unpacker(stream, raw=False):
+            yield Record.from_dict(data)
+        return
+    for line in stream:
+        if line.strip():
+            yield Record.from_dict(json.loads(line))
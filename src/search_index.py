@@ -0,0 +1,227 @@
+import os
+import time
+import sqlite3
+import hashlib
+import inspect
+import logging
+import functools
+import threading
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SEARCH_LIMIT = 20
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    rowid INTEGER PRIMARY KEY,
+    key TEXT UNIQUE NOT NULL,
+    source TEXT NOT NULL,
+    id TEXT NOT NULL,
+    title TEXT,
+    url TEXT,
+    updated TEXT,
+    digest TEXT NOT NULL,
+    indexed_at REAL NOT NULL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5(
+    title, body, comments, tokenize = 'unicode61 remove_diacritics 2'
+);
+"""
+
+# bm25 column weights: a match in the title counts most, one in a comment least
+_WEIGHTS = (10.0, 1.0, 0.5)
+
+
+def default_index_path():
+    return os.path.join(os.path.expanduser('~'), '.multi-source-reader', 'index.sqlite')
+
+
+def quote_query(query):
+    """Turn free text into an FTS5 query matching documents that contain every word.
+
+    Each word is quoted, so keys like PROJ-123 (matched as the phrase
+    "proj 123") and punctuation are not read as query syntax.
+    """
+    return ' '.join('"' + word.replace('"', '""') + '"' for word in query.split())
+
+
+class SearchIndex:
+    """Local SQLite FTS5 full-text index of the documents read from every source.
+
+    Documents are stored as normalized records (see src.records), keyed by
+    source and id: reading a document again replaces its entry, and is free
+    when its title, body and comments did not change. `search()` ranks
+    matches with BM25, titles weighing most. The index is one SQLite file in
+    WAL mode, shared by the threads of a process and by concurrent
+    processes.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or default_index_path()
+        if self.path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._db = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._db.execute('PRAGMA journal_mode=WAL')
+            # WAL commits are durable against crashes of the process without an fsync each
+            self._db.execute('PRAGMA synchronous=NORMAL')
+            self._db.executescript(_SCHEMA)
+
+    def add(self, source, ref, result, content_format='text'):
+        """Index one reader result; returns False when it was already indexed unchanged."""
+        return self.add_records([_to_record(source, ref, result, content_format)]) == 1
+
+    def add_records(self, records):
+        """Index Records in one transaction; returns how many were new or changed.
+
+        Records without an id (a PR read by title without its number) are skipped.
+        """
+        changed = 0
+        with self._lock:
+            self._db.execute('BEGIN IMMEDIATE')
+            try:
+                for record in records:
+                    if record.id:
+                        changed += self._upsert(record)
+                self._db.execute('COMMIT')
+            except BaseException:
+                self._db.execute('ROLLBACK')
+                raise
+        return changed
+
+    def _upsert(self, record):
+        key = f"{record.source}:{record.id}"
+        title = record.title or ''
+        body = record.body or ''
+        if not isinstance(body, str):
+            body = str(body)
+        comments = '\n'.join(str(comment) for comment in record.comments if comment)
+        digest = hashlib.sha1('\0'.join((title, body, comments)).encode('utf-8')).hexdigest()
+
+        row = self._db.execute('SELECT rowid, digest FROM documents WHERE key = ?', (key,)).fetchone()
+        if row is not None and row[1] == digest:
+            return 0
+        if row is not None:
+            self._db.execute('DELETE FROM documents_fts WHERE rowid = ?', (row[0],))
+            self._db.execute('UPDATE documents SET title = ?, url = ?, updated = ?, digest = ?, indexed_at = ? '
+                             'WHERE rowid = ?', (title, record.url, record.updated, digest, time.time(), row[0]))
+            rowid = row[0]
+        else:
+            rowid = self._db.execute(
+                'INSERT INTO documents (key, source, id, title, url, updated, digest, indexed_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (key, record.source, str(record.id), title, record.url, record.updated, digest, time.time())
+            ).lastrowid
+        self._db.execute('INSERT INTO documents_fts (rowid, title, body, comments) VALUES (?, ?, ?, ?)',
+                         (rowid, title, body, comments))
+        return 1
+
+    def search(self, query, sources=None, limit=DEFAULT_SEARCH_LIMIT, raw=False):
+        """Return the best matches for `query`, best first, optionally only from `sources`.
+
+        By default every word of `query` must appear; with `raw` the query
+        is passed to FTS5 as is (OR, NOT, prefix* and column: filters).
+        Raises ValueError for an invalid raw query.
+        """
+        match = query if raw else quote_query(query)
+        if not match:
+            return []
+        # Rank first, then build snippets for the top matches only: a snippet costs far more than a score
+        weights = ', '.join(str(weight) for weight in _WEIGHTS)
+        sql = f'SELECT documents_fts.rowid, bm25(documents_fts, {weights}) AS score FROM documents_fts'
+        params = [match]
+        if sources:
+            sql += (' JOIN documents d ON d.rowid = documents_fts.rowid WHERE documents_fts MATCH ? '
+                    f"AND d.source IN ({', '.join('?' * len(sources))})")
+            params.extend(sources)
+        else:
+            sql += ' WHERE documents_fts MATCH ?'
+        sql += ' ORDER BY score LIMIT ?'
+        params.append(limit)
+        with self._lock:
+            try:
+                ranked = self._db.execute(sql, params).fetchall()
+                if not ranked:
+                    return []
+                rowids = [rowid for rowid, _ in ranked]
+                rows = self._db.execute(
+                    "SELECT d.rowid, d.source, d.id, d.title, d.url, d.updated, "
+                    "snippet(documents_fts, -1, '[', ']', '...', 16) "
+                    "FROM documents_fts JOIN documents d ON d.rowid = documents_fts.rowid "
+                    f"WHERE documents_fts MATCH ? AND documents_fts.rowid IN ({', '.join('?' * len(rowids))})",
+                    [match] + rowids
+                ).fetchall()
+            except sqlite3.OperationalError as e:
+                raise ValueError(f"Invalid search query {query!r}: {e}")
+        found = {row[0]: row[1:] for row in rows}
+        results = []
+        for rowid, score in ranked:
+            if rowid not in found:
+                # Replaced by another process between the two queries
+                continue
+            source, doc_id, title, url, updated, snippet = found[rowid]
+            # bm25() is lower for better matches; report it so that higher is better
+            results.append({'source': source, 'id': doc_id, 'title': title, 'url': url, 'updated': updated,
+                            'score': round(-score, 4), 'snippet': snippet.strip()})
+        return results
+
+    def count(self, source=None):
+        with self._lock:
+            if source is None:
+                return self._db.execute('SELECT COUNT(*) FROM documents').fetchone()[0]
+            return self._db.execute('SELECT COUNT(*) FROM documents WHERE source = ?', (source,)).fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+def _to_record(source, ref, result, content_format):
+    from src.records import to_record
+    return to_record(source, ref, result, content_format)
+
+
+def _index(reader, source, ref, result, kwargs):
+    search_index = getattr(reader, 'search_index', None)
+    if search_index is None or not result or (isinstance(result, dict) and 'error' in result):
+        return
+    if kwargs.get('fields') and 'description' not in kwargs['fields']:
+        # A partial read would replace the full document
+        return
+    # Confluence bodies are indexed as text, unless the read already converted them
+    content_format = 'text' if kwargs.get('content_format', 'storage') == 'storage' else 'storage'
+    try:
+        search_index.add(source, ref or '', result, content_format)
+    except Exception as e:
+        # The index is a convenience: failing to update it must not fail the read
+        logger.warning("Could not index %s %s: %s", source, ref, e)
+
+
+def indexed(source, ref=None):
+    """Decorator adding what a reader method (or generator) returns to the reader's `search_index`, if any.
+
+    The document's reference is `ref(reader, result)` when given, otherwise
+    the method's first argument for a method returning one document.
+    """
+    def decorator(func):
+        def reference(reader, args, result):
+            if ref is not None:
+                return ref(reader, result)
+            return args[0] if args and isinstance(args[0], str) and not inspect.isgeneratorfunction(func) else None
+
+        if inspect.isgeneratorfunction(func):
+            @functools.wraps(func)
+            def generator_wrapper(reader, *args, **kwargs):
+                for result in func(reader, *args, **kwargs):
+                    _index(reader, source, reference(reader, args, result), result, kwargs)
+                    yield result
+            return generator_wrapper
+
+        @functools.wraps(func)
+        def wrapper(reader, *args, **kwargs):
+            result = func(reader, *args, **kwargs)
+            _index(reader, source, reference(reader, args, result), result, kwargs)
+            return result
+        return wrapper
+    return decorator
@@ -0,0 +1,360 @@
+import os
+import hmac
+import json
+import time
+import secrets
+import tempfile
+import socket
+import signal
+import logging
+import threading
+import http.client
+import socketserver
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from src.sources import SOURCES, detect_source
+
+DEFAULT_TIMEOUT = 300
+MAX_BODY_BYTES = 1024 * 1024
+LOOPBACK_HOSTS = ('localhost', '127.0.0.1', '::1')
+
+logger = logging.getLogger(__name__)
+
+
+def default_address():
+    if hasattr(socket, 'AF_UNIX'):
+        return os.path.join(os.path.expanduser('~'), '.multi-source-reader', 'server.sock')
+    return '127.0.0.1:8765'
+
+
+def parse_address(address):
+    """Return ('unix', path) or ('tcp', (host, port)) for `unix:PATH`, a path, `HOST:PORT` or a port."""
+    address = address or default_address()
+    if address.startswith('unix:'):
+        return 'unix', address[len('unix:'):]
+    if '/' in address or os.sep in address:
+        return 'unix', address
+    host, sep, port = address.rpartition(':')
+    if not port.isdigit():
+        raise ValueError(f"Invalid server address: {address}")
+    return 'tcp', (host or '127.0.0.1', int(port))
+
+
+def token_path(kind, address):
+    """Where the server at `address` keeps the token its clients must send."""
+    if kind == 'unix':
+        return address + '.token'
+    host, port = address
+    return os.path.join(os.path.expanduser('~'), '.multi-source-reader', f'server-{host or "any"}-{port}.token')
+
+
+def _write_token(path, token):
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    # mkstemp creates the file readable by the owner only
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(token)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _host_name(host_header):
+    """The host of a Host header, without its port: `[::1]:8765` gives `::1`."""
+    host = (host_header or '').strip().lower()
+    if host.startswith('['):
+        return host[1:].split(']', 1)[0]
+    return host.rsplit(':', 1)[0] if host.count(':') == 1 else host
+
+
+class ServerError(RuntimeError):
+    pass
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = 'multi-source-reader'
+
+    def address_string(self):
+        # Unix socket peers have no address
+        return self.client_address[0] if self.client_address else 'unix'
+
+    def log_message(self, format, *args):
+        logger.debug("%s %s", self.address_string(), format % args)
+
+    def _authorized(self, need_token=True):
+        """Check the Host header and the token, answering 403 when either is wrong.
+
+        The token keeps other local users and processes out; the Host check
+        keeps out browser pages that reach a loopback port through DNS
+        rebinding.
+        """
+        app = self.server.app
+        if app.kind == 'tcp' and not app.allow_remote and _host_name(self.headers.get('Host')) not in LOOPBACK_HOSTS:
+            self._send_json(403, {'error': "Forbidden host"})
+            return False
+        if need_token:
+            scheme, _, token = (self.headers.get('Authorization') or '').partition(' ')
+            if scheme != 'Bearer' or not hmac.compare_digest(token.encode('utf-8'), app.token.encode('utf-8')):
+                self._send_json(403, {'error': "Missing or invalid server token"})
+                return False
+        return True
+
+    def do_GET(self):
+        app = self.server.app
+        # Health only tells whether a server is there, which is what a client without the token needs to know
+        if not self._authorized(need_token=self.path != '/health'):
+            return
+        if self.path == '/health':
+            self._send_json(200, {'status': 'ok', 'pid': os.getpid(), 'uptime': round(time.time() - app.started, 1)})
+        elif self.path == '/stats':
+            self._send_json(200, app.stats())
+        else:
+            self._send_json(404, {'error': f"Unknown path: {self.path}"})
+
+    def do_POST(self):
+        app = self.server.app
+        if not self._authorized():
+            return
+        if self.path == '/shutdown':
+            self._send_json(202, {'status': 'shutting down'})
+            app.shutdown()
+            return
+        if self.path != '/read':
+            self._send_json(404, {'error': f"Unknown path: {self.path}"})
+            return
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            if length > MAX_BODY_BYTES:
+                raise ValueError("Request body too large")
+            request = json.loads(self.rfile.read(length) or b'{}')
+            ref = request['ref']
+            source = request.get('source') or detect_source(ref)
+            if source not in SOURCES:
+                raise ValueError(f"Unknown source: {source}")
+        except (KeyError, TypeError, ValueError) as e:
+            self._send_json(400, {'error': f"Invalid request: {e}"})
+            return
+        try:
+            result = app.readers.read(source, ref)
+        except Exception as e:
+            logger.debug("Reading %s %s failed", source, ref, exc_info=True)
+            self._send_json(502, {'error': str(e)})
+            return
+        self._send_json(200, {'result': result})
+
+    def _send_json(self, status, body):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class _TCPServer(socketserver.ThreadingMixIn, HTTPServer):
+    # Non-daemon threads, so that server_close() waits for reads in flight
+    daemon_threads = False
+    allow_reuse_address = True
+
+
+if hasattr(socketserver, 'UnixStreamServer'):
+    class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        daemon_threads = False
+
+        def server_bind(self):
+            # Only the owner may connect: requests are made with the owner's credentials
+            umask = os.umask(0o177)
+            try:
+                super().server_bind()
+            finally:
+                os.umask(umask)
+
+
+class ReadServer:
+    """Serves reads over HTTP on a Unix socket or a local TCP port, keeping readers warm between requests.
+
+    Every request shares one SourceReaders, so clients, authenticated
+    sessions, connection pools, Google discovery documents, the response
+    cache and the rate limit scheduler are built once per server rather
+    than once per CLI call. Requests are handled on their own threads.
+
+    Reads are made with the owner's credentials, so every request but
+    /health must carry the random token the server writes to a file only
+    the owner can read (see `token_path`), and TCP requests must be
+    addressed to a loopback host. Listening on anything but a loopback
+    address takes `allow_remote`.
+    """
+
+    def __init__(self, readers, address=None, scheduler=None, allow_remote=False, token_file=None):
+        self.readers = readers
+        self.scheduler = scheduler
+        self.allow_remote = allow_remote
+        self.kind, self.address = parse_address(address)
+        self.started = time.time()
+        self.token = secrets.token_urlsafe(32)
+        if self.kind == 'tcp' and self.address[0] not in LOOPBACK_HOSTS and not allow_remote:
+            raise ValueError(f"Refusing to listen on non-loopback address {self.address[0]!r}: "
+                             f"anyone who can reach it could read with your credentials (use --allow-remote)")
+        if self.kind == 'unix':
+            self._remove_stale_socket()
+            os.makedirs(os.path.dirname(os.path.abspath(self.address)), exist_ok=True)
+            self.httpd = _UnixServer(self.address, _Handler)
+        else:
+            self.httpd = _TCPServer(self.address, _Handler)
+            # Port 0 picks a free port
+            self.address = self.httpd.server_address[:2]
+        self.httpd.app = self
+        self.token_path = token_file or token_path(self.kind, self.address)
+        _write_token(self.token_path, self.token)
+
+    def _remove_stale_socket(self):
+        if not os.path.exists(self.address):
+            return
+        try:
+            ServerClient(f'unix:{self.address}', timeout=1).health()
+        except (OSError, ServerError):
+            os.remove(self.address)
+            return
+        raise RuntimeError(f"A server is already listening on {self.address}")
+
+    @property
+    def url(self):
+        if self.kind == 'unix':
+            return f'unix:{self.address}'
+        return f'{self.address[0]}:{self.address[1]}'
+
+    def warm(self, sources=SOURCES):
+        """Build the readers and their clients for `sources` ahead of the first request."""
+        for source in sources:
+            try:
+                reader = self.readers.get(source)
+                if source in ('jira', 'confluence'):
+                    getattr(reader, source)
+                elif source == 'google':
+                    reader.docs_service
+                    reader.sheets_service
+            except Exception as e:
+                logger.debug("Could not warm up %s: %s", source, e)
+
+    def stats(self):
+        stats = {'pid': os.getpid(), 'uptime': round(time.time() - self.started, 1)}
+        if self.scheduler is not None:
+            stats['rate_limits'] = self.scheduler.stats()
+        return stats
+
+    def serve_forever(self):
+        try:
+            self.httpd.serve_forever()
+        finally:
+            self.close()
+
+    def shutdown(self):
+        # shutdown() waits for serve_forever() to return, so it must not run on a handler thread
+        threading.Thread(target=self.httpd.shutdown, daemon=True).start()
+
+    def close(self):
+        self.httpd.server_close()
+        self.remove_socket()
+
+    def remove_socket(self):
+        if self.kind == 'unix' and os.path.exists(self.address):
+            os.remove(self.address)
+        if os.path.exists(self.token_path):
+            os.remove(self.token_path)
+
+
+def serve(readers, address=None, scheduler=None, warm=True, allow_remote=False, token_file=None):
+    """Run a ReadServer until SIGINT, SIGTERM or a /shutdown request, then finish the reads in flight."""
+    server = ReadServer(readers, address, scheduler, allow_remote=allow_remote, token_file=token_file)
+    if warm:
+        threading.Thread(target=server.warm, name='warm-up', daemon=True).start()
+
+    stopping = []
+
+    def stop(signum, frame):
+        if stopping:
+            # A second signal does not wait for the reads in flight
+            logger.warning("Received signal %s again, exiting now", signum)
+            server.remove_socket()
+            os._exit(1)
+        stopping.append(signum)
+        logger.warning("Received signal %s, finishing the reads in flight", signum)
+        server.shutdown()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    logger.warning("Serving on %s", server.url)
+    server.serve_forever()
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path, timeout):
+        super().__init__('localhost', timeout=timeout)
+        self.path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.path)
+
+
+class ServerClient:
+    """Thin client for a ReadServer; safe to share between threads.
+
+    The server's token is read from `token_path(...)` for the address, or
+    from `token_file`.
+    """
+
+    def __init__(self, address=None, timeout=DEFAULT_TIMEOUT, token_file=None):
+        self.kind, self.address = parse_address(address)
+        self.timeout = timeout
+        self.token_file = token_file or token_path(self.kind, self.address)
+
+    def _token(self):
+        # Read on every request, since a restarted server has a new token
+        try:
+            with open(self.token_file, 'r') as f:
+                return f.read().strip()
+        except OSError:
+            return None
+
+    def _connection(self):
+        if self.kind == 'unix':
+            return _UnixHTTPConnection(self.address, self.timeout)
+        return http.client.HTTPConnection(*self.address, timeout=self.timeout)
+
+    def _request(self, method, path, body=None):
+        connection = self._connection()
+        try:
+            data = json.dumps(body).encode('utf-8') if body is not None else None
+            headers = {'Content-Type': 'application/json'} if data is not None else {}
+            token = self._token()
+            if token:
+                headers['Authorization'] = f'Bearer {token}'
+            connection.request(method, path, body=data, headers=headers)
+            response = connection.getresponse()
+            payload = response.read()
+        finally:
+            connection.close()
+        try:
+            payload = json.loads(payload)
+        except ValueError:
+            raise ServerError(f"Invalid response from server: {payload[:200]!r}")
+        if response.status >= 400:
+            raise ServerError(payload.get('error', f"Server returned {response.status}"))
+        return payload
+
+    def read(self, source, ref):
+        return self._request('POST', '/read', {'source': source, 'ref': ref})['result']
+
+    def health(self):
+        return self._request('GET', '/health')
+
+    def stats(self):
+        return self._request('GET', '/stats')
+
+    def shutdown(self):
+        return self._request('POST', '/shutdown')
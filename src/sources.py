@@ -0,0 +1,103 @@
+import re
+import threading
+
+SOURCES = ('github', 'google', 'jira', 'confluence')
+
+JIRA_KEY_RE = re.compile(r'^[A-Z][A-Z0-9_]*-\d+$')
+
+# Defined here rather than in the GitHub reader, so that the CLI can list them without loading PyGithub
+PR_FIELDS = ('title', 'number', 'description', 'updated_at', 'comments', 'issue_comments', 'file_changes')
+DEFAULT_PR_FIELDS = ('title', 'number', 'description', 'updated_at', 'comments', 'file_changes')
+
+
+def detect_source(ref):
+    if 'github.com/' in ref:
+        return 'github'
+    if 'docs.google.com/' in ref:
+        return 'google'
+    if '/wiki/' in ref:
+        return 'confluence'
+    if JIRA_KEY_RE.match(ref):
+        return 'jira'
+    raise ValueError(f"Cannot tell which source this reference belongs to: {ref}")
+
+
+class SourceReaders:
+    """Builds each reader once and dispatches references to it.
+
+    Jira and Confluence share a single JiraAndConfluenceReader. Readers are
+    shared between threads, so batch runs pay client construction only once.
+    """
+
+    def __init__(self, title_match='exact', pr_fields=None, patch_filter=None, cache=None, max_connections=None,
+                 scheduler=None, github_api='rest', search_index=None):
+        self.title_match = title_match
+        self.github_api = github_api
+        self.cache = cache
+        self.max_connections = max_connections
+        self.scheduler = scheduler
+        self.search_index = search_index
+        self.pr_fields = pr_fields
+        self.patch_filter = patch_filter
+        self._readers = {}
+        self._lock = threading.Lock()
+
+    def get(self, source):
+        kind = 'atlassian' if source in ('jira', 'confluence') else source
+        with self._lock:
+            if kind not in self._readers:
+                self._readers[kind] = self._create(kind)
+            return self._readers[kind]
+
+    def _create(self, kind):
+        # Imported here so that only the client libraries of the sources in use get loaded
+        if kind == 'github' and self.github_api == 'graphql':
+            from src.github_graphql_reader import GitHubGraphQLReader
+            return GitHubGraphQLReader(cache=self.cache, max_connections=self.max_connections,
+                                       scheduler=self.scheduler, search_index=self.search_index)
+        if kind == 'github':
+            from src.github_pr_reader import GitHubPRReader
+            return GitHubPRReader(cache=self.cache, max_connections=self.max_connections,
+                                  scheduler=self.scheduler, search_index=self.search_index)
+        if kind == 'google':
+            from src.google_doc_reader import GoogleDocReader
+            return GoogleDocReader(cache=self.cache, scheduler=self.scheduler, search_index=self.search_index,
+                                   max_connections=self.max_connections)
+        if kind == 'atlassian':
+            from src.jira_ticket_reader import JiraAndConfluenceReader
+            return JiraAndConfluenceReader(cache=self.cache, max_connections=self.max_connections,
+                                           scheduler=self.scheduler, search_index=self.search_index)
+        raise ValueError(f"Unknown source: {kind}")
+
+    def read(self, source, ref):
+        if source == 'github':
+            reader = self.get('github')
+            if ref.startswith('http'):
+                return reader.read_pr_by_url(ref, fields=self.pr_fields, patch_filter=self.patch_filter)
+            return reader.read_pr_by_title(ref, match=self.title_match, fields=self.pr_fields,
+                                           patch_filter=self.patch_filter)
+
+        if source == 'google':
+            return self.get('google').read_url(ref)
+
+        if source == 'jira':
+            return self.get('jira').read_ticket(ref)
+
+        if source == 'confluence':
+            result = self.get('confluence').read_confluence_page_by_url(ref)
+            if 'error' in result:
+                raise RuntimeError(result['error'])
+            return result
+
+        raise ValueError(f"Unknown source: {source}")
+
+    def sync(self, source, ref, watermark=None, since=None):
+        """Return (changes, watermark) for `ref`; changes is None when nothing changed since `watermark`."""
+        if source == 'github':
+            return self.get('github').sync_pr(ref, watermark, since, match=self.title_match, fields=self.pr_fields,
+                                              patch_filter=self.patch_filter)
+        if source == 'jira':
+            return self.get('jira').sync_ticket(ref, watermark, since)
+        if source == 'confluence':
+            return self.get('confluence').sync_confluence_page(ref, watermark, since)
+        raise ValueError(f"Sync is not supported for {source}")
@@ -0,0 +1,381 @@
+import re
+from html.parser import HTMLParser
+
+FORMATS = ('storage', 'text', 'markdown')
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+_WHITESPACE = re.compile(r'\s+')
+HEADINGS = {'h1': 1, 'h2': 2, 'h3': 3, 'h4': 4, 'h5': 5, 'h6': 6}
+# Elements that end the current line of text
+BLOCKS = {'p', 'div', 'blockquote', 'section', 'ac:layout-cell', 'ac:rich-text-body', 'ac:task-body'}
+INLINE_MARKDOWN = {'strong': '**', 'b': '**', 'em': '*', 'i': '*', 'code': '`', 's': '~~', 'del': '~~'}
+# Elements whose text is metadata rather than content
+SKIPPED = {'ac:parameter', 'ac:task-id', 'ac:placeholder', 'style', 'script'}
+# Macros shown as quotes in Markdown
+ADMONITIONS = {'info', 'note', 'tip', 'warning', 'panel', 'expand', 'excerpt'}
+
+
+class StorageConverter(HTMLParser):
+    """Incremental Confluence storage format (XHTML) to plain text or Markdown converter.
+
+    Feed it the page in chunks and drain the converted text as it goes:
+    only the current line, table row or code block is held in memory, never
+    the document. Handles headings, paragraphs, nested lists, task lists,
+    tables (tab separated in text, pipe tables in Markdown), links, images,
+    code and noformat macros and info/note/warning panels; other macros
+    contribute their body text only.
+    """
+
+    def __init__(self, markdown=False):
+        super().__init__(convert_charrefs=True)
+        self.markdown = markdown
+        self._out = []
+        self._line = []
+        self._lists = []
+        self._marker = None
+        self._heading = 0
+        self._quote = 0
+        self._skip = 0
+        self._macros = []
+        self._parameters = None
+        self._code = None
+        self._code_blanks = 0
+        self._tables = 0
+        self._rows = 0
+        self._row = None
+        self._cell = None
+        self._nested = 0
+        self._links = []
+        self._task_status = None
+        self._started = False
+        self._pending_blank = False
+
+    def drain(self):
+        """Return the text converted so far and forget it."""
+        text = ''.join(self._out)
+        self._out = []
+        return text
+
+    def close(self):
+        super().close()
+        self._flush()
+
+    # Output
+
+    def _target(self):
+        return self._cell if self._cell is not None else self._line
+
+    def _prefix(self):
+        return '> ' * self._quote if self.markdown else ''
+
+    def _emit(self, line, blank_after=False):
+        self._write_blank()
+        self._out.append(self._prefix() + line + '\n')
+        self._started = True
+        if blank_after and not self._lists:
+            self._blank_line()
+
+    def _blank_line(self):
+        # Blank lines are written lazily, so none lead or trail the output or a quote
+        self._pending_blank = True
+
+    def _write_blank(self):
+        if self._pending_blank and self._started:
+            self._out.append(self._prefix().rstrip() + '\n')
+        self._pending_blank = False
+
+    def _start_quote(self):
+        self._flush()
+        self._blank_line()
+        self._write_blank()
+        self._quote += 1
+
+    def _end_quote(self):
+        self._flush()
+        self._quote -= 1
+        self._blank_line()
+
+    def _flush(self, blank_after=True):
+        text = ''.join(self._line).strip()
+        self._line = []
+        if not text:
+            return
+        if self._heading:
+            if self.markdown:
+                text = '#' * self._heading + ' ' + text
+            self._emit(text, blank_after=True)
+            return
+        if self._lists:
+            indent = '  ' * (len(self._lists) - 1)
+            marker = self._marker or ''
+            self._marker = None
+            text = indent + (marker or '  ') + text
+        self._emit(text, blank_after=blank_after)
+
+    def _end_task_status(self):
+        status = ''.join(self._task_status or []).strip()
+        self._task_status = None
+        if self._cell is not None:
+            self._cell.append('[x] ' if status == 'complete' else '[ ] ')
+        elif self._lists:
+            self._marker = self._list_marker(status)
+
+    def _list_marker(self, status=None):
+        kind = self._lists[-1]
+        if kind[0] == 'task':
+            checked = status == 'complete'
+            return ('- [x] ' if checked else '- [ ] ') if self.markdown else ('[x] ' if checked else '[ ] ')
+        if kind[0] == 'ol':
+            return f'{kind[1]}. '
+        return '- ' if self.markdown else '* '
+
+    # Parser callbacks
+
+    def handle_starttag(self, tag, attrs):
+        if self._skip or tag in SKIPPED:
+            if tag == 'ac:parameter' and self._parameters is not None and not self._skip:
+                self._parameters.append([dict(attrs).get('ac:name'), ''])
+            self._skip += 1
+            return
+        if self._code is not None:
+            return
+        if tag == 'ac:structured-macro' or tag == 'ac:macro':
+            name = dict(attrs).get('ac:name', '')
+            self._macros.append(name)
+            self._parameters = []
+            if name in ADMONITIONS and self.markdown and self._cell is None:
+                self._start_quote()
+            return
+        if self._cell is not None:
+            self._start_in_cell(tag, attrs)
+            return
+        if tag in HEADINGS:
+            self._flush()
+            self._heading = HEADINGS[tag]
+        elif tag in BLOCKS:
+            self._flush(blank_after=not self._lists)
+            if tag == 'blockquote' and self.markdown:
+                self._start_quote()
+        elif tag in ('ul', 'ol', 'ac:task-list'):
+            self._flush(blank_after=False)
+            if not self._lists:
+                self._blank_line()
+            self._lists.append(['task' if tag == 'ac:task-list' else tag, 0])
+        elif tag in ('li', 'ac:task'):
+            self._flush(blank_after=False)
+            if self._lists:
+                self._lists[-1][1] += 1
+            self._marker = None if tag == 'ac:task' else (self._list_marker() if self._lists else None)
+        elif tag == 'ac:task-status':
+            self._task_status = []
+        elif tag == 'table':
+            self._flush()
+            self._blank_line()
+            self._tables += 1
+            self._rows = 0
+        elif tag == 'tr':
+            self._row = []
+        elif tag in ('td', 'th'):
+            self._cell = []
+        elif tag == 'pre' or tag == 'ac:plain-text-body':
+            self._start_code()
+        elif tag == 'br':
+            self._flush(blank_after=False)
+        elif tag == 'hr':
+            self._flush()
+            if self.markdown:
+                self._emit('---', blank_after=True)
+        else:
+            self._start_inline(tag, attrs)
+
+    def _start_in_cell(self, tag, attrs):
+        if tag == 'table':
+            self._nested += 1
+        if tag in ('td', 'th', 'tr', 'li', 'br', 'p', 'div') or tag in HEADINGS:
+            self._cell.append(' ')
+        elif tag == 'ac:task-status':
+            self._task_status = []
+        else:
+            self._start_inline(tag, attrs)
+
+    def _start_inline(self, tag, attrs):
+        target = self._target()
+        if tag == 'a':
+            self._links.append((target, len(target), dict(attrs).get('href'), None))
+        elif tag in ('ac:link', 'ac:image'):
+            self._links.append((target, len(target), tag, None))
+        elif tag.startswith('ri:') and self._links:
+            attrs = dict(attrs)
+            name = (attrs.get('ri:content-title') or attrs.get('ri:filename') or attrs.get('ri:value')
+                    or attrs.get('ri:space-key'))
+            if name is None and (attrs.get('ri:account-id') or attrs.get('ri:userkey')):
+                name = '@' + (attrs.get('ri:account-id') or attrs.get('ri:userkey'))
+            if name is not None and self._links[-1][3] is None:
+                self._links[-1] = self._links[-1][:3] + (name,)
+        elif tag == 'time':
+            target.append(dict(attrs).get('datetime') or '')
+        elif self.markdown and tag in INLINE_MARKDOWN:
+            target.append(INLINE_MARKDOWN[tag])
+
+    def handle_endtag(self, tag):
+        if self._skip:
+            self._skip -= 1
+            return
+        if self._code is not None:
+            if tag == 'pre' or tag == 'ac:plain-text-body':
+                self._end_code()
+            return
+        if tag == 'ac:structured-macro' or tag == 'ac:macro':
+            name = self._macros.pop() if self._macros else ''
+            self._parameters = None
+            if name in ADMONITIONS and self.markdown and self._cell is None:
+                self._end_quote()
+            return
+        if self._cell is not None:
+            if self._nested:
+                # Nested tables are flattened into the cell
+                if tag == 'table':
+                    self._nested -= 1
+                if tag in ('table', 'tr', 'td', 'th'):
+                    self._cell.append(' ')
+                    return
+            elif tag in ('td', 'th'):
+                if self._row is not None:
+                    self._row.append(_WHITESPACE.sub(' ', ''.join(self._cell)).strip())
+                self._cell = None
+                return
+            if tag != 'table':
+                self._end_inline(tag)
+                return
+        if tag in HEADINGS:
+            self._flush()
+            self._heading = 0
+        elif tag in BLOCKS:
+            self._flush(blank_after=not self._lists)
+            if tag == 'blockquote' and self.markdown:
+                self._end_quote()
+        elif tag in ('ul', 'ol', 'ac:task-list'):
+            self._flush(blank_after=False)
+            if self._lists:
+                self._lists.pop()
+            if not self._lists:
+                self._blank_line()
+        elif tag in ('li', 'ac:task'):
+            self._flush(blank_after=False)
+        elif tag == 'ac:task-status':
+            self._end_task_status()
+        elif tag == 'tr':
+            self._end_row()
+        elif tag == 'table':
+            self._tables = max(0, self._tables - 1)
+            self._row = None
+            self._cell = None
+            self._nested = 0
+            self._blank_line()
+        else:
+            self._end_inline(tag)
+
+    def _end_inline(self, tag):
+        if tag in ('a', 'ac:link', 'ac:image') and self._links:
+            target, start, href, name = self._links.pop()
+            text = ''.join(target[start:]).strip()
+            del target[start:]
+            if tag == 'ac:image':
+                if self.markdown and name:
+                    target.append(f'![]({name})')
+            elif tag == 'a' and self.markdown and href:
+                target.append(f'[{text or href}]({href})')
+            else:
+                target.append(text or name or href or '')
+        elif tag == 'ac:task-status':
+            self._end_task_status()
+        elif self.markdown and tag in INLINE_MARKDOWN:
+            self._target().append(INLINE_MARKDOWN[tag])
+
+    def _end_row(self):
+        row = self._row
+        self._row = None
+        if not row:
+            return
+        if self.markdown:
+            self._emit('| ' + ' | '.join(cell.replace('|', '\\|') for cell in row) + ' |')
+            if self._rows == 0:
+                self._emit('|' + ' --- |' * len(row))
+        else:
+            self._emit('\t'.join(row))
+        self._rows += 1
+
+    def _start_code(self):
+        self._flush()
+        self._blank_line()
+        # Code is written a line at a time; blank lines are held back so
+        # leading and trailing ones can be dropped
+        self._code = ''
+        self._code_blanks = -1
+        if self.markdown:
+            language = ''
+            for name, value in self._parameters or []:
+                if name == 'language':
+                    language = value.strip()
+            self._emit('```' + language)
+
+    def _code_line(self, line):
+        if not line.strip():
+            if self._code_blanks >= 0:
+                self._code_blanks += 1
+            return
+        for _ in range(max(self._code_blanks, 0)):
+            self._emit('')
+        self._code_blanks = 0
+        self._emit(line)
+
+    def _end_code(self):
+        self._code_line(self._code)
+        self._code = None
+        if self.markdown:
+            self._emit('```')
+        self._blank_line()
+
+    def handle_data(self, data):
+        if self._skip:
+            if self._parameters:
+                self._parameters[-1][1] += data
+            return
+        if self._code is not None:
+            lines = (self._code + data).split('\n')
+            self._code = lines.pop()
+            for line in lines:
+                self._code_line(line)
+            return
+        if self._task_status is not None:
+            self._task_status.append(data)
+            return
+        self._target().append(_WHITESPACE.sub(' ', data))
+
+    def unknown_decl(self, data):
+        if data.startswith('CDATA['):
+            self.handle_data(data[len('CDATA['):])
+
+
+def iter_storage_text(chunks, markdown=False):
+    """Convert storage format given as text chunks, yielding the converted text as it is produced."""
+    converter = StorageConverter(markdown)
+    for chunk in chunks:
+        converter.feed(chunk)
+        text = converter.drain()
+        if text:
+            yield text
+    converter.close()
+    text = converter.drain()
+    if text:
+        yield text
+
+
+def convert_storage(value, content_format='text', chunk_size=DEFAULT_CHUNK_SIZE):
+    """Convert a page body to `content_format` ('storage' returns it unchanged)."""
+    if content_format not in FORMATS:
+        raise ValueError(f"Unknown content format: {content_format}")
+    if content_format == 'storage' or not value:
+        return value
+    chunks = (value[i:i + chunk_size] for i in range(0, len(value), chunk_size))
+    return ''.join(iter_storage_text(chunks, markdown=content_format == 'markdown'))
@@ -0,0 +1,76 @@
+import os
+import json
+import tempfile
+from src.batch import DEFAULT_WORKERS, run_batch
+from src.output import write_ndjson
+
+
+def default_state_path():
+    return os.path.join(os.path.expanduser('~'), '.multi-source-reader', 'sync_state.json')
+
+
+class SyncState:
+    """Per-object watermarks from the previous sync, kept in a JSON file.
+
+    Each entry is keyed by `<source>:<ref>` and holds whatever the reader
+    needs to tell what changed since then (updated timestamps, ETags, the
+    newest comment id, file shas, the Confluence page version).
+    """
+
+    def __init__(self, path=None):
+        self.path = path or default_state_path()
+        self.watermarks = {}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r') as f:
+                    self.watermarks = json.load(f).get('watermarks', {})
+            except (OSError, ValueError):
+                # A corrupt state file just means the next sync starts from scratch
+                self.watermarks = {}
+
+    def get(self, source, ref):
+        return self.watermarks.get(f"{source}:{ref}")
+
+    def set(self, source, ref, watermark):
+        self.watermarks[f"{source}:{ref}"] = watermark
+
+    def save(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump({'watermarks': self.watermarks}, f)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+
+def run_sync(entries, readers, state, since=None, workers=DEFAULT_WORKERS, source_limits=None, write=write_ndjson):
+    """Sync every entry concurrently and write one `changes` record per entry that changed.
+
+    Unchanged entries write nothing. A watermark only moves forward once its
+    changes have been written, and the state is saved even if the run fails
+    part way. On a first sync, `since` limits the changes to the ones made
+    after it. Returns the number of entries that failed.
+    """
+    def sync(source, ref):
+        return readers.sync(source, ref, state.get(source, ref), since)
+
+    def write_changes(record):
+        if 'error' in record:
+            write(record)
+            return
+        changes, watermark = record.pop('result')
+        if changes is not None:
+            record['changes'] = changes
+            write(record)
+        state.set(record['source'], record['ref'], watermark)
+
+    try:
+        return run_batch(entries, readers, workers=workers, source_limits=source_limits,
+                         write=write_changes, read=sync)
+    finally:
+        state.save()
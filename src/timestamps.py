@@ -0,0 +1,17 @@
+import re
+from datetime import datetime, timezone
+
+
+def parse_timestamp(value):
+    """Parse an ISO 8601 timestamp as GitHub, Jira and Confluence write them into an aware datetime."""
+    if isinstance(value, datetime):
+        timestamp = value
+    else:
+        value = value.strip().replace('Z', '+00:00')
+        # Jira writes offsets without a colon (+0000), which fromisoformat only accepts from Python 3.11
+        if re.search(r'[+-]\d{4}$', value):
+            value = value[:-2] + ':' + value[-2:]
+        timestamp = datetime.fromisoformat(value)
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    return timestamp
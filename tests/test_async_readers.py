@@ -0,0 +1,88 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import json
+import time
+import asyncio
+import threading
+import pytest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+from src.async_readers import AsyncReaders
+
+class StubConfluenceHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    delay = 0.2
+
+    def do_GET(self):
+        self.server.connections.add(self.client_address)
+        page_id = self.path.split('?')[0].rstrip('/').split('/')[-1]
+        time.sleep(self.delay)
+        body = json.dumps({
+            'id': page_id,
+            'title': f'Page {page_id}',
+            'body': {'storage': {'value': f'<p>Content {page_id}</p>'}},
+            'version': {'number': 1}
+        }).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+@pytest.fixture
+def stub_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubConfluenceHandler)
+    server.connections = set()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def stub_env(stub_server):
+    with patch.dict('os.environ', {
+        'JIRA_DOMAIN': f'http://127.0.0.1:{stub_server.server_address[1]}',
+        'JIRA_EMAIL': 'test@example.com',
+        'JIRA_TOKEN': 'test_token'
+    }), patch('src.jira_ticket_reader.JIRA'):
+        yield
+
+def test_reads_run_concurrently_over_pooled_connections(stub_server, stub_env):
+    urls = [f'{os.environ["JIRA_DOMAIN"]}/wiki/spaces/TEST/pages/{i}/Page' for i in range(1, 13)]
+
+    async def read_all():
+        async with AsyncReaders(max_connections=4) as readers:
+            start = time.monotonic()
+            results = await asyncio.gather(*(readers.read_confluence_page_by_url(url) for url in urls))
+            elapsed = time.monotonic() - start
+            # A second round reuses the kept-alive connections
+            await asyncio.gather(*(readers.read_confluence_page_by_url(url) for url in urls))
+            return results, elapsed
+
+    results, elapsed = asyncio.run(read_all())
+
+    assert [result['id'] for result in results] == [str(i) for i in range(1, 13)]
+    # 12 requests of 0.2s over 4 connections take three rounds, not twelve
+    assert elapsed < 12 * 0.2 / 2
+    assert len(stub_server.connections) <= 4
+
+def test_read_many_returns_errors_in_place():
+    class FakeReaders:
+        def read(self, source, ref):
+            if ref == 'PROJ-2':
+                raise ValueError("Issue does not exist")
+            return {'key': ref}
+
+    async def read_all():
+        async with AsyncReaders(max_connections=2, readers=FakeReaders()) as readers:
+            return await readers.read_many([('jira', 'PROJ-1'), ('jira', 'PROJ-2')])
+
+    first, second = asyncio.run(read_all())
+    assert first == {'key': 'PROJ-1'}
+    assert isinstance(second, ValueError)
@@ -0,0 +1,133 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import time
+import threading
+import pytest
+from src.batch import parse_manifest, run_batch
+
+class FakeReaders:
+    def __init__(self, delay=0.2):
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.active = {}
+        self.peak = {}
+
+    def read(self, source, ref):
+        with self.lock:
+            self.active[source] = self.active.get(source, 0) + 1
+            self.peak[source] = max(self.peak.get(source, 0), self.active[source])
+        try:
+            time.sleep(self.delay)
+            if ref == 'BROKEN-1':
+                raise ValueError("Issue does not exist")
+            return {'ref': ref}
+        finally:
+            with self.lock:
+                self.active[source] -= 1
+
+def test_parse_manifest_lines():
+    text = """
+    # references to read
+    https://github.com/owner/repo/pull/1
+    github: Fix login bug
+    PROJ-123
+    https://docs.google.com/document/d/abc123/edit
+    https://test.atlassian.net/wiki/spaces/TEST/pages/123/Test+Page
+    """
+    assert parse_manifest(text) == [
+        ('github', 'https://github.com/owner/repo/pull/1'),
+        ('github', 'Fix login bug'),
+        ('jira', 'PROJ-123'),
+        ('google', 'https://docs.google.com/document/d/abc123/edit'),
+        ('confluence', 'https://test.atlassian.net/wiki/spaces/TEST/pages/123/Test+Page'),
+    ]
+
+def test_parse_manifest_json():
+    text = '{"sources": ["PROJ-1", {"source": "github", "ref": "Fix login bug"}, {"jira": "PROJ-2"}]}'
+    assert parse_manifest(text) == [('jira', 'PROJ-1'), ('github', 'Fix login bug'), ('jira', 'PROJ-2')]
+
+def test_parse_manifest_yaml():
+    pytest.importorskip('yaml')
+    text = "- PROJ-1\n- github: Fix login bug\n- source: jira\n  ref: PROJ-2\n"
+    assert parse_manifest(text) == [('jira', 'PROJ-1'), ('github', 'Fix login bug'), ('jira', 'PROJ-2')]
+
+def test_parse_manifest_rejects_unknown_reference():
+    with pytest.raises(ValueError, match="Cannot tell which source"):
+        parse_manifest("not a reference")
+
+def test_run_batch_runs_concurrently():
+    readers = FakeReaders(delay=0.2)
+    entries = [('jira', f'PROJ-{i}') for i in range(5)] + [('github', f'PR {i}') for i in range(5)]
+    records = []
+
+    start = time.monotonic()
+    failures = run_batch(entries, readers, workers=10, write=records.append)
+    elapsed = time.monotonic() - start
+
+    assert failures == 0
+    assert elapsed < 0.2 * 3
+    assert sorted(record['index'] for record in records) == list(range(10))
+    assert all(record['result'] == {'ref': record['ref']} for record in records)
+
+def test_run_batch_respects_limits():
+    readers = FakeReaders(delay=0.05)
+    entries = [('google', f'https://docs.google.com/document/d/{i}/edit') for i in range(6)]
+    entries += [('jira', f'PROJ-{i}') for i in range(6)]
+
+    run_batch(entries, readers, workers=3, source_limits={'google': 1}, write=lambda record: None)
+
+    assert readers.peak['google'] == 1
+    assert sum(readers.peak.values()) <= 4
+    assert readers.peak['jira'] <= 3
+
+def test_concurrent_google_reads_never_share_an_http_client():
+    from unittest.mock import MagicMock
+    from src.batch import DEFAULT_SOURCE_LIMITS
+    from src.google_doc_reader import _ScheduledHttp
+    created = []
+
+    class ExclusiveHttp:
+        # httplib2 clients are not thread-safe, so two requests must never be on one at the same time
+        def __init__(self):
+            self.lock = threading.Lock()
+            created.append(self)
+
+        def request(self, uri, **kwargs):
+            if not self.lock.acquire(blocking=False):
+                raise AssertionError("HTTP client used by two reads at once")
+            try:
+                time.sleep(0.05)
+                return {'status': '200'}, uri.encode()
+            finally:
+                self.lock.release()
+
+    scheduler = MagicMock()
+    scheduler.send.side_effect = lambda source, send, **kwargs: send()
+    http = _ScheduledHttp(ExclusiveHttp, scheduler, 'google-docs', 'oauth')
+    entries = [('google', f'https://docs.google.com/document/d/{i}/edit') for i in range(12)]
+
+    failures = run_batch(entries, None, write=lambda record: None, read=lambda source, ref: http.request(ref))
+
+    assert failures == 0
+    assert 1 < len(created) <= DEFAULT_SOURCE_LIMITS['google']
+
+def test_run_batch_reports_errors():
+    records = []
+    failures = run_batch([('jira', 'PROJ-1'), ('jira', 'BROKEN-1')], FakeReaders(delay=0), write=records.append)
+
+    assert failures == 1
+    errors = [record for record in records if 'error' in record]
+    assert errors == [{'index': 1, 'source': 'jira', 'ref': 'BROKEN-1', 'error': 'Issue does not exist'}]
+
+def test_run_batch_reads_at_batch_priority():
+    from src.rate_limit import BATCH, current_priority
+    priorities = []
+
+    def read(source, ref):
+        priorities.append(current_priority())
+        return {}
+
+    run_batch([('jira', 'PROJ-1'), ('jira', 'PROJ-2')], None, read=read, write=lambda record: None)
+    assert priorities == [BATCH, BATCH]
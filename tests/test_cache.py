@@ -0,0 +1,78 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import json
+import pytest
+from unittest.mock import MagicMock
+from src.cache import ResponseCache
+
+def expire(cache, key, seconds):
+    path = cache._path(key)
+    with open(path, 'r') as f:
+        entry = json.load(f)
+    entry['stored_at'] -= seconds
+    with open(path, 'w') as f:
+        json.dump(entry, f)
+
+def test_fresh_entries_skip_the_backend(tmp_path):
+    cache = ResponseCache(str(tmp_path), ttl=60)
+    fetch = MagicMock(return_value=({'title': 'Doc'}, 'rev1'))
+
+    assert cache.fetch('gdoc:abc', fetch) == {'title': 'Doc'}
+    assert cache.fetch('gdoc:abc', fetch) == {'title': 'Doc'}
+    assert ResponseCache(str(tmp_path), ttl=60).fetch('gdoc:abc', fetch) == {'title': 'Doc'}
+    fetch.assert_called_once_with()
+
+def test_stale_entries_are_revalidated(tmp_path):
+    cache = ResponseCache(str(tmp_path), ttl=60)
+    cache.fetch('jira:PROJ-1', lambda: ({'key': 'PROJ-1'}, 'v1'))
+    expire(cache, 'jira:PROJ-1', 120)
+
+    fetch = MagicMock(return_value=({'key': 'PROJ-1', 'summary': 'new'}, 'v2'))
+    revalidate = MagicMock(return_value=True)
+    assert cache.fetch('jira:PROJ-1', fetch, revalidate) == {'key': 'PROJ-1'}
+    revalidate.assert_called_once_with('v1')
+    fetch.assert_not_called()
+
+    expire(cache, 'jira:PROJ-1', 120)
+    revalidate.return_value = False
+    assert cache.fetch('jira:PROJ-1', fetch, revalidate) == {'key': 'PROJ-1', 'summary': 'new'}
+    assert cache.get('jira:PROJ-1')['validator'] == 'v2'
+
+def test_max_stale_serves_entries_when_backend_fails(tmp_path):
+    cache = ResponseCache(str(tmp_path), ttl=60, max_stale=300)
+    cache.fetch('jira:PROJ-1', lambda: ({'key': 'PROJ-1'}, 'v1'))
+    expire(cache, 'jira:PROJ-1', 120)
+
+    revalidate = MagicMock(side_effect=ConnectionError("offline"))
+    assert cache.fetch('jira:PROJ-1', MagicMock(), revalidate) == {'key': 'PROJ-1'}
+
+    expire(cache, 'jira:PROJ-1', 600)
+    with pytest.raises(ConnectionError):
+        cache.fetch('jira:PROJ-1', MagicMock(), revalidate)
+
+def test_should_store(tmp_path):
+    cache = ResponseCache(str(tmp_path))
+    fetch = MagicMock(return_value=({'error': 'Page not found'}, None))
+
+    cache.fetch('confluence:1', fetch, should_store=lambda result: 'error' not in result)
+    cache.fetch('confluence:1', fetch, should_store=lambda result: 'error' not in result)
+
+    assert fetch.call_count == 2
+    assert cache.get('confluence:1') is None
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = ResponseCache(str(tmp_path), max_bytes=1000)
+    for i in range(3):
+        cache.set(f'jira:PROJ-{i}', 'x' * 200)
+        os.utime(cache._path(f'jira:PROJ-{i}'), (i, i))
+    cache.get('jira:PROJ-0')
+
+    cache.set('jira:PROJ-3', 'x' * 200)
+    cache.set('jira:PROJ-4', 'x' * 200)
+
+    assert cache.get('jira:PROJ-0') is not None
+    assert cache.get('jira:PROJ-1') is None
+    assert cache.get('jira:PROJ-4') is not None
+    assert sum(os.path.getsize(os.path.join(tmp_path, name)) for name in os.listdir(tmp_path)) <= 1000
@@ -0,0 +1,90 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import json
+import pickle
+import stat
+import datetime
+import threading
+import pytest
+from unittest.mock import patch
+from google.oauth2.credentials import Credentials
+from src.credentials import CredentialManager
+
+def make_credentials(token, minutes):
+    expiry = datetime.datetime.utcnow() + datetime.timedelta(minutes=minutes)
+    return Credentials(token, refresh_token='refresh', token_uri='https://oauth2.example.com/token',
+                       client_id='id', client_secret='secret', expiry=expiry)
+
+@pytest.fixture
+def refreshes():
+    # Each refresh hands out a new token valid for an hour
+    calls = []
+
+    def refresh(self, request):
+        calls.append(self.token)
+        self.token = f'refreshed-{len(calls)}'
+        self.expiry = datetime.datetime.utcnow() + datetime.timedelta(hours=1)
+    with patch.object(Credentials, 'refresh', refresh):
+        yield calls
+
+def manager(tmp_path, **kwargs):
+    return CredentialManager(str(tmp_path / 'token.json'), **kwargs)
+
+def test_store_writes_a_private_json_token(tmp_path):
+    manager(tmp_path).store(make_credentials('abc', 60))
+    path = tmp_path / 'token.json'
+    assert json.loads(path.read_text())['token'] == 'abc'
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+    assert sorted(os.listdir(tmp_path)) == ['token.json', 'token.json.lock']
+    assert manager(tmp_path).load().token == 'abc'
+
+def test_expired_token_is_refreshed_on_load(tmp_path, refreshes):
+    manager(tmp_path).store(make_credentials('old', -5))
+    assert manager(tmp_path).load().token == 'refreshed-1'
+    assert refreshes == ['old']
+    assert json.loads((tmp_path / 'token.json').read_text())['token'] == 'refreshed-1'
+
+def test_refresh_adopts_a_token_another_process_refreshed(tmp_path, refreshes):
+    first, second = manager(tmp_path), manager(tmp_path)
+    first.store(make_credentials('old', 5))
+    credentials = second.load()
+
+    first.refresh()
+    second.refresh()
+
+    assert refreshes == ['old']
+    assert credentials.token == 'refreshed-1' and credentials.valid
+
+def test_legacy_pickle_is_migrated(tmp_path):
+    legacy = tmp_path / 'token.pickle'
+    legacy.write_bytes(pickle.dumps(make_credentials('pickled', 60)))
+    assert manager(tmp_path, legacy_path=str(legacy)).load().token == 'pickled'
+    assert not legacy.exists()
+    assert json.loads((tmp_path / 'token.json').read_text())['token'] == 'pickled'
+
+def test_concurrent_loads_migrate_the_pickle_once(tmp_path):
+    legacy = tmp_path / 'token.pickle'
+    legacy.write_bytes(pickle.dumps(make_credentials('pickled', 60)))
+    managers = [manager(tmp_path, legacy_path=str(legacy)) for _ in range(8)]
+    tokens = []
+    threads = [threading.Thread(target=lambda m=m: tokens.append(m.load().token)) for m in managers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    assert tokens == ['pickled'] * 8
+    assert not legacy.exists()
+
+def test_token_is_refreshed_in_the_background_before_it_expires(tmp_path, refreshes):
+    credential_manager = manager(tmp_path)
+    credentials = make_credentials('soon', 5)
+    credential_manager.store(credentials)
+    refreshed = threading.Event()
+    with patch.object(CredentialManager, '_write', side_effect=lambda creds: refreshed.set()):
+        credential_manager.start()
+        assert refreshed.wait(5)
+    credential_manager.close()
+    assert refreshes == ['soon']
+    assert credentials.token == 'refreshed-1'
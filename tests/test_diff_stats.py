@@ -0,0 +1,96 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.diff_stats import diff_stats, iter_diff_stats, iter_lines
+
+DIFF = b'''diff --git a/src/app.py b/src/app.py
+index 83db48f..bf269f4 100644
+--- a/src/app.py
++++ b/src/app.py
+@@ -1,3 +1,4 @@
+ import os
+--- not a header, a removed line
++++ not a header, an added line
++diff --git a/x b/x
+ def main():
+@@ -20 +21 @@ def main():
+-    return 1
++    return 0
+\\ No newline at end of file
+diff --git a/docs/new file.md b/docs/new file.md
+new file mode 100644
+index 0000000..e69de29
+--- /dev/null
++++ b/docs/new file.md
+@@ -0,0 +1,2 @@
++# Title
++
+diff --git a/old.txt b/old.txt
+deleted file mode 100644
+index e69de29..0000000
+--- a/old.txt
++++ /dev/null
+@@ -1 +0,0 @@
+-gone
+diff --git a/lib/a.py b/lib/b.py
+similarity index 90%
+rename from lib/a.py
+rename to lib/b.py
+index 1111111..2222222 100644
+--- a/lib/a.py
++++ b/lib/b.py
+@@ -1,2 +1,2 @@
+-x = 1
++x = 2
+ y = 1
+diff --git a/logo.png b/logo.png
+index 3333333..4444444 100644
+Binary files a/logo.png and b/logo.png differ
+diff --git a/run.sh b/run.sh
+old mode 100644
+new mode 100755
+diff --git "a/caf\\303\\251.txt" "b/caf\\303\\251.txt"
+index 5555555..6666666 100644
+--- "a/caf\\303\\251.txt"
++++ "b/caf\\303\\251.txt"
+@@ -1 +1 @@
+-old
++new
+'''
+
+EXPECTED = [
+    {'file': 'src/app.py', 'status': 'modified', 'additions': 3, 'deletions': 2, 'changes': 5},
+    {'file': 'docs/new file.md', 'status': 'added', 'additions': 2, 'deletions': 0, 'changes': 2},
+    {'file': 'old.txt', 'status': 'removed', 'additions': 0, 'deletions': 1, 'changes': 1},
+    {'file': 'lib/b.py', 'status': 'renamed', 'additions': 1, 'deletions': 1, 'changes': 2, 'previous_file': 'lib/a.py'},
+    {'file': 'logo.png', 'status': 'modified', 'additions': 0, 'deletions': 0, 'changes': 0, 'binary': True},
+    {'file': 'run.sh', 'status': 'changed', 'additions': 0, 'deletions': 0, 'changes': 0},
+    {'file': 'café.txt', 'status': 'modified', 'additions': 1, 'deletions': 1, 'changes': 2},
+]
+
+def test_git_diff_stats():
+    result = diff_stats([DIFF])
+    assert result['files'] == EXPECTED
+    assert result['totals'] == {'files': 7, 'additions': 7, 'deletions': 5, 'changes': 12}
+
+def test_chunk_boundaries_do_not_matter():
+    one_byte_chunks = (DIFF[i:i + 1] for i in range(len(DIFF)))
+    assert diff_stats(one_byte_chunks)['files'] == EXPECTED
+    assert list(iter_lines([b'a\nb', b'', b'c\n', b'd'])) == [b'a', b'bc', b'd']
+
+def test_plain_unified_diff():
+    diff = b'''--- a.txt\t2024-01-01
++++ a.txt\t2024-01-02
+@@ -1,2 +1,2 @@
+-a
++b
+ c
+--- b.txt
++++ b.txt
+@@ -1 +1,2 @@
+ x
++y
+'''
+    assert [(record['file'], record['additions'], record['deletions'])
+            for record in iter_diff_stats(iter_lines([diff]))] == [('a.txt', 1, 1), ('b.txt', 1, 0)]
@@ -0,0 +1,155 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import re
+import json
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+import pytest
+from src.cache import ResponseCache
+from src.github_graphql_reader import GitHubGraphQLReader, graphql_url_for
+from src.github_pr_reader import PatchFilter
+from src.rate_limit import RequestScheduler
+
+def make_pr(number, issue_comments, review_comments, files):
+    # Review comments are spread over three reviews, so ids interleave across reviews
+    reviews = [[{'databaseId': 1000 + i, 'body': f'review {i}'} for i in range(review_comments) if i % 3 == r]
+               for r in range(3)]
+    return {
+        'id': f'PR_{number}', 'number': number, 'title': f'PR {number}', 'body': '' if number == 2 else f'Body {number}',
+        'changedFiles': files, 'updatedAt': '2024-01-01T00:00:00Z',
+        'issue_comments': [{'body': f'comment {i}'} for i in range(issue_comments)],
+        'reviews': [{'id': f'R_{number}_{r}', 'comments': comments} for r, comments in enumerate(reviews) if comments],
+        'files': [{'filename': f'src/file_{i}.py', 'patch': f'@@ -1 +1 @@\n-old {i}\n+new {i}'} for i in range(files)],
+    }
+
+PRS = {1: make_pr(1, 150, 350, 230), 2: make_pr(2, 3, 0, 1), 3: make_pr(3, 0, 5, 0)}
+
+def page(nodes, after):
+    start = int(after or 0)
+    return {'totalCount': len(nodes), 'pageInfo': {'hasNextPage': start + 100 < len(nodes), 'endCursor': str(start + 100)},
+            'nodes': nodes[start:start + 100]}
+
+def review_page(pr, after):
+    result = page(pr['reviews'], after)
+    result['nodes'] = [{'id': review['id'], 'comments': page(review['comments'], None)} for review in result['nodes']]
+    return result
+
+class StubGitHub(BaseHTTPRequestHandler):
+    """Answers the queries GitHubGraphQLReader sends, and the REST files listing."""
+
+    requests = Counter()
+    queries = []
+
+    def log_message(self, *args):
+        pass
+
+    def reply(self, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        StubGitHub.requests['graphql'] += 1
+        query = json.loads(self.rfile.read(int(self.headers['Content-Length'])))['query']
+        StubGitHub.queries.append(query)
+        data, errors = {}, []
+        for alias, owner, name, number in re.findall(
+                r'(p\d+): repository\(owner: "(.*?)", name: "(.*?)"\) \{ pullRequest\(number: (\d+)\)', query):
+            pr = PRS.get(int(number))
+            if pr is None:
+                data[alias] = {'pullRequest': None}
+                errors.append({'type': 'NOT_FOUND', 'path': [alias, 'pullRequest'],
+                               'message': f'Could not resolve to a PullRequest with the number of {number}.'})
+                continue
+            data[alias] = {'pullRequest': dict({key: pr[key] for key in ('id', 'number', 'title', 'body', 'changedFiles', 'updatedAt')},
+                                               comments=page(pr['issue_comments'], None), reviews=review_page(pr, None))}
+        for alias, node_id, node_type, connection, after in re.findall(
+                r'(f\d+): node\(id: "(.*?)"\) \{ \.\.\. on (\w+) \{ (\w+)\(first: 100, after: "(.*?)"\)', query):
+            if node_type == 'PullRequestReview':
+                number, review = map(int, node_id.split('_')[1:])
+                data[alias] = {'comments': page(PRS[number]['reviews'][review]['comments'], after)}
+            elif connection == 'reviews':
+                data[alias] = {'reviews': review_page(PRS[int(node_id[3:])], after)}
+            else:
+                data[alias] = {'comments': page(PRS[int(node_id[3:])]['issue_comments'], after)}
+        self.reply({'data': data, 'errors': errors} if errors else {'data': data})
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        number = int(url.path.split('/')[-2])
+        StubGitHub.requests['files'] += 1
+        page_number = int(parse_qs(url.query)['page'][0])
+        self.reply(PRS[number]['files'][(page_number - 1) * 100:page_number * 100])
+
+@pytest.fixture
+def stub():
+    StubGitHub.requests.clear()
+    StubGitHub.queries.clear()
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubGitHub)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_address[1]}'
+    server.shutdown()
+    server.server_close()
+
+def reader(url, **kwargs):
+    return GitHubGraphQLReader(api_url=url, scheduler=RequestScheduler(rates={'github': (1000, 1000),
+                                                                              'github-graphql': (1000, 1000)}), **kwargs)
+
+def expected(number, fields=('title', 'number', 'description', 'updated_at', 'comments', 'file_changes')):
+    pr = PRS[number]
+    info = {'title': pr['title'], 'number': number, 'description': pr['body'] or None,
+            'updated_at': '2024-01-01T00:00:00+00:00',
+            'comments': [comment['body'] for comment in sorted((c for review in pr['reviews'] for c in review['comments']),
+                                                               key=lambda c: c['databaseId'])],
+            'issue_comments': [comment['body'] for comment in pr['issue_comments']],
+            'file_changes': [{'file': file['filename'], 'patch': file['patch']} for file in pr['files']]}
+    return {field: info[field] for field in fields}
+
+def test_graphql_url_for():
+    assert graphql_url_for('https://api.github.com') == 'https://api.github.com/graphql'
+    assert graphql_url_for('https://github.example.com/api/v3/') == 'https://github.example.com/api/graphql'
+
+def test_one_pr_is_one_query_plus_its_file_pages(stub):
+    assert reader(stub).read_pr_by_url('https://github.com/owner/repo/pull/2') == expected(2)
+    assert StubGitHub.requests == {'graphql': 1, 'files': 1}
+
+def test_batched_prs_share_queries_and_page_by_cursor(stub):
+    fields = ('title', 'number', 'description', 'comments', 'issue_comments', 'file_changes')
+    urls = [f'https://github.com/owner/repo/pull/{number}' for number in (1, 2, 3)]
+
+    results = reader(stub).read_prs_by_url(urls, fields=fields)
+
+    assert results == [expected(number, fields) for number in (1, 2, 3)]
+    # One query for the three PRs, then one round for the second pages of PR 1's issue comments and
+    # of its three reviews; the 230 files of PR 1 and the file of PR 2 are 4 REST pages
+    assert StubGitHub.requests == {'graphql': 2, 'files': 4}
+    assert len(StubGitHub.queries[1].split('node(id:')) == 5
+
+def test_concurrent_reads_are_batched(stub):
+    graphql = reader(stub, batch_window=0.5, batch_size=3)
+    urls = [f'https://github.com/owner/repo/pull/{number}' for number in (2, 3, 404)]
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        futures = [pool.submit(graphql.read_pr_by_url, url, ('title', 'description')) for url in urls]
+        assert futures[0].result() == {'title': 'PR 2', 'description': None}
+        assert futures[1].result() == {'title': 'PR 3', 'description': 'Body 3'}
+        with pytest.raises(RuntimeError, match='Could not resolve'):
+            futures[2].result()
+    assert StubGitHub.requests == {'graphql': 1}
+
+def test_cached_pr_is_revalidated_by_updated_at(stub, tmp_path):
+    graphql = reader(stub, cache=ResponseCache(str(tmp_path), ttl=0))
+    url = 'https://github.com/owner/repo/pull/3'
+    patch_filter = PatchFilter(max_bytes=10)
+    assert graphql.read_pr_by_url(url, patch_filter=patch_filter) == expected(3)
+    assert graphql.read_pr_by_url(url, patch_filter=patch_filter) == expected(3)
+    assert StubGitHub.requests == {'graphql': 2}
+    assert 'updatedAt } } }' in StubGitHub.queries[1]
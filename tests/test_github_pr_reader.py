@@ -3,8 +3,16 @@ import os
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 import pytest
-from unittest.mock import patch, MagicMock
-from src.github_pr_reader import GitHubPRReader
+from datetime import datetime, timezone
+from unittest.mock import patch, MagicMock, ANY
+from src.github_pr_reader import GitHubPRReader, PatchFilter
+from src.cache import ResponseCache
+
+@pytest.fixture(autouse=True)
+def index_home(tmp_path, monkeypatch):
+    # Keep the PR title index out of the real home directory
+    monkeypatch.setenv('HOME', str(tmp_path))
+    return tmp_path
 
 @pytest.fixture
 def mock_github():
@@ -27,6 +35,7 @@ def test_read_pr_by_title(mock_github, mock_getenv):
     mock_pr.title = 'Test PR'
     mock_pr.number = 1
     mock_pr.body = 'PR description'
+    mock_pr.updated_at = datetime(2024, 1, 1, tzinfo=timezone.utc)
     mock_pr.get_comments.return_value = [MagicMock(body='Comment 1')]
     mock_pr.get_files.return_value = [MagicMock(filename='file1.py', patch='@@ -1,3 +1,4 @@\n Line1\n+Line2\n Line3\n Line4')]
     mock_repo.get_pulls.return_value = [mock_pr]
@@ -39,6 +48,7 @@ def test_read_pr_by_title(mock_github, mock_getenv):
         'title': 'Test PR',
         'number': 1,
         'description': 'PR description',
+        'updated_at': '2024-01-01T00:00:00+00:00',
         'comments': ['Comment 1'],
         'file_changes': [{'file': 'file1.py', 'patch': '@@ -1,3 +1,4 @@\n Line1\n+Line2\n Line3\n Line4'}]
     }
@@ -50,6 +60,7 @@ def test_read_pr_by_url(mock_github, mock_getenv):
     mock_pr.title = 'Test PR'
     mock_pr.number = 1
     mock_pr.body = 'PR description'
+    mock_pr.updated_at = datetime(2024, 1, 1, tzinfo=timezone.utc)
     mock_pr.get_comments.return_value = [MagicMock(body='Comment 1')]
     mock_pr.get_files.return_value = [MagicMock(filename='file1.py', patch='@@ -1,3 +1,4 @@\n Line1\n+Line2\n Line3\n Line4')]
     mock_repo.get_pull.return_value = mock_pr
@@ -62,7 +73,349 @@ def test_read_pr_by_url(mock_github, mock_getenv):
         'title': 'Test PR',
         'number': 1,
         'description': 'PR description',
+        'updated_at': '2024-01-01T00:00:00+00:00',
         'comments': ['Comment 1'],
         'file_changes': [{'file': 'file1.py', 'patch': '@@ -1,3 +1,4 @@\n Line1\n+Line2\n Line3\n Line4'}]
     }
-    assert result == expected_output
\ No newline at end of file
+    assert result == expected_output
+def test_read_pr_by_title_uses_index(mock_github, mock_getenv):
+    mock_repo = MagicMock()
+    mock_pr = MagicMock()
+    mock_pr.title = 'Test PR'
+    mock_pr.number = 7
+    mock_pr.body = 'PR description'
+    mock_pr.updated_at = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    mock_pr.get_comments.return_value = []
+    mock_pr.get_files.return_value = []
+    mock_repo.get_pulls.return_value = [mock_pr]
+    mock_repo.get_pull.return_value = mock_pr
+    mock_github.return_value.get_repo.return_value = mock_repo
+
+    GitHubPRReader().read_pr_by_title('Test PR')
+    mock_repo.get_pulls.reset_mock()
+
+    result = GitHubPRReader().read_pr_by_title('test', match='prefix')
+
+    assert result['number'] == 7
+    mock_repo.get_pull.assert_called_once_with(7)
+    mock_repo.get_pulls.assert_not_called()
+
+def test_read_pr_by_title_not_found(mock_github, mock_getenv):
+    mock_repo = MagicMock()
+    mock_repo.get_pulls.return_value = []
+    mock_github.return_value.get_repo.return_value = mock_repo
+
+    with pytest.raises(ValueError, match="No pull request found with title: Missing"):
+        GitHubPRReader().read_pr_by_title('Missing')
+
+def test_read_pr_fields_skip_listings(mock_github, mock_getenv):
+    mock_pr = MagicMock()
+    mock_pr.title = 'Test PR'
+    mock_pr.body = 'PR description'
+    mock_github.return_value.get_repo.return_value.get_pull.return_value = mock_pr
+
+    reader = GitHubPRReader()
+    result = reader.read_pr_by_url('https://github.com/fake_owner/fake_repo/pull/1', fields=('title', 'description'))
+
+    assert result == {'title': 'Test PR', 'description': 'PR description'}
+    mock_pr.get_comments.assert_not_called()
+    mock_pr.get_files.assert_not_called()
+
+def test_read_pr_fetches_all_pages_concurrently(mock_github, mock_getenv):
+    mock_pr = MagicMock()
+    mock_pr.review_comments = 250
+    mock_pr.comments = 0
+    mock_pr.changed_files = 101
+    mock_pr.get_comments.return_value.get_page.side_effect = lambda page: [MagicMock(body=f'Comment {page}')]
+    mock_pr.get_files.return_value.get_page.side_effect = lambda page: [MagicMock(filename=f'file{page}.py', patch='')]
+    mock_github.return_value.get_repo.return_value.get_pull.return_value = mock_pr
+
+    reader = GitHubPRReader()
+    result = reader.read_pr_by_url('https://github.com/fake_owner/fake_repo/pull/1',
+                                   fields=('comments', 'issue_comments', 'file_changes'))
+
+    mock_github.assert_called_once_with(auth=ANY, per_page=100, pool_size=None, retry=ANY)
+    assert result['comments'] == ['Comment 0', 'Comment 1', 'Comment 2']
+    assert result['issue_comments'] == []
+    assert [change['file'] for change in result['file_changes']] == ['file0.py', 'file1.py']
+    mock_pr.get_issue_comments.return_value.get_page.assert_not_called()
+
+def test_files_listing_stops_at_its_3000_file_cap(mock_github, mock_getenv):
+    mock_pr = MagicMock(changed_files=5000)
+    mock_pr.get_files.return_value.get_page.return_value = []
+    mock_github.return_value.get_repo.return_value.get_pull.return_value = mock_pr
+
+    reader = GitHubPRReader()
+    reader.read_pr_by_url('https://github.com/fake_owner/fake_repo/pull/1', fields=('file_changes',))
+    list(reader.iter_file_changes(mock_pr))
+
+    # 30 pages of 100 for the read, and 30 more for the stream
+    assert mock_pr.get_files.return_value.get_page.call_count == 60
+
+def test_read_pr_unknown_field(mock_github, mock_getenv):
+    reader = GitHubPRReader()
+    with pytest.raises(ValueError, match="Unknown PR fields: reviews"):
+        reader.read_pr_by_url('https://github.com/fake_owner/fake_repo/pull/1', fields=('title', 'reviews'))
+
+def test_patch_filter():
+    patch_filter = PatchFilter(max_bytes=5, skip_patterns=['vendor/*'])
+
+    assert patch_filter.apply('src/a.py', '+abc') == {'file': 'src/a.py', 'patch': '+abc'}
+    assert patch_filter.apply('src/b.py', '+abcdefgh') == {'file': 'src/b.py', 'patch': '+abcd', 'patch_truncated': 9}
+    assert patch_filter.apply('vendor/lib.js', '+x') == {'file': 'vendor/lib.js', 'patch': None, 'patch_skipped': 'pattern'}
+    assert PatchFilter(max_bytes=5, oversized='skip').apply('src/b.py', '+abcdefgh') == \
+        {'file': 'src/b.py', 'patch': None, 'patch_skipped': 'size'}
+
+def test_stream_pr_yields_file_changes_lazily(mock_github, mock_getenv):
+    mock_pr = MagicMock()
+    mock_pr.title = 'Test PR'
+    mock_pr.number = 1
+    mock_pr.body = 'PR description'
+    mock_pr.updated_at = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    mock_pr.get_comments.return_value = [MagicMock(body='Comment 1')]
+    mock_pr.changed_files = 250
+    listing = mock_pr.get_files.return_value
+    listing.get_page.side_effect = lambda page: [MagicMock(filename=f'file{page}.py', patch='+' * 10)]
+    mock_github.return_value.get_repo.return_value.get_pull.return_value = mock_pr
+
+    reader = GitHubPRReader()
+    result = reader.stream_pr_by_url('https://github.com/fake_owner/fake_repo/pull/1',
+                                     patch_filter=PatchFilter(max_bytes=4))
+
+    assert result['comments'] == ['Comment 1']
+    listing.get_page.assert_not_called()
+    changes = result['file_changes']
+    assert next(changes) == {'file': 'file0.py', 'patch': '++++', 'patch_truncated': 10}
+    assert [change['file'] for change in changes] == ['file1.py', 'file2.py']
+    assert listing.get_page.call_count == 3
+    listing.__iter__.assert_not_called()
+
+def test_read_pr_by_url_revalidates_with_etag(mock_github, mock_getenv, tmp_path):
+    mock_pr = MagicMock()
+    mock_pr.title = 'Test PR'
+    mock_pr.number = 1
+    mock_pr.body = 'PR description'
+    mock_pr.etag = 'W/"abc"'
+    mock_pr.updated_at = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    mock_pr.get_comments.return_value = []
+    mock_pr.get_files.return_value = []
+    mock_repo = mock_github.return_value.get_repo.return_value
+    mock_repo.get_pull.return_value = mock_pr
+    mock_github.return_value.requester.requestJson.return_value = (304, {}, '')
+
+    reader = GitHubPRReader(cache=ResponseCache(str(tmp_path), ttl=0))
+    first = reader.read_pr_by_url('https://github.com/fake_owner/fake_repo/pull/1')
+    second = reader.read_pr_by_url('https://github.com/fake_owner/fake_repo/pull/1')
+
+    assert first == second
+    mock_repo.get_pull.assert_called_once_with(1)
+    mock_github.return_value.requester.requestJson.assert_called_once_with(
+        'GET', '/repos/fake_owner/fake_repo/pulls/1', headers={'If-None-Match': 'W/"abc"'}
+    )
+
+def make_sync_pr(updated_at, head_sha, comments=(), files=()):
+    pr = MagicMock()
+    pr.title = 'Test PR'
+    pr.number = 1
+    pr.body = 'PR description'
+    pr.etag = f'"{head_sha}-{len(comments)}"'
+    pr.updated_at = updated_at
+    pr.head.sha = head_sha
+    pr.review_comments = len(comments)
+    pr.get_comments.return_value = [
+        MagicMock(id=comment_id, body=f'Comment {comment_id}', created_at=created_at) for comment_id, created_at in comments
+    ]
+    pr.changed_files = len(files)
+    pr.get_files.return_value = [MagicMock(filename=name, sha=sha, patch=f'+{sha}') for name, sha in files]
+    return pr
+
+def test_sync_pr_reports_only_changes(mock_github, mock_getenv):
+    url = 'https://github.com/fake_owner/fake_repo/pull/1'
+    day1 = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    day2 = datetime(2024, 1, 2, tzinfo=timezone.utc)
+    mock_repo = mock_github.return_value.get_repo.return_value
+    mock_repo.get_pull.return_value = make_sync_pr(day1, 'aaa', comments=[(10, day1)],
+                                                   files=[('a.py', '1'), ('b.py', '1')])
+
+    reader = GitHubPRReader()
+    changes, watermark = reader.sync_pr(url)
+    assert changes['new_comments'] == [{'id': 10, 'body': 'Comment 10'}]
+    assert [change['file'] for change in changes['changed_files']] == ['a.py', 'b.py']
+
+    # Unchanged: a single conditional request answered with 304
+    mock_github.return_value.requester.requestJson.return_value = (304, {}, None)
+    mock_repo.get_pull.reset_mock()
+    assert reader.sync_pr(url, watermark) == (None, watermark)
+    mock_repo.get_pull.assert_not_called()
+
+    mock_github.return_value.requester.requestJson.return_value = (200, {}, '{}')
+    pr = make_sync_pr(day2, 'bbb', comments=[(10, day1), (11, day2)], files=[('a.py', '2')])
+    mock_repo.get_pull.return_value = pr
+    changes, watermark = reader.sync_pr(url, watermark)
+
+    assert changes == {
+        'number': 1,
+        'title': 'Test PR',
+        'updated_at': day2.isoformat(),
+        'new_comments': [{'id': 11, 'body': 'Comment 11'}],
+        'changed_files': [{'file': 'a.py', 'patch': '+2'}],
+        'removed_files': ['b.py'],
+    }
+    pr.get_comments.assert_called_with(since=day1)
+    assert watermark['files'] == {'a.py': '2'}
+    assert watermark['last_comments_id'] == 11
+
+def test_sync_pr_since_on_first_sync(mock_github, mock_getenv):
+    day1 = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    mock_github.return_value.get_repo.return_value.get_pull.return_value = make_sync_pr(
+        day1, 'aaa', comments=[(10, day1)], files=[('a.py', '1')])
+
+    reader = GitHubPRReader()
+    changes, watermark = reader.sync_pr('https://github.com/fake_owner/fake_repo/pull/1',
+                                        since=datetime(2024, 6, 1, tzinfo=timezone.utc))
+
+    assert changes is None
+    assert watermark['files'] == {'a.py': '1'}
+    assert watermark['last_comments_id'] == 0
+
+def test_first_sync_of_a_pr_without_comments_reports_its_description(mock_github, mock_getenv):
+    day1 = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    mock_github.return_value.get_repo.return_value.get_pull.return_value = make_sync_pr(day1, 'aaa')
+    reader = GitHubPRReader()
+    url = 'https://github.com/fake_owner/fake_repo/pull/1'
+
+    changes, watermark = reader.sync_pr(url)
+    assert changes == {'number': 1, 'title': 'Test PR', 'updated_at': day1.isoformat(), 'description': 'PR description'}
+    # Not when the PR was last updated before `since`
+    assert reader.sync_pr(url, since=datetime(2024, 6, 1, tzinfo=timezone.utc))[0] is None
+
+def test_sync_without_files_does_not_hide_them_from_a_later_sync(mock_github, mock_getenv):
+    day1 = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    day2 = datetime(2024, 1, 2, tzinfo=timezone.utc)
+    mock_repo = mock_github.return_value.get_repo.return_value
+    mock_repo.get_pull.return_value = make_sync_pr(day1, 'aaa', files=[('a.py', '1')])
+    reader = GitHubPRReader()
+    url = 'https://github.com/fake_owner/fake_repo/pull/1'
+    _, watermark = reader.sync_pr(url)
+
+    pr = make_sync_pr(day2, 'bbb', files=[('a.py', '2')])
+    pr.body = 'Edited'
+    mock_repo.get_pull.return_value = pr
+    _, watermark = reader.sync_pr(url, watermark, fields=('title', 'number', 'comments'))
+    assert watermark['head_sha'] == 'aaa' and watermark['files'] == {'a.py': '1'}
+
+    # A sync that looks at the files and description again sees what changed since they were last examined
+    mock_github.return_value.requester.requestJson.return_value = (304, {}, None)
+    changes, watermark = reader.sync_pr(url, watermark)
+    assert changes['changed_files'] == [{'file': 'a.py', 'patch': '+2'}]
+    assert changes['description'] == 'Edited'
+    assert watermark['head_sha'] == 'bbb'
+
+def test_read_pr_diff_stats_from_files_listing(mock_github, mock_getenv):
+    mock_pr = MagicMock(title='Test PR', number=1, changed_files=2, additions=5, deletions=1)
+    mock_pr.get_files.return_value = [
+        MagicMock(filename='a.py', status='modified', additions=4, deletions=1, changes=5, previous_filename=None),
+        MagicMock(filename='c.py', status='renamed', additions=1, deletions=0, changes=1, previous_filename='b.py'),
+    ]
+    mock_github.return_value.get_repo.return_value.get_pull.return_value = mock_pr
+
+    result = GitHubPRReader().read_pr_diff_stats('https://github.com/fake_owner/fake_repo/pull/1')
+
+    assert result == {
+        'title': 'Test PR',
+        'number': 1,
+        'files': [
+            {'file': 'a.py', 'status': 'modified', 'additions': 4, 'deletions': 1, 'changes': 5},
+            {'file': 'c.py', 'status': 'renamed', 'additions': 1, 'deletions': 0, 'changes': 1, 'previous_file': 'b.py'},
+        ],
+        'totals': {'files': 2, 'additions': 5, 'deletions': 1, 'changes': 6},
+    }
+
+def test_read_pr_diff_stats_from_diff_falls_back_to_web_diff(mock_github, mock_getenv):
+    mock_pr = MagicMock(title='Big PR', number=7, diff_url='https://github.com/fake_owner/fake_repo/pull/7.diff')
+    mock_github.return_value.get_repo.return_value.get_pull.return_value = mock_pr
+    mock_github.return_value.requester.base_url = 'https://api.github.com'
+    too_large = MagicMock(status_code=406, headers={})
+    diff = MagicMock(status_code=200, headers={})
+    diff.__enter__.return_value = diff
+    diff.iter_content.return_value = [b'diff --git a/a.py b/a.py\n--- a/a.py\n+++ b/a.py\n@@ -1 +1,2 @@\n x\n', b'+y\n']
+    reader = GitHubPRReader()
+    reader._http = MagicMock()
+    reader._http.get.side_effect = [too_large, diff]
+
+    result = reader.read_pr_diff_stats('https://github.com/fake_owner/fake_repo/pull/7', source='diff')
+
+    assert result['files'] == [{'file': 'a.py', 'status': 'modified', 'additions': 1, 'deletions': 0, 'changes': 1}]
+    assert result['totals'] == {'files': 1, 'additions': 1, 'deletions': 0, 'changes': 1}
+    first, second = reader._http.get.call_args_list
+    assert first.args == ('https://api.github.com/repos/fake_owner/fake_repo/pulls/7',)
+    assert first.kwargs['headers'] == {'Accept': 'application/vnd.github.diff', 'Authorization': 'token fake_token'}
+    assert second.args == ('https://github.com/fake_owner/fake_repo/pull/7.diff',)
+
+def test_web_diff_fallback_that_fails_suggests_the_files_listing(mock_github, mock_getenv):
+    mock_pr = MagicMock(title='Big PR', number=7, diff_url='https://github.com/fake_owner/private/pull/7.diff')
+    mock_github.return_value.get_repo.return_value.get_pull.return_value = mock_pr
+    mock_github.return_value.requester.base_url = 'https://api.github.com'
+    reader = GitHubPRReader()
+    reader._http = MagicMock()
+    reader._http.get.side_effect = [MagicMock(status_code=406, headers={}), MagicMock(status_code=404, headers={})]
+
+    with pytest.raises(RuntimeError) as error:
+        reader.read_pr_diff_stats('https://github.com/fake_owner/private/pull/7', source='diff')
+    assert "size limit" in str(error.value) and "--diff-source files" in str(error.value)
+
+def search_result(repo, number, title, updated_day=1):
+    issue = MagicMock(title=title, html_url=f'https://github.com/{repo}/pull/{number}', state='open',
+                      updated_at=datetime(2024, 1, updated_day, tzinfo=timezone.utc))
+    issue.user.login = 'octocat'
+    issue.labels = [MagicMock()]
+    issue.labels[0].name = 'bug'
+    return issue
+
+def test_search_prs_queries_each_org_and_ranks_matches(mock_github, mock_getenv):
+    listings = {}
+
+    def search_issues(query):
+        org = query.rsplit('org:', 1)[1]
+        listing = MagicMock(totalCount=150 if org == 'org-a' else 1)
+        results = {
+            'org-a': [[search_result('org-a/api', 1, 'Fix login bug in the session', 3)],
+                      [search_result('org-a/web', 2, 'fix login bug', 1)]],
+            'org-b': [[search_result('org-b/app', 3, 'Fix login bug', 2)]],
+        }[org]
+        listing.get_page.side_effect = lambda page: results[page]
+        listings[org] = listing
+        return listing
+
+    mock_github.return_value.search_issues.side_effect = search_issues
+    reader = GitHubPRReader()
+    matches = reader.search_prs(title='Fix login bug', author='octocat', labels=['bug'], state='merged',
+                                orgs=['org-a', 'org-b'], limit=150)
+
+    queries = sorted(call.args[0] for call in mock_github.return_value.search_issues.call_args_list)
+    assert queries == [
+        'is:pr "Fix login bug" in:title author:octocat label:"bug" is:merged org:org-a',
+        'is:pr "Fix login bug" in:title author:octocat label:"bug" is:merged org:org-b',
+    ]
+    # 150 results need a second page in org-a only
+    assert listings['org-a'].get_page.call_count == 2
+    assert listings['org-b'].get_page.call_count == 1
+    assert [(match['repo'], match['number'], match['score']) for match in matches] == [
+        ('org-b/app', 3, 1.0), ('org-a/web', 2, 0.9), ('org-a/api', 1, 0.8)]
+    assert matches[0]['labels'] == ['bug'] and matches[0]['author'] == 'octocat'
+
+def test_search_prs_groups_repositories_and_dedupes(mock_github, mock_getenv):
+    listing = MagicMock(totalCount=1)
+    listing.get_page.return_value = [search_result('fake_owner/fake_repo', 5, 'Bump deps')]
+    mock_github.return_value.search_issues.return_value = listing
+    reader = GitHubPRReader()
+
+    matches = reader.search_prs(head='deps', repos=[f'fake_owner/repo{i}' for i in range(45)])
+
+    queries = [call.args[0] for call in mock_github.return_value.search_issues.call_args_list]
+    assert len(queries) == 2
+    assert queries[0].startswith('is:pr head:deps repo:fake_owner/repo0 repo:fake_owner/repo1 ')
+    assert queries[1] == 'is:pr head:deps ' + ' '.join(f'repo:fake_owner/repo{i}' for i in range(40, 45))
+    assert [match['number'] for match in matches] == [5]
+    with pytest.raises(ValueError):
+        reader.search_prs(state='draft')
@@ -3,11 +3,10 @@ import os
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 import pytest
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, MagicMock, ANY
 from src.google_doc_reader import GoogleDocReader
 from google.auth.exceptions import MalformedError
 import json  # Add this import
-import pickle
 
 @pytest.fixture
 def mock_credentials():
@@ -32,16 +31,6 @@ def mock_json_load():
         mock.return_value = {"type": "service_account"}
         yield mock
 
-@pytest.fixture
-def mock_pickle_load():
-    with patch('pickle.load') as mock:
-        yield mock
-
-@pytest.fixture
-def mock_pickle_dump():
-    with patch('pickle.dump') as mock:
-        yield mock
-
 def test_read_google_doc_success(mock_credentials, mock_build, mock_open, mock_json_load):
     mock_docs = MagicMock()
     mock_docs.documents().get().execute.return_value = {
@@ -106,15 +95,19 @@ def test_read_sheet_without_initialization(mock_credentials, mock_build, mock_op
     with pytest.raises(RuntimeError, match="Google Sheets service is not initialized. Check your credentials."):
         reader.read_sheet('https://docs.google.com/spreadsheets/d/abc123/edit')
 
-def test_oauth_flow(mock_credentials, mock_build, mock_open, mock_json_load, mock_pickle_load, mock_pickle_dump):
-    with patch('src.google_doc_reader.Flow.from_client_config') as mock_flow:
+def test_oauth_flow(mock_credentials, mock_build, mock_open, mock_json_load):
+    with patch('src.google_doc_reader.Flow.from_client_config') as mock_flow, \
+            patch('src.google_doc_reader.CredentialManager') as mock_manager:
         mock_flow.return_value.run_local_server.return_value = MagicMock()
         mock_json_load.return_value = {"installed": {"client_id": "test", "client_secret": "test"}}
-        mock_pickle_load.side_effect = pickle.UnpicklingError  # Simulate failed token load
+        mock_manager.return_value.load.return_value = None  # No stored token yet
         
         reader = GoogleDocReader()
         assert reader.docs_service is not None
         assert reader.sheets_service is not None
+        creds = mock_flow.return_value.run_local_server.return_value
+        mock_manager.return_value.store.assert_called_once_with(creds)
+        mock_manager.return_value.start.assert_called_once_with(creds)
 
 def test_file_not_found(mock_open):
     mock_open.side_effect = FileNotFoundError("File not found")
@@ -126,4 +119,264 @@ def test_json_decode_error(mock_open, mock_json_load):
     mock_json_load.side_effect = json.JSONDecodeError("Invalid JSON", "", 0)
     reader = GoogleDocReader()
     assert reader.docs_service is None
-    assert reader.sheets_service is None
\ No newline at end of file
+    assert reader.sheets_service is None
+def test_services_are_built_on_first_use(mock_credentials, mock_build, mock_open, mock_json_load):
+    reader = GoogleDocReader()
+    mock_credentials.assert_not_called()
+    mock_build.assert_not_called()
+
+    reader.read_document('https://docs.google.com/document/d/abc123/edit')
+    reader.read_document('https://docs.google.com/document/d/abc123/edit')
+
+    mock_build.assert_called_once_with('docs', 'v1', http=ANY, static_discovery=True, cache_discovery=False)
+    assert mock_build.call_args.kwargs['http'].credential == mock_credentials.return_value.service_account_email
+
+def test_read_sheet_range_on_named_tab(mock_credentials, mock_build, mock_open, mock_json_load):
+    mock_sheets = MagicMock()
+    mock_sheets.spreadsheets().values().get().execute.return_value = {'values': [[1, 2.5]]}
+    mock_build.return_value = mock_sheets
+
+    reader = GoogleDocReader()
+    result = reader.read_sheet('https://docs.google.com/spreadsheets/d/abc123/edit', cell_range='B2:C2',
+                               sheet="Q1 'final'", value_render_option='UNFORMATTED_VALUE')
+
+    assert result == [[1, 2.5]]
+    mock_sheets.spreadsheets().values().get.assert_called_with(
+        spreadsheetId='abc123', range="'Q1 ''final'''!B2:C2",
+        valueRenderOption='UNFORMATTED_VALUE', dateTimeRenderOption='FORMATTED_STRING')
+
+def test_read_sheet_ranges_uses_one_batch_get(mock_credentials, mock_build, mock_open, mock_json_load):
+    mock_sheets = MagicMock()
+    mock_sheets.spreadsheets().values().batchGet().execute.return_value = {'valueRanges': [
+        {'range': 'Data!A1:A2', 'values': [['a'], ['b']]},
+        {'range': 'Data!C1:C2'},
+    ]}
+    mock_build.return_value = mock_sheets
+
+    reader = GoogleDocReader()
+    result = reader.read_sheet_ranges('https://docs.google.com/spreadsheets/d/abc123/edit', ['A1:A2', 'C1:C2'], sheet='Data')
+
+    assert result == [
+        {'range': 'Data!A1:A2', 'values': [['a'], ['b']]},
+        {'range': 'Data!C1:C2', 'values': []},
+    ]
+    mock_sheets.spreadsheets().values().batchGet.assert_called_with(
+        spreadsheetId='abc123', ranges=["'Data'!A1:A2", "'Data'!C1:C2"])
+
+def test_iter_sheet_rows_fetches_chunks_of_the_gid_tab(mock_credentials, mock_build, mock_open, mock_json_load):
+    mock_sheets = MagicMock()
+    mock_sheets.spreadsheets().get().execute.return_value = {'sheets': [
+        {'properties': {'sheetId': 0, 'title': 'First', 'gridProperties': {'rowCount': 100}}},
+        {'properties': {'sheetId': 42, 'title': 'Data', 'gridProperties': {'rowCount': 7}}},
+    ]}
+    windows = {
+        "'Data'!A1:ZZ3": {'values': [['h'], ['1']]},
+        "'Data'!A4:ZZ6": {'values': [[], ['2']]},
+        "'Data'!A7:ZZ7": {},
+    }
+    mock_sheets.spreadsheets().values().get.side_effect = lambda **kwargs: MagicMock(
+        execute=MagicMock(return_value=windows[kwargs['range']]))
+    mock_build.return_value = mock_sheets
+
+    reader = GoogleDocReader()
+    rows = list(reader.iter_sheet_rows('https://docs.google.com/spreadsheets/d/abc123/edit#gid=42', chunk_rows=3))
+
+    # Row 3 is blank at the end of the first window and row 4 at the start of the second
+    assert rows == [['h'], ['1'], [], [], ['2']]
+    assert mock_sheets.spreadsheets().values().get.call_count == 3
+
+def test_iter_sheet_rows_unknown_tab(mock_credentials, mock_build, mock_open, mock_json_load):
+    mock_sheets = MagicMock()
+    mock_sheets.spreadsheets().get().execute.return_value = {'sheets': [
+        {'properties': {'sheetId': 0, 'title': 'First', 'gridProperties': {'rowCount': 10}}},
+    ]}
+    mock_build.return_value = mock_sheets
+
+    reader = GoogleDocReader()
+    with pytest.raises(ValueError, match="Sheet not found: Missing"):
+        list(reader.iter_sheet_rows('https://docs.google.com/spreadsheets/d/abc123/edit', sheet='Missing'))
+
+def test_rows_to_columns():
+    from array import array
+    from src.google_doc_reader import rows_to_columns
+
+    columns = rows_to_columns([
+        ['name', 'amount', 'amount'],
+        ['a', 1, 2],
+        ['b', '', 3.5, 'extra'],
+        ['c', 'n/a'],
+    ])
+
+    assert list(columns) == ['name', 'amount', 'amount_2', 'column_4']
+    assert columns['name'] == ['a', 'b', 'c']
+    assert columns['amount'] == [1.0, None, 'n/a']
+    assert isinstance(columns['amount_2'], array)
+    assert columns['amount_2'][:2].tolist() == [2.0, 3.5]
+    assert columns['amount_2'][2] != columns['amount_2'][2]
+    assert columns['column_4'] == [None, 'extra', None]
+
+def test_rows_to_columns_keeps_ints_of_a_column_that_turns_out_mixed():
+    from src.google_doc_reader import rows_to_columns
+
+    columns = rows_to_columns([['id', 'v'], [1, 2], [2, 2.5], [3, 'x']])
+
+    assert columns['v'] == [2, 2.5, 'x']
+    assert type(columns['v'][0]) is int
+
+def _paragraph(text, style=None, bullet=None, footnote=None):
+    elements = [{'textRun': {'content': text}}]
+    if footnote:
+        elements.insert(0, {'footnoteReference': {'footnoteId': footnote[0], 'footnoteNumber': footnote[1]}})
+    paragraph = {'elements': elements}
+    if style:
+        paragraph['paragraphStyle'] = {'namedStyleType': style}
+    if bullet is not None:
+        paragraph['bullet'] = {'listId': 'list1', 'nestingLevel': bullet}
+    return {'paragraph': paragraph}
+
+def _cell(*content):
+    return {'content': list(content)}
+
+STRUCTURED_DOCUMENT = {
+    'title': 'Design',
+    'body': {'content': [
+        {'sectionBreak': {}},
+        _paragraph('Overview\n', style='HEADING_1'),
+        _paragraph('Intro', footnote=('fn2', '1')),
+        _paragraph('\n'),
+        _paragraph('First\n', bullet=0),
+        _paragraph('Nested\n', bullet=1),
+        {'table': {'tableRows': [
+            {'tableCells': [_cell(_paragraph('a\n')), _cell(_paragraph('b\n'))]},
+            {'tableCells': [_cell(_paragraph('c\n')), _cell(
+                {'table': {'tableRows': [{'tableCells': [_cell(_paragraph('x\n')), _cell(_paragraph('y\n'))]}]}}
+            )]},
+        ]}},
+        {'sectionBreak': {}},
+        _paragraph('End\n'),
+    ]},
+    'headers': {'h1': {'content': [_paragraph('Header\n')]}},
+    'footers': {'f1': {'content': [_paragraph('Footer\n')]}},
+    'footnotes': {
+        'fn1': {'content': [_paragraph('Unreferenced\n')]},
+        'fn2': {'content': [_paragraph('See appendix\n')]},
+    },
+}
+
+def test_document_text_covers_tables_lists_and_sections(mock_credentials, mock_build, mock_open, mock_json_load):
+    mock_build.return_value.documents().get().execute.return_value = STRUCTURED_DOCUMENT
+
+    reader = GoogleDocReader()
+    result = reader.read_document('https://docs.google.com/document/d/abc123/edit')
+
+    assert result == {
+        'title': 'Design',
+        'content': 'Overview\n[1]Intro\n* First\n  * Nested\na\tb\nc\tx\ty\nEnd\n',
+        'headers': ['Header\n'],
+        'footers': ['Footer\n'],
+        'footnotes': ['See appendix\n', 'Unreferenced\n'],
+    }
+
+def test_document_blocks(mock_credentials, mock_build, mock_open, mock_json_load):
+    mock_build.return_value.documents().get().execute.return_value = STRUCTURED_DOCUMENT
+
+    reader = GoogleDocReader()
+    result = reader.read_document('https://docs.google.com/document/d/abc123/edit', structured=True)
+
+    assert result['blocks'] == [
+        {'type': 'heading', 'level': 1, 'text': 'Overview'},
+        {'type': 'paragraph', 'text': '[1]Intro'},
+        {'type': 'list_item', 'level': 0, 'list_id': 'list1', 'text': 'First'},
+        {'type': 'list_item', 'level': 1, 'list_id': 'list1', 'text': 'Nested'},
+        {'type': 'table', 'rows': [['a', 'b'], ['c', 'x\ty']]},
+        {'type': 'section_break'},
+        {'type': 'paragraph', 'text': 'End'},
+    ]
+
+def test_document_links(mock_credentials, mock_build, mock_open, mock_json_load):
+    link = {'textRun': {'content': 'spec', 'textStyle': {'link': {'url': 'https://github.com/owner/repo/pull/1'}}}}
+    mock_build.return_value.documents().get().execute.return_value = {
+        'title': 'Doc', 'body': {'content': [{'paragraph': {'elements': [link, link]}}]}}
+
+    reader = GoogleDocReader()
+    result = reader.read_document('https://docs.google.com/document/d/abc123/edit')
+
+    assert result == {'title': 'Doc', 'content': 'specspec', 'links': ['https://github.com/owner/repo/pull/1']}
+
+def test_read_many_keeps_input_order_and_retries_failed_reads(mock_credentials, mock_build, mock_open, mock_json_load):
+    import httplib2
+    from googleapiclient.errors import HttpError
+    calls = []
+    failures = {'flaky': [HttpError(httplib2.Response({'status': 503}), b'unavailable')],
+                'missing': [HttpError(httplib2.Response({'status': 404}), b'not found')] * 3}
+
+    def get(documentId=None, **kwargs):
+        request = MagicMock()
+        def execute():
+            calls.append(documentId)
+            if failures.get(documentId):
+                raise failures[documentId].pop(0)
+            return {'title': documentId, 'body': {'content': []}}
+        request.execute.side_effect = execute
+        return request
+    mock_build.return_value.documents.return_value.get.side_effect = get
+
+    from src.rate_limit import RequestScheduler
+    reader = GoogleDocReader(scheduler=RequestScheduler(base_delay=0))
+    urls = [f'https://docs.google.com/document/d/{doc_id}/edit' for doc_id in ('a', 'flaky', 'b', 'missing', 'a')]
+    results = reader.read_many(urls, workers=4, return_exceptions=True)
+
+    assert [result['title'] for result in results[:3]] == ['a', 'flaky', 'b']
+    assert results[4] == results[0]
+    assert isinstance(results[3], HttpError)
+    # The 503 is retried on its own, the 404 is not, and the repeated URL is read once
+    assert sorted(calls) == ['a', 'b', 'flaky', 'flaky', 'missing']
+    with pytest.raises(HttpError):
+        reader.read_many(urls[3:4])
+
+def test_http_clients_are_pooled_across_threads():
+    import threading
+    from src.google_doc_reader import _ScheduledHttp
+    scheduler = MagicMock()
+    scheduler.send.side_effect = lambda source, send, **kwargs: send()
+    entered = threading.Barrier(3)
+    release = threading.Event()
+    created = []
+
+    def new_http():
+        http = MagicMock()
+        def request(uri, **kwargs):
+            if uri == 'slow':
+                entered.wait(5)
+                release.wait(5)
+            return http, b''
+        http.request.side_effect = request
+        created.append(http)
+        return http
+
+    http = _ScheduledHttp(new_http, scheduler, 'google-docs', 'oauth', size=2)
+    # Sequential requests on new threads, as the server makes them, share one client
+    for _ in range(3):
+        thread = threading.Thread(target=http.request, args=('fast',))
+        thread.start()
+        thread.join()
+    assert len(created) == 1
+    # Concurrent requests get a client each, up to the size of the pool
+    threads = [threading.Thread(target=http.request, args=('slow',)) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    entered.wait(5)
+    waiting = threading.Thread(target=http.request, args=('fast',))
+    waiting.start()
+    waiting.join(0.2)
+    assert waiting.is_alive() and len(created) == 2
+    release.set()
+    for thread in threads + [waiting]:
+        thread.join(5)
+    assert len(created) == 2 and not waiting.is_alive()
+
+def test_http_clients_have_a_timeout(mock_credentials, mock_build, mock_open, mock_json_load):
+    from googleapiclient.http import DEFAULT_HTTP_TIMEOUT_SEC
+    GoogleDocReader().docs_service
+    http = mock_build.call_args.kwargs['http']
+    assert http.new_http().http.timeout == DEFAULT_HTTP_TIMEOUT_SEC
@@ -1,3 +1,4 @@
+import os
 import pytest
 from unittest.mock import patch, MagicMock
 from src.jira_ticket_reader import JiraAndConfluenceReader
@@ -39,6 +40,7 @@ def test_read_confluence_page_by_url_success(mock_confluence, mock_env_vars):
     mock_confluence.return_value.get_page_by_id.return_value = {
         'id': '123',
         'title': 'Test Page',
+        'version': {'number': 2, 'when': '2024-01-01T00:00:00.000Z'},
         'body': {'storage': {'value': 'Test content'}}
     }
     reader = JiraAndConfluenceReader()
@@ -46,11 +48,14 @@ def test_read_confluence_page_by_url_success(mock_confluence, mock_env_vars):
     assert result == {
         'id': '123',
         'title': 'Test Page',
+        'updated': '2024-01-01T00:00:00.000Z',
         'content': 'Test content'
     }
 
 def test_read_confluence_page_by_url_failure(mock_confluence, mock_env_vars):
     mock_confluence.return_value.get_space.side_effect = Exception("Space not found")
+    mock_confluence.return_value.get_page_by_id.side_effect = Exception("Page not found")
+    mock_confluence.return_value.get_page_by_title.return_value = None
     reader = JiraAndConfluenceReader()
     result = reader.read_confluence_page_by_url("https://test.atlassian.net/wiki/spaces/TEST/pages/123/Test+Page")
     assert 'error' in result
@@ -67,6 +72,7 @@ def test_read_ticket(mock_jira, mock_env_vars):
     mock_issue.key = 'TEST-123'
     mock_issue.fields.summary = 'Test Summary'
     mock_issue.fields.description = 'Test Description'
+    mock_issue.fields.updated = '2024-01-01T00:00:00.000+0000'
     mock_issue.fields.comment.comments = [MagicMock(body='Test Comment')]
     mock_jira.return_value.issue.return_value = mock_issue
 
@@ -77,5 +83,212 @@ def test_read_ticket(mock_jira, mock_env_vars):
         'key': 'TEST-123',
         'summary': 'Test Summary',
         'description': 'Test Description',
+        'updated': '2024-01-01T00:00:00.000+0000',
         'comments': ['Test Comment']
-    }
\ No newline at end of file
+    }
+
+class FakeConfluence:
+    """Test double that counts the requests a page read costs."""
+
+    def __init__(self, pages, spaces=('TEST',)):
+        self.pages = pages
+        self.spaces = spaces
+        self.requests = []
+        self._session = MagicMock()
+
+    def get_space(self, space_key):
+        self.requests.append(('get_space', space_key))
+        if space_key not in self.spaces:
+            raise Exception(f"No space with key {space_key}")
+        return {'key': space_key}
+
+    def get_page_by_id(self, page_id, expand=None):
+        self.requests.append(('get_page_by_id', page_id))
+        for page in self.pages:
+            if page['id'] == page_id:
+                return page
+        raise Exception(f"No content with id {page_id}")
+
+    def get(self, path, params=None):
+        # Content search with cursor links, like /rest/api/content/search
+        self.requests.append(('get', path))
+        if params is not None:
+            self.cql, limit, start = params['cql'], params['limit'], 0
+        else:
+            start, limit = (int(value) for value in path.split('cursor=')[1].split(':'))
+        results = [{key: value for key, value in page.items() if key != 'body'}
+                   for page in self.pages[start:start + limit]]
+        links = {'next': f'/rest/api/content/search?cursor={start + limit}:{limit}'} if start + limit < len(self.pages) else {}
+        return {'results': results, '_links': links}
+
+    def get_page_by_title(self, space, title, expand=None):
+        self.requests.append(('get_page_by_title', title))
+        for page in self.pages:
+            if page['title'] == title:
+                return page
+        return None
+
+@pytest.fixture
+def fake_confluence(mock_confluence):
+    fake = FakeConfluence([{'id': '123', 'title': 'Test Page', 'body': {'storage': {'value': 'Test content'}}}])
+    mock_confluence.return_value = fake
+    return fake
+
+def test_read_confluence_page_by_id_is_one_request(fake_confluence, mock_env_vars):
+    reader = JiraAndConfluenceReader()
+    result = reader.read_confluence_page_by_url("https://test.atlassian.net/wiki/spaces/TEST/pages/123/Test+Page")
+
+    assert result['content'] == 'Test content'
+    assert fake_confluence.requests == [('get_page_by_id', '123')]
+
+def test_read_confluence_page_by_title_is_memoized(fake_confluence, mock_env_vars):
+    reader = JiraAndConfluenceReader()
+    url = "https://test.atlassian.net/wiki/spaces/TEST/pages/Test+Page"
+
+    assert reader.read_confluence_page_by_url(url)['id'] == '123'
+    assert reader.read_confluence_page_by_url(url)['id'] == '123'
+    assert fake_confluence.requests == [('get_page_by_title', 'Test Page'), ('get_page_by_id', '123')]
+
+def test_read_missing_confluence_page_checks_space_once(fake_confluence, mock_env_vars):
+    reader = JiraAndConfluenceReader()
+    result = reader.read_confluence_page_by_url("https://test.atlassian.net/wiki/spaces/TEST/pages/999/Missing")
+    reader.read_confluence_page_by_url("https://test.atlassian.net/wiki/spaces/TEST/pages/998/Gone")
+
+    assert result == {'error': "Error reading Confluence page: Page 'Missing' not found in space TEST"}
+    assert fake_confluence.requests.count(('get_space', 'TEST')) == 1
+
+def test_read_confluence_page_in_inaccessible_space(fake_confluence, mock_env_vars):
+    reader = JiraAndConfluenceReader()
+    result = reader.read_confluence_page_by_url("https://test.atlassian.net/wiki/spaces/SECRET/pages/999")
+
+    assert result == {'error': "Error accessing Confluence space: No space with key SECRET"}
+
+def test_sync_confluence_page_reports_new_versions(fake_confluence, mock_env_vars):
+    page = fake_confluence.pages[0]
+    page['version'] = {'number': 3, 'when': '2024-01-01T00:00:00.000Z'}
+    url = "https://test.atlassian.net/wiki/spaces/TEST/pages/123/Test+Page"
+
+    reader = JiraAndConfluenceReader()
+    changes, watermark = reader.sync_confluence_page(url)
+    assert changes['version'] == 3 and changes['previous_version'] is None
+    assert watermark == {'id': '123', 'version': 3}
+
+    fake_confluence.requests.clear()
+    assert reader.sync_confluence_page(url, watermark) == (None, watermark)
+    assert fake_confluence.requests == [('get_page_by_id', '123')]
+
+    page['version'] = {'number': 4, 'when': '2024-01-02T00:00:00.000Z'}
+    page['body']['storage']['value'] = 'New content'
+    changes, watermark = reader.sync_confluence_page(url, watermark)
+    assert changes == {'id': '123', 'title': 'Test Page', 'updated': '2024-01-02T00:00:00.000Z', 'content': 'New content',
+                       'version': 4, 'previous_version': 3}
+
+def crawl_pages(count):
+    return [{'id': str(i), 'title': f'Page {i}', 'version': {'number': 1, 'when': '2024-01-01T00:00:00.000Z'},
+             'space': {'key': 'TEST'}, 'ancestors': [{'id': '100'}], 'body': {'storage': {'value': f'Body {i}'}}}
+            for i in range(1, count + 1)]
+
+def test_crawl_confluence_space(mock_confluence, mock_env_vars, tmp_path):
+    from src.crawl import CrawlCheckpoint
+    fake = FakeConfluence(crawl_pages(5))
+    mock_confluence.return_value = fake
+    checkpoint = CrawlCheckpoint(str(tmp_path / 'crawl.json'))
+
+    pages = list(JiraAndConfluenceReader().crawl_confluence('TEST', checkpoint, workers=2, page_size=2))
+
+    assert sorted(page['id'] for page in pages) == ['1', '2', '3', '4', '5']
+    assert pages[0].keys() == {'id', 'title', 'space', 'parent_id', 'version', 'updated', 'content'}
+    assert next(page for page in pages if page['id'] == '3') == {
+        'id': '3', 'title': 'Page 3', 'space': 'TEST', 'parent_id': '100', 'version': 1,
+        'updated': '2024-01-01T00:00:00.000Z', 'content': 'Body 3'}
+    assert fake.cql == 'space = "TEST" and type = page'
+    assert len([request for request in fake.requests if request[0] == 'get']) == 3
+    # A finished crawl leaves no checkpoint behind
+    assert not (tmp_path / 'crawl.json').exists()
+
+def test_interrupted_crawl_resumes_without_repeating_pages(mock_confluence, mock_env_vars, tmp_path):
+    from src.crawl import CrawlCheckpoint
+    fake = FakeConfluence(crawl_pages(7))
+    mock_confluence.return_value = fake
+    path = str(tmp_path / 'crawl.json')
+
+    crawl = JiraAndConfluenceReader().crawl_confluence('TEST', CrawlCheckpoint(path), workers=2, page_size=3)
+    first = [next(crawl)['id'] for _ in range(4)]
+    crawl.close()
+    checkpoint = CrawlCheckpoint(path)
+    # A page only counts as written once the next one is asked for
+    assert checkpoint.resumed and checkpoint.count == 3
+
+    fake.requests.clear()
+    rest = [page['id'] for page in JiraAndConfluenceReader().crawl_confluence('TEST', checkpoint, workers=2, page_size=3)]
+    assert sorted(first[:3] + rest, key=int) == [str(i) for i in range(1, 8)]
+    # The resumed crawl starts from the listing page it was interrupted in
+    assert ('get', 'rest/api/content/search') not in fake.requests
+
+def test_unreadable_pages_do_not_stop_the_crawl(mock_confluence, mock_env_vars):
+    fake = FakeConfluence(crawl_pages(4))
+    mock_confluence.return_value = fake
+    get_page_by_id = fake.get_page_by_id
+    fake.get_page_by_id = lambda page_id, expand=None: 1 / 0 if page_id == '2' else get_page_by_id(page_id, expand)
+
+    pages = list(JiraAndConfluenceReader().crawl_confluence('TEST', workers=2, page_size=2))
+
+    assert sorted(page['id'] for page in pages) == ['1', '2', '3', '4']
+    assert next(page for page in pages if page['id'] == '2') == {'id': '2', 'error': 'division by zero'}
+
+def test_rerun_of_a_crawl_reads_only_the_pages_that_failed(mock_confluence, mock_env_vars, tmp_path):
+    from src.crawl import CrawlCheckpoint
+    fake = FakeConfluence(crawl_pages(4))
+    mock_confluence.return_value = fake
+    get_page_by_id = fake.get_page_by_id
+    fake.get_page_by_id = lambda page_id, expand=None: 1 / 0 if page_id == '2' else get_page_by_id(page_id, expand)
+    path = str(tmp_path / 'crawl.json')
+
+    pages = list(JiraAndConfluenceReader().crawl_confluence('TEST', CrawlCheckpoint(path), workers=2, page_size=2))
+    assert sorted(page['id'] for page in pages) == ['1', '2', '3', '4']
+    checkpoint = CrawlCheckpoint(path)
+    assert checkpoint.resumed and checkpoint.failed == {'2'} and checkpoint.listed
+
+    fake.get_page_by_id = get_page_by_id
+    fake.requests.clear()
+    pages = list(JiraAndConfluenceReader().crawl_confluence('TEST', checkpoint, workers=2, page_size=2))
+    assert [page['id'] for page in pages] == ['2'] and 'error' not in pages[0]
+    assert fake.requests == [('get_page_by_id', '2')]
+    assert not os.path.exists(path)
+
+def test_checkpoint_of_another_format_is_not_resumed(mock_confluence, mock_env_vars, tmp_path):
+    from src.crawl import CrawlCheckpoint
+    mock_confluence.return_value = FakeConfluence(crawl_pages(5))
+    path = str(tmp_path / 'crawl.json')
+    crawl = JiraAndConfluenceReader().crawl_confluence('TEST', CrawlCheckpoint(path), page_size=2, content_format='text')
+    [next(crawl) for _ in range(3)]
+    crawl.close()
+
+    pages = list(JiraAndConfluenceReader().crawl_confluence('TEST', CrawlCheckpoint(path), page_size=2,
+                                                            content_format='markdown'))
+    assert sorted(page['id'] for page in pages) == ['1', '2', '3', '4', '5']
+
+def test_crawl_confluence_page_tree(mock_confluence, mock_env_vars):
+    root = {'id': '100', 'title': 'Root', 'version': {'number': 2}, 'ancestors': [], 'space': {'key': 'TEST'},
+            'body': {'storage': {'value': 'Root body'}}}
+    fake = FakeConfluence(crawl_pages(2))
+    mock_confluence.return_value = fake
+    fake.get_page_by_id = lambda page_id, expand=None: root if page_id == '100' else FakeConfluence.get_page_by_id(fake, page_id)
+
+    pages = list(JiraAndConfluenceReader().crawl_confluence('https://test.atlassian.net/wiki/spaces/TEST/pages/100/Root'))
+
+    assert pages[0] == {'id': '100', 'title': 'Root', 'space': 'TEST', 'parent_id': None, 'version': 2,
+                        'updated': None, 'content': 'Root body'}
+    assert sorted(page['id'] for page in pages[1:]) == ['1', '2']
+    assert fake.cql == 'ancestor = 100 and type = page'
+
+def test_read_confluence_page_as_markdown(fake_confluence, mock_env_vars, tmp_path):
+    from src.cache import ResponseCache
+    fake_confluence.pages[0]['body']['storage']['value'] = '<h2>Intro</h2><p>Some <strong>bold</strong> text</p>'
+    reader = JiraAndConfluenceReader(cache=ResponseCache(str(tmp_path)))
+    url = "https://test.atlassian.net/wiki/spaces/TEST/pages/123/Test+Page"
+
+    assert reader.read_confluence_page_by_url(url, content_format='markdown')['content'] == '## Intro\n\nSome **bold** text\n'
+    assert reader.read_confluence_page_by_url(url, content_format='text')['content'] == 'Intro\n\nSome bold text\n'
+    # Each format is cached separately from the storage format body
+    assert reader.read_confluence_page_by_url(url)['content'] == '<h2>Intro</h2><p>Some <strong>bold</strong> text</p>'
@@ -1,6 +1,7 @@
 import pytest
 from unittest.mock import patch, MagicMock
 from src.jira_ticket_reader import JiraAndConfluenceReader
+from src.cache import ResponseCache
 
 @pytest.fixture
 def mock_jira():
@@ -22,6 +23,7 @@ def test_read_ticket(mock_jira, mock_getenv):
     mock_issue.key = 'PROJ-123'
     mock_issue.fields.summary = 'Test Issue'
     mock_issue.fields.description = 'Issue description'
+    mock_issue.fields.updated = '2024-01-01T00:00:00.000+0000'
     mock_issue.fields.comment.comments = [MagicMock(body='Comment 1')]
     mock_jira.return_value.issue.return_value = mock_issue
 
@@ -32,6 +34,145 @@ def test_read_ticket(mock_jira, mock_getenv):
         'key': 'PROJ-123',
         'summary': 'Test Issue',
         'description': 'Issue description',
+        'updated': '2024-01-01T00:00:00.000+0000',
         'comments': ['Comment 1']
     }
-    assert result == expected_output
\ No newline at end of file
+    assert result == expected_output
+
+def test_read_ticket_revalidates_with_updated(mock_jira, mock_getenv, tmp_path):
+    mock_issue = MagicMock()
+    mock_issue.key = 'PROJ-123'
+    mock_issue.fields.summary = 'Test Issue'
+    mock_issue.fields.description = 'Issue description'
+    mock_issue.fields.updated = '2024-01-01T00:00:00.000+0000'
+    mock_issue.fields.comment.comments = [MagicMock(body='Comment 1')]
+    mock_jira.return_value.issue.return_value = mock_issue
+
+    reader = JiraAndConfluenceReader(cache=ResponseCache(str(tmp_path), ttl=0))
+    first = reader.read_ticket('PROJ-123')
+    second = reader.read_ticket('PROJ-123')
+
+    assert first == second
+    assert mock_jira.return_value.issue.call_args_list[-1].kwargs == {'fields': 'updated'}
+    assert mock_jira.return_value.issue.call_count == 2
+
+def test_cached_ticket_of_another_jira_site_is_not_reused(mock_jira, mock_getenv, tmp_path):
+    mock_issue = MagicMock()
+    mock_issue.key = 'PROJ-123'
+    mock_issue.fields.summary = 'Test Issue'
+    mock_issue.fields.description = 'Issue description'
+    mock_issue.fields.updated = '2024-01-01T00:00:00.000+0000'
+    mock_issue.fields.comment.comments = []
+    mock_jira.return_value.issue.return_value = mock_issue
+    cache = ResponseCache(str(tmp_path))
+
+    JiraAndConfluenceReader(cache=cache).read_ticket('PROJ-123')
+    other_site = JiraAndConfluenceReader(cache=cache)
+    other_site.domain = 'https://other.atlassian.net'
+    other_site.read_ticket('PROJ-123')
+
+    assert mock_jira.return_value.issue.call_count == 2
+
+def make_raw_issue(key, comments=('Comment 1',), total=None):
+    return {
+        'key': key,
+        'fields': {
+            'summary': f'{key} summary',
+            'description': f'{key} description',
+            'updated': '2024-01-01T00:00:00.000+0000',
+            'comment': {
+                'comments': [{'body': body} for body in comments],
+                'total': len(comments) if total is None else total
+            }
+        }
+    }
+
+def test_read_tickets_by_jql_paginates(mock_jira, mock_getenv):
+    mock_jira.return_value.deploymentType = 'Server'
+    pages = [
+        {'startAt': 0, 'total': 3, 'issues': [make_raw_issue('PROJ-1'), make_raw_issue('PROJ-2')]},
+        {'startAt': 2, 'total': 3, 'issues': [make_raw_issue('PROJ-3')]},
+    ]
+    mock_jira.return_value.search_issues.side_effect = pages
+
+    reader = JiraAndConfluenceReader()
+    tickets = list(reader.read_tickets(jql='sprint in openSprints()', max_results=2))
+
+    assert [ticket['key'] for ticket in tickets] == ['PROJ-1', 'PROJ-2', 'PROJ-3']
+    assert tickets[0] == {
+        'key': 'PROJ-1',
+        'summary': 'PROJ-1 summary',
+        'description': 'PROJ-1 description',
+        'updated': '2024-01-01T00:00:00.000+0000',
+        'comments': ['Comment 1']
+    }
+    first_call = mock_jira.return_value.search_issues.call_args_list[0]
+    assert first_call.kwargs == {'startAt': 0, 'maxResults': 2, 'fields': 'summary,description,comment,updated', 'json_result': True}
+    assert mock_jira.return_value.search_issues.call_args_list[1].kwargs['startAt'] == 2
+    mock_jira.return_value.issue.assert_not_called()
+
+def test_read_tickets_by_keys_on_cloud(mock_jira, mock_getenv):
+    mock_jira.return_value.deploymentType = 'Cloud'
+    mock_jira.return_value.enhanced_search_issues.side_effect = [
+        {'issues': [make_raw_issue('PROJ-1')], 'nextPageToken': 'abc', 'isLast': False},
+        {'issues': [make_raw_issue('PROJ-2', total=2)], 'isLast': True},
+    ]
+    mock_jira.return_value.comments.return_value = [MagicMock(body='Comment 1'), MagicMock(body='Comment 2')]
+
+    reader = JiraAndConfluenceReader()
+    tickets = list(reader.read_tickets(keys=['PROJ-1', 'PROJ-2']))
+
+    calls = mock_jira.return_value.enhanced_search_issues.call_args_list
+    assert calls[0].args == ('key in (PROJ-1, PROJ-2)',)
+    assert calls[1].kwargs['nextPageToken'] == 'abc'
+    assert tickets[1]['comments'] == ['Comment 1', 'Comment 2']
+    mock_jira.return_value.comments.assert_called_once_with('PROJ-2')
+
+def test_read_tickets_needs_keys_or_jql(mock_jira, mock_getenv):
+    reader = JiraAndConfluenceReader()
+    with pytest.raises(ValueError, match="Pass either keys or jql"):
+        list(reader.read_tickets())
+
+def test_clients_are_built_on_first_use(mock_jira, mock_getenv):
+    reader = JiraAndConfluenceReader()
+    mock_jira.assert_not_called()
+
+    reader.read_ticket('PROJ-123')
+    reader.read_ticket('PROJ-123')
+
+    mock_jira.assert_called_once_with(server='https://example.atlassian.net', basic_auth=('test@example.com', 'fake_token'))
+
+def make_sync_issue(updated, comments=(), summary='Test Issue'):
+    issue = MagicMock()
+    issue.key = 'PROJ-123'
+    issue.fields.updated = updated
+    issue.fields.summary = summary
+    issue.fields.description = 'Issue description'
+    issue.fields.comment.comments = [
+        MagicMock(id=comment_id, body=f'Comment {comment_id}', created=updated) for comment_id in comments
+    ]
+    issue.fields.comment.total = len(comments)
+    return issue
+
+def test_sync_ticket_reports_only_changes(mock_jira, mock_getenv):
+    jira = mock_jira.return_value
+    jira.issue.return_value = make_sync_issue('2024-01-01T00:00:00.000+0000', comments=['10'])
+
+    reader = JiraAndConfluenceReader()
+    changes, watermark = reader.sync_ticket('PROJ-123')
+    assert changes['new_comments'] == [{'id': '10', 'body': 'Comment 10'}]
+    assert changes['summary'] == 'Test Issue'
+
+    # Unchanged: only the updated field is requested
+    jira.issue.reset_mock()
+    assert reader.sync_ticket('PROJ-123', watermark) == (None, watermark)
+    jira.issue.assert_called_once_with('PROJ-123', fields='updated')
+
+    jira.issue.return_value = make_sync_issue('2024-01-02T00:00:00.000+0000', comments=['10', '11'])
+    changes, watermark = reader.sync_ticket('PROJ-123', watermark)
+    assert changes == {
+        'key': 'PROJ-123',
+        'updated': '2024-01-02T00:00:00.000+0000',
+        'new_comments': [{'id': '11', 'body': 'Comment 11'}],
+    }
+    assert watermark['last_comment_id'] == 11
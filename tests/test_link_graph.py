@@ -0,0 +1,97 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import threading
+from src.link_graph import canonical, extract_links, run_link_graph
+
+PR = 'https://github.com/Owner/Repo/pull/7'
+PAGE = 'https://x.atlassian.net/wiki/spaces/ENG/pages/42/Design'
+DOC = 'https://docs.google.com/document/d/doc1/edit'
+
+OBJECTS = {
+    ('github', 'https://github.com/Owner/Repo/pull/7'): {
+        'title': 'PROJ-1: Fix login', 'description': 'See https://x.atlassian.net/browse/PROJ-2 and UTF-8 handling.',
+        'comments': ['Same as https://github.com/owner/repo/pull/7#discussion'],
+        'file_changes': [{'file': 'a.py', 'patch': '+ PROJ-99'}]},
+    ('jira', 'PROJ-1'): {'key': 'PROJ-1', 'summary': 'Login', 'description': f'Design: [page|{PAGE}]', 'comments': []},
+    ('jira', 'PROJ-2'): {'key': 'PROJ-2', 'summary': 'Other', 'description': 'Duplicate of PROJ-1', 'comments': []},
+    ('confluence', PAGE): {'id': '42', 'title': 'Design',
+                           'content': f'<p><a href="{DOC}">doc</a> <a href="{PAGE}?a=1&amp;b=2">self</a></p>'},
+    ('google', DOC): {'title': 'Doc', 'content': 'Plan', 'links': ['https://github.com/owner/repo/pull/8']},
+}
+
+class FakeReaders:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reads = []
+
+    def read(self, source, ref):
+        with self.lock:
+            self.reads.append((source, ref))
+        if (source, ref) not in OBJECTS:
+            raise ValueError(f"{ref} not found")
+        return OBJECTS[(source, ref)]
+
+def test_canonical_ids():
+    assert canonical('github', PR) == ('github:owner/repo#7', PR)
+    assert canonical('github', 'https://github.com/owner/repo/pull/7/files')[0] == 'github:owner/repo#7'
+    assert canonical('confluence', PAGE + '?focusedCommentId=3')[0] == 'confluence:x.atlassian.net/42'
+    assert canonical('confluence', 'https://x.atlassian.net/wiki/pages/viewpage.action?pageId=42')[0] == \
+        'confluence:x.atlassian.net/42'
+    assert canonical('google', 'https://docs.google.com/spreadsheets/d/s1/edit#gid=0')[0] == 'google:s1'
+    assert canonical('jira', 'proj-1') == ('jira:PROJ-1', 'PROJ-1')
+
+def test_extract_links():
+    assert extract_links('github', OBJECTS[('github', PR)]) == {
+        'jira:PROJ-1': ('jira', 'PROJ-1'),
+        'jira:PROJ-2': ('jira', 'PROJ-2'),
+        'jira:UTF-8': ('jira', 'UTF-8'),
+        'github:owner/repo#7': ('github', PR.replace('Owner/Repo', 'owner/repo')),
+    }
+    assert list(extract_links('github', OBJECTS[('github', PR)], projects={'PROJ'})) == \
+        ['jira:PROJ-1', 'jira:PROJ-2', 'github:owner/repo#7']
+    assert extract_links('confluence', OBJECTS[('confluence', PAGE)]) == {
+        'google:doc1': ('google', DOC), 'confluence:x.atlassian.net/42': ('confluence', PAGE + '?a=1&b=2')}
+    # Wikipedia is not Confluence
+    assert extract_links('jira', {'description': 'https://en.wikipedia.org/wiki/Graph'}) == {}
+
+def test_graph_is_read_breadth_first_and_deduplicated():
+    readers = FakeReaders()
+    records = []
+
+    failures = run_link_graph([('github', PR), ('jira', 'PROJ-1')], readers, write=records.append, projects={'PROJ'})
+
+    assert failures == 0
+    nodes = [(record['id'], record['depth']) for record in records if record['type'] == 'node']
+    assert sorted(nodes) == sorted([('github:owner/repo#7', 0), ('jira:PROJ-1', 0), ('jira:PROJ-2', 1),
+                                    ('confluence:x.atlassian.net/42', 1), ('google:doc1', 2)])
+    assert sorted(readers.reads) == sorted(OBJECTS)
+    edges = {(record['from'], record['to']) for record in records if record['type'] == 'edge'}
+    assert edges == {('github:owner/repo#7', 'jira:PROJ-1'), ('github:owner/repo#7', 'jira:PROJ-2'),
+                     ('jira:PROJ-1', 'confluence:x.atlassian.net/42'), ('jira:PROJ-2', 'jira:PROJ-1'),
+                     ('confluence:x.atlassian.net/42', 'google:doc1')}
+    # A linked object is written after the edge that led to it
+    assert records.index(next(r for r in records if r.get('id') == 'google:doc1')) > \
+        records.index(next(r for r in records if r.get('to') == 'google:doc1'))
+
+def test_depth_and_fan_out_limits():
+    readers = FakeReaders()
+    records = []
+
+    failures = run_link_graph([('github', PR)], readers, max_depth=1, fan_out=2, write=records.append)
+
+    assert failures == 0
+    assert readers.reads[0] == ('github', PR)
+    assert sorted(readers.reads[1:]) == [('jira', 'PROJ-1'), ('jira', 'PROJ-2')]
+    edges = [(record['from'], record['to']) for record in records if record['type'] == 'edge']
+    # The links of the last level are only kept when they point back into the graph
+    assert sorted(edges) == [('github:owner/repo#7', 'jira:PROJ-1'), ('github:owner/repo#7', 'jira:PROJ-2'),
+                             ('jira:PROJ-2', 'jira:PROJ-1')]
+
+def test_failed_reads_are_nodes_with_an_error():
+    records = []
+    failures = run_link_graph([('jira', 'PROJ-404')], FakeReaders(), write=records.append)
+    assert failures == 1
+    assert records == [{'type': 'node', 'id': 'jira:PROJ-404', 'source': 'jira', 'ref': 'PROJ-404', 'depth': 0,
+                        'error': 'PROJ-404 not found'}]
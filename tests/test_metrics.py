@@ -0,0 +1,133 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import json
+import pytest
+from src.metrics import Metrics
+from src.rate_limit import RequestScheduler
+from src.cache import ResponseCache
+
+class FakeResponse:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+@pytest.fixture
+def metrics(monkeypatch):
+    metrics = Metrics()
+    metrics.enable(trace=True)
+    # Every module holds the shared instance, so swap it everywhere it is used
+    for module in ('src.metrics', 'src.rate_limit', 'src.cache', 'src.github_pr_reader'):
+        monkeypatch.setattr(f'{module}.metrics', metrics)
+    return metrics
+
+def test_nothing_is_recorded_until_enabled():
+    metrics = Metrics()
+    with metrics.operation('jira', 'read_ticket'):
+        metrics.count('cache_hits')
+        metrics.pages(3)
+    assert metrics.operations == {} and metrics.counters == {} and metrics.max_pages == {}
+
+def test_requests_and_counters_are_attributed_to_the_running_operation(metrics):
+    scheduler = RequestScheduler(base_delay=0.001)
+    responses = iter([FakeResponse(429), FakeResponse(200)])
+
+    @metrics.instrument('jira')
+    def read_ticket():
+        metrics.pages(2)
+        return scheduler.send('jira', lambda: next(responses), size=lambda response: 10)
+
+    assert read_ticket().status_code == 200
+    key = ('jira', 'read_ticket')
+    assert metrics.operations[key].count == 1
+    assert metrics.requests[key].count == 2
+    assert metrics.requests[key].errors == 1
+    assert metrics.requests[key].bytes == 20
+    assert metrics.counters[('retries',) + key] == 1
+    assert metrics.counters[('pages',) + key] == 2
+    assert metrics.max_pages[key] == 2
+
+def test_generator_operations_last_until_exhausted(metrics):
+    @metrics.instrument('google-sheets')
+    def rows():
+        metrics.count('cache_misses')
+        yield 1
+        yield 2
+
+    assert list(rows()) == [1, 2]
+    assert metrics.operations[('google-sheets', 'rows')].count == 1
+    assert metrics.counters[('cache_misses', 'google-sheets', 'rows')] == 1
+
+def test_suspended_generator_operation_does_not_leak_into_the_caller(metrics):
+    @metrics.instrument('google-sheets')
+    def rows():
+        yield 1
+        metrics.count('cache_misses')
+        yield 2
+
+    generator = rows()
+    assert next(generator) == 1
+    metrics.count('cache_hits')
+    assert list(generator) == [2]
+    assert metrics.counters[('cache_hits', 'unknown', 'other')] == 1
+    assert metrics.counters[('cache_misses', 'google-sheets', 'rows')] == 1
+
+def test_operation_records_errors(metrics):
+    with pytest.raises(ValueError):
+        with metrics.operation('github', 'read_pr_by_url'):
+            raise ValueError()
+    assert metrics.operations[('github', 'read_pr_by_url')].errors == 1
+
+def test_cache_lookups_are_counted(metrics, tmp_path):
+    cache = ResponseCache(str(tmp_path), ttl=0)
+    with metrics.operation('jira', 'read_ticket'):
+        cache.fetch('jira:PROJ-1', lambda: ({'key': 'PROJ-1'}, 'v1'), revalidate=lambda validator: True)
+        cache.fetch('jira:PROJ-1', lambda: ({'key': 'PROJ-1'}, 'v1'), revalidate=lambda validator: True)
+    assert metrics.counters[('cache_misses', 'jira', 'read_ticket')] == 1
+    assert metrics.counters[('cache_revalidated', 'jira', 'read_ticket')] == 1
+
+def test_github_requests_end_when_urllib3_checks_the_response(metrics):
+    from src.github_pr_reader import _ScheduledRetry
+    retry = _ScheduledRetry(total=3)
+    with metrics.operation('github', 'read_pr_by_url'):
+        metrics.request_started()
+        assert not retry.is_retry('GET', 200)
+    series = metrics.requests[('github', 'read_pr_by_url')]
+    assert series.count == 1 and series.errors == 0
+
+def test_bind_carries_the_operation_to_other_threads(metrics):
+    from concurrent.futures import ThreadPoolExecutor
+    with metrics.operation('github', 'read_pr_by_url'), ThreadPoolExecutor(max_workers=2) as pool:
+        pool.submit(metrics.bind(metrics.count), 'cache_hits').result()
+        pool.submit(metrics.count, 'cache_hits').result()
+    assert metrics.counters[('cache_hits', 'github', 'read_pr_by_url')] == 1
+    assert metrics.counters[('cache_hits', 'unknown', 'other')] == 1
+
+def test_summary_lists_every_operation(metrics):
+    with metrics.operation('jira', 'read_ticket'):
+        metrics.count('cache_hits')
+    summary = metrics.summary().splitlines()
+    assert summary[0].split()[:3] == ['source', 'operation', 'calls']
+    assert summary[1].split()[:3] == ['jira', 'read_ticket', '1']
+
+def test_prometheus_histogram_is_cumulative(metrics):
+    metrics.record_request('github', started=0.0, status=200, size=5)
+    text = metrics.prometheus()
+    assert '# TYPE msr_requests_total counter' in text
+    assert 'msr_requests_total{source="github",operation="other"} 1' in text
+    assert 'msr_request_duration_seconds_bucket{source="github",operation="other",le="+Inf"} 1' in text
+    assert not text.rstrip().endswith('# EOF')
+    openmetrics = metrics.prometheus(openmetrics=True)
+    assert '# TYPE msr_requests counter' in openmetrics
+    assert openmetrics.rstrip().endswith('# EOF')
+
+def test_chrome_trace_and_metrics_files(metrics, tmp_path):
+    with metrics.operation('confluence', 'read_confluence_page_by_url'):
+        pass
+    metrics.write_chrome_trace(str(tmp_path / 'trace.json'))
+    metrics.write_prometheus(str(tmp_path / 'metrics' / 'msr.prom'))
+    events = json.loads((tmp_path / 'trace.json').read_text())['traceEvents']
+    assert [(event['name'], event['cat'], event['ph']) for event in events] == [
+        ('read_confluence_page_by_url', 'confluence', 'X')]
+    assert 'msr_operation_duration_seconds_count' in (tmp_path / 'metrics' / 'msr.prom').read_text()
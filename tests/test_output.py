@@ -0,0 +1,35 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import io
+import json
+from src.output import write_json_stream, write_ndjson_stream
+
+def make_result():
+    return {
+        'title': 'Test PR',
+        'number': 1,
+        'file_changes': ({'file': f'file{i}.py', 'patch': '+line'} for i in range(3)),
+    }
+
+def test_write_json_stream():
+    stream = io.StringIO()
+    write_json_stream(make_result(), stream)
+    assert json.loads(stream.getvalue()) == {
+        'title': 'Test PR',
+        'number': 1,
+        'file_changes': [{'file': f'file{i}.py', 'patch': '+line'} for i in range(3)],
+    }
+
+def test_write_json_stream_empty_generator():
+    stream = io.StringIO()
+    write_json_stream({'file_changes': iter([])}, stream)
+    assert json.loads(stream.getvalue()) == {'file_changes': []}
+
+def test_write_ndjson_stream():
+    stream = io.StringIO()
+    write_ndjson_stream(make_result(), stream)
+    lines = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert lines[0] == {'title': 'Test PR', 'number': 1}
+    assert lines[1:] == [{'file_changes': {'file': f'file{i}.py', 'patch': '+line'}} for i in range(3)]
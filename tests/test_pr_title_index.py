@@ -0,0 +1,67 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+from datetime import datetime, timezone
+from unittest.mock import MagicMock
+from src.pr_title_index import PRTitleIndex
+
+def make_pr(number, title, day):
+    pr = MagicMock()
+    pr.number = number
+    pr.title = title
+    pr.updated_at = datetime(2024, 1, day, tzinfo=timezone.utc)
+    return pr
+
+@pytest.fixture
+def repo():
+    repo = MagicMock()
+    repo.get_pulls.return_value = [
+        make_pr(3, 'Add caching layer', 3),
+        make_pr(2, 'Fix login bug', 2),
+        make_pr(1, 'Add CI', 1),
+    ]
+    return repo
+
+def test_lookup_modes(tmp_path, repo):
+    index = PRTitleIndex('owner/repo', str(tmp_path))
+    index.refresh(repo)
+
+    assert index.lookup('Fix login bug') == [2]
+    assert index.lookup('fix LOGIN bug') == []
+    assert index.lookup('fix LOGIN bug', match='ignorecase') == [2]
+    assert index.lookup('add', match='prefix') == [3, 1]
+    assert index.lookup('nothing', match='prefix') == []
+
+def test_index_persists_per_repo(tmp_path, repo):
+    PRTitleIndex('owner/repo', str(tmp_path)).refresh(repo)
+
+    reloaded = PRTitleIndex('owner/repo', str(tmp_path))
+    assert reloaded.lookup('Add CI') == [1]
+    assert reloaded.updated_at == datetime(2024, 1, 3, tzinfo=timezone.utc).isoformat()
+    assert PRTitleIndex('owner/other', str(tmp_path)).lookup('Add CI') == []
+
+def test_refresh_stops_at_watermark(tmp_path, repo):
+    index = PRTitleIndex('owner/repo', str(tmp_path))
+    index.refresh(repo)
+
+    repo.get_pulls.return_value = [
+        make_pr(4, 'New feature', 5),
+        make_pr(2, 'Fix login bug (renamed)', 4),
+        make_pr(3, 'Add caching layer', 3),
+        make_pr(1, 'Add CI', 1),
+    ]
+    fetched = index.refresh(repo)
+
+    repo.get_pulls.assert_called_with(state='all', sort='updated', direction='desc')
+    assert sorted(fetched) == [2, 3, 4]
+    assert index.lookup('New feature') == [4]
+    assert index.lookup('Fix login bug') == []
+    assert index.lookup('Fix login bug (renamed)') == [2]
+
+def test_corrupt_index_is_ignored(tmp_path):
+    index = PRTitleIndex('owner/repo', str(tmp_path))
+    with open(index.path, 'w') as f:
+        f.write('{not json')
+    assert PRTitleIndex('owner/repo', str(tmp_path)).lookup('anything') == []
@@ -0,0 +1,122 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import requests
+from src.rate_limit import BATCH, INTERACTIVE, RequestScheduler, TokenBucket, request_priority, retry_after_seconds
+
+class FakeResponse:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+def test_token_bucket_paces_after_the_burst():
+    bucket = TokenBucket(rate=50, capacity=2)
+    start = time.monotonic()
+    for _ in range(7):
+        bucket.acquire()
+    # Two requests fit in the burst, the other five wait 1/50 s each
+    assert time.monotonic() - start >= 0.09
+
+def test_interactive_requests_go_before_batch_requests():
+    bucket = TokenBucket(rate=10, capacity=1)
+    bucket.acquire()
+    order = []
+
+    def acquire(name, priority):
+        bucket.acquire(priority)
+        order.append(name)
+
+    batch = threading.Thread(target=acquire, args=('batch', BATCH))
+    batch.start()
+    time.sleep(0.02)
+    interactive = threading.Thread(target=acquire, args=('interactive', INTERACTIVE))
+    interactive.start()
+    time.sleep(0.02)
+    assert bucket.stats()['queued'] == 2
+    batch.join()
+    interactive.join()
+
+    assert order == ['interactive', 'batch']
+
+def test_retry_after_seconds():
+    assert retry_after_seconds({'Retry-After': '3'}) == 3
+    assert retry_after_seconds({'retry-after': 'Wed, 21 Oct 2015 07:28:00 GMT'}) == 0
+    assert retry_after_seconds({}) is None
+
+def test_send_retries_throttled_responses():
+    scheduler = RequestScheduler(base_delay=0.01)
+    responses = [FakeResponse(429, {'Retry-After': '0.05'}), FakeResponse(503), FakeResponse(200)]
+
+    start = time.monotonic()
+    response = scheduler.send('jira', lambda: responses.pop(0), credential='me')
+
+    assert response.status_code == 200
+    assert time.monotonic() - start >= 0.05
+    assert scheduler.stats()['jira:me']['requests'] == 3
+    assert scheduler.stats()['jira:me']['throttled'] == 2
+
+def test_send_gives_up_after_max_retries():
+    scheduler = RequestScheduler(max_retries=2, base_delay=0.001)
+    calls = []
+
+    def send():
+        calls.append(1)
+        return FakeResponse(429)
+
+    assert scheduler.send('jira', send).status_code == 429
+    assert len(calls) == 3
+
+def test_spent_budget_pauses_the_bucket():
+    scheduler = RequestScheduler()
+    scheduler.observe('github', 'abc', {'X-RateLimit-Remaining': '0', 'X-RateLimit-Limit': '5000',
+                                        'X-RateLimit-Reset': str(int(time.time()) + 30)})
+    assert scheduler.stats()['github:abc']['blocked_for'] > 20
+
+    scheduler.observe('github', 'def', {'X-RateLimit-Remaining': '50', 'X-RateLimit-Limit': '5000',
+                                        'X-RateLimit-Reset': str(int(time.time()) + 100)})
+    # Low budget: spread what is left until the reset
+    assert scheduler.stats()['github:def']['rate'] < 1
+
+def test_request_priority_is_scoped():
+    from src.rate_limit import current_priority
+    assert current_priority() == INTERACTIVE
+    with request_priority(BATCH):
+        assert current_priority() == BATCH
+    assert current_priority() == INTERACTIVE
+
+def test_scheduled_session_retries_429():
+    from src.jira_ticket_reader import _mount_scheduled_adapter
+    hits = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            hits.append(self.path)
+            status = 429 if len(hits) == 1 else 200
+            self.send_response(status)
+            if status == 429:
+                self.send_header('Retry-After', '0')
+            self.send_header('Content-Length', '2')
+            self.end_headers()
+            self.wfile.write(b'ok')
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        scheduler = RequestScheduler()
+        session = requests.Session()
+        _mount_scheduled_adapter(session, scheduler, 'confluence', 'me@example.com')
+        response = session.get(f'http://127.0.0.1:{server.server_port}/wiki/rest/api/content/1')
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert response.status_code == 200
+    assert len(hits) == 2
+    assert scheduler.stats()['confluence:me@example.com']['throttled'] == 1
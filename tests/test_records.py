@@ -0,0 +1,68 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import io
+import json
+import pytest
+from src.output import write_ndjson
+from src.records import Record, iter_records, record_reader, to_record
+
+def test_records_are_slotted():
+    record = Record('jira', 'PROJ-1', 'Summary', 'Description', ['first'])
+    assert not hasattr(record, '__dict__')
+    with pytest.raises(AttributeError):
+        record.other = 1
+    assert record.comments == ('first',)
+
+def test_body_is_materialized_once_on_first_read():
+    calls = []
+    record = Record('google', 'abc', body=lambda: calls.append(1) or 'text')
+    assert not record.loaded and calls == []
+    assert record.body == 'text'
+    assert record.body == 'text'
+    assert record.loaded and calls == [1]
+
+def test_every_source_normalizes_to_the_same_fields():
+    pr = to_record('github', 'https://github.com/owner/repo/pull/7', {
+        'title': 'Fix', 'number': 7, 'description': 'Body', 'updated_at': '2024-01-03T00:00:00+00:00',
+        'comments': ['review'], 'issue_comments': ['talk'], 'file_changes': [{'filename': 'a.py'}]})
+    ticket = to_record('jira', 'PROJ-1', {'key': 'PROJ-1', 'summary': 'Bug', 'description': 'Broken',
+                                          'updated': '2024-01-02T00:00:00.000+0000', 'comments': []})
+    page = to_record('confluence', 'https://x.atlassian.net/wiki/spaces/S/pages/1', {
+        'id': '1', 'title': 'Page', 'content': '<p>Hello <b>there</b></p>', 'version': 3,
+        'updated': '2024-01-01T00:00:00.000Z'})
+    sheet = to_record('google', 'https://docs.google.com/spreadsheets/d/sheet1/edit', [['a', 'b'], ['1', None]])
+
+    assert pr.to_dict() == {'source': 'github', 'id': 'owner/repo#7', 'title': 'Fix', 'body': 'Body',
+                            'comments': ['review', 'talk'], 'updated': '2024-01-03T00:00:00+00:00',
+                            'url': 'https://github.com/owner/repo/pull/7',
+                            'extra': {'file_changes': [{'filename': 'a.py'}], 'number': 7}}
+    assert (ticket.id, ticket.title, ticket.body, ticket.updated, ticket.url) == \
+        ('PROJ-1', 'Bug', 'Broken', '2024-01-02T00:00:00.000+0000', None)
+    assert not page.loaded
+    assert (page.body, page.updated, page.extra) == ('Hello there\n', '2024-01-01T00:00:00.000Z', {'version': 3})
+    assert (sheet.id, sheet.body) == ('sheet1', 'a\tb\n1\t')
+    with pytest.raises(RuntimeError, match='Page not found'):
+        to_record('confluence', 'ref', {'error': 'Page not found'})
+
+def test_ndjson_round_trip():
+    read = record_reader(lambda source, ref: {'key': ref, 'summary': 'Bug', 'description': None, 'comments': ['c']})
+    stream = io.StringIO()
+    write_ndjson({'index': 0, 'result': read('jira', 'PROJ-2')}, stream)
+    write_ndjson(read('jira', 'PROJ-3'), stream)
+    lines = stream.getvalue().splitlines()
+    assert json.loads(lines[0])['result']['id'] == 'PROJ-2'
+    [record] = iter_records(io.StringIO(lines[1]))
+    assert record == read('jira', 'PROJ-3')
+
+def test_msgpack_round_trip():
+    pytest.importorskip('msgpack')
+    from src.records import msgpack_writer
+    stream = io.BytesIO()
+    write = msgpack_writer(stream)
+    records = [Record('jira', f'PROJ-{i}', 'Bug', body=lambda: 'lazy', comments=['c']) for i in range(3)]
+    for record in records:
+        write(record)
+    stream.seek(0)
+    assert list(iter_records(stream, 'msgpack')) == records
@@ -0,0 +1,88 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import sqlite3
+import pytest
+from src.records import Record
+from src.search_index import SearchIndex, indexed, quote_query
+
+@pytest.fixture
+def index(tmp_path):
+    search_index = SearchIndex(str(tmp_path / 'index.sqlite'))
+    yield search_index
+    search_index.close()
+
+def test_results_are_ranked_and_filtered_by_source(index):
+    index.add('jira', 'PROJ-1', {'key': 'PROJ-1', 'summary': 'Login timeout', 'description': 'Users are logged out',
+                                 'comments': ['Seen again after the timeout change']})
+    index.add('jira', 'PROJ-2', {'key': 'PROJ-2', 'summary': 'Slow dashboard', 'description': 'A timeout in one chart',
+                                 'comments': []})
+    index.add('confluence', 'https://x.atlassian.net/wiki/spaces/ENG/pages/42', {
+        'id': '42', 'title': 'Runbook', 'content': '<p>Raise the <b>timeout</b> for PROJ-1</p>'})
+
+    hits = index.search('timeout')
+    assert [hit['id'] for hit in hits][0] == 'PROJ-1'  # The title match ranks first
+    assert {hit['id'] for hit in hits} == {'PROJ-1', 'PROJ-2', '42'}
+    assert hits[0]['score'] >= hits[1]['score'] >= hits[2]['score']
+    assert [hit['id'] for hit in index.search('timeout', sources=['confluence'])] == ['42']
+    # Confluence pages are indexed as text, and Jira keys match as a phrase
+    [page] = index.search('PROJ-1', sources=['confluence'])
+    assert page['snippet'] == 'Raise the timeout for [PROJ-1]'
+    assert page['url'] == 'https://x.atlassian.net/wiki/spaces/ENG/pages/42'
+    assert index.search('timeout chart') == index.search('chart timeout')
+    assert [hit['id'] for hit in index.search('chart timeout')] == ['PROJ-2']
+
+def test_documents_are_updated_in_place(index):
+    ticket = {'key': 'PROJ-1', 'summary': 'Login', 'description': 'old text', 'comments': []}
+    assert index.add('jira', 'PROJ-1', ticket)
+    assert not index.add('jira', 'PROJ-1', ticket)
+    assert index.add('jira', 'PROJ-1', dict(ticket, description='new text'))
+    assert index.count() == 1
+    assert index.search('old') == []
+    assert [hit['id'] for hit in index.search('new')] == ['PROJ-1']
+
+def test_raw_queries(index):
+    index.add_records([Record('jira', f'PROJ-{i}', f'Title {i}', 'migration' if i % 2 else 'rollback') for i in range(4)])
+    assert len(index.search('migration OR rollback', raw=True)) == 4
+    assert len(index.search('migr*', raw=True)) == 2
+    assert quote_query('say "hi" (now)') == '"say" """hi""" "(now)"'
+    with pytest.raises(ValueError, match='Invalid search query'):
+        index.search('AND OR', raw=True)
+
+class FakeReader:
+    def __init__(self, search_index):
+        self.search_index = search_index
+
+    @indexed('jira')
+    def read_ticket(self, key, fields=None):
+        if key == 'BROKEN-1':
+            raise ValueError("Issue does not exist")
+        return {'key': key, 'summary': f'Summary of {key}', 'description': 'body', 'comments': []}
+
+    @indexed('jira')
+    def read_tickets(self, keys):
+        for key in keys:
+            yield self.read_ticket.__wrapped__(self, key)
+
+    @indexed('confluence')
+    def read_page(self, url):
+        return {'error': 'Page not found'}
+
+def test_reader_methods_feed_the_index(index):
+    reader = FakeReader(index)
+    reader.read_ticket('PROJ-1')
+    assert list(reader.read_tickets(['PROJ-2', 'PROJ-3'])) and index.count('jira') == 3
+    reader.read_ticket('PROJ-4', fields=('title',))  # A partial read is not indexed
+    reader.read_page('https://x.atlassian.net/wiki/spaces/ENG/pages/1')
+    with pytest.raises(ValueError):
+        reader.read_ticket('BROKEN-1')
+    assert index.count() == 3
+    assert FakeReader(None).read_ticket('PROJ-5')['key'] == 'PROJ-5'
+
+def test_index_failures_do_not_fail_reads(index):
+    reader = FakeReader(index)
+    index.close()
+    assert reader.read_ticket('PROJ-1')['key'] == 'PROJ-1'
+    with pytest.raises(sqlite3.ProgrammingError):
+        index.count()
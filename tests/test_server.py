@@ -0,0 +1,134 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import json
+import time
+import socket
+import http.client
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from src.server import ReadServer, ServerClient, ServerError, parse_address, token_path
+
+class FakeReaders:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.calls = []
+
+    def read(self, source, ref):
+        self.calls.append((source, ref))
+        time.sleep(self.delay)
+        if ref == 'PROJ-404':
+            raise ValueError("Issue does not exist")
+        return {'source': source, 'ref': ref}
+
+def start(readers, address):
+    server = ReadServer(readers, address)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    return server, thread
+
+@pytest.fixture
+def tcp_server():
+    readers = FakeReaders(delay=0.2)
+    server, thread = start(readers, '127.0.0.1:0')
+    yield server, readers
+    server.shutdown()
+    thread.join(5)
+
+def test_parse_address():
+    assert parse_address('unix:/tmp/msr.sock') == ('unix', '/tmp/msr.sock')
+    assert parse_address('/tmp/msr.sock') == ('unix', '/tmp/msr.sock')
+    assert parse_address('localhost:8765') == ('tcp', ('localhost', 8765))
+    assert parse_address('8765') == ('tcp', ('127.0.0.1', 8765))
+    with pytest.raises(ValueError):
+        parse_address('localhost:http')
+
+def test_read_detects_the_source(tcp_server):
+    server, readers = tcp_server
+    client = ServerClient(server.url)
+    assert client.read(None, 'PROJ-1') == {'source': 'jira', 'ref': 'PROJ-1'}
+    assert client.health()['status'] == 'ok'
+
+def test_read_errors_are_raised_by_the_client(tcp_server):
+    server, _ = tcp_server
+    client = ServerClient(server.url)
+    with pytest.raises(ServerError, match='Issue does not exist'):
+        client.read('jira', 'PROJ-404')
+    with pytest.raises(ServerError, match='Invalid request'):
+        client.read(None, 'not a reference')
+
+def test_concurrent_clients_are_served_in_parallel(tcp_server):
+    server, readers = tcp_server
+    client = ServerClient(server.url)
+    start_time = time.monotonic()
+    with ThreadPoolExecutor(max_workers=5) as pool:
+        results = list(pool.map(lambda i: client.read('jira', f'PROJ-{i}'), range(5)))
+    # Five 0.2 s reads finish together
+    assert time.monotonic() - start_time < 0.8
+    assert [result['ref'] for result in results] == [f'PROJ-{i}' for i in range(5)]
+
+def test_requests_need_the_token_and_a_local_host(tcp_server):
+    server, readers = tcp_server
+    assert os.stat(token_path('tcp', server.address)).st_mode & 0o077 == 0
+
+    def post(headers):
+        connection = http.client.HTTPConnection(*server.address, timeout=5)
+        try:
+            connection.request('POST', '/read', body=json.dumps({'ref': 'PROJ-1'}),
+                               headers=dict(headers, **{'Content-Type': 'application/json'}))
+            return connection.getresponse().status
+        finally:
+            connection.close()
+
+    assert post({}) == 403
+    assert post({'Authorization': 'Bearer wrong'}) == 403
+    assert post({'Authorization': f'Bearer {server.token}', 'Host': 'attacker.example:8765'}) == 403
+    assert readers.calls == []
+    assert post({'Authorization': f'Bearer {server.token}', 'Host': f'localhost:{server.address[1]}'}) == 200
+    # A client without the token only learns that a server is there
+    client = ServerClient(server.url, token_file=os.devnull)
+    assert client.health()['status'] == 'ok'
+    with pytest.raises(ServerError, match='invalid server token'):
+        client.stats()
+
+def test_non_loopback_addresses_need_allow_remote():
+    with pytest.raises(ValueError, match='--allow-remote'):
+        ReadServer(FakeReaders(), '0.0.0.0:0')
+    server = ReadServer(FakeReaders(), '0.0.0.0:0', allow_remote=True)
+    server.close()
+    assert not os.path.exists(server.token_path)
+
+@pytest.mark.skipif(not hasattr(socket, 'AF_UNIX'), reason='Unix sockets are not available')
+def test_unix_socket_server_shuts_down_after_reads_in_flight(tmp_path):
+    path = str(tmp_path / 'server.sock')
+    readers = FakeReaders(delay=0.3)
+    server, thread = start(readers, path)
+    assert os.stat(path).st_mode & 0o077 == 0
+    client = ServerClient(path)
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        pending = pool.submit(client.read, 'jira', 'PROJ-1')
+        time.sleep(0.1)
+        assert client.shutdown()['status'] == 'shutting down'
+        assert pending.result() == {'source': 'jira', 'ref': 'PROJ-1'}
+    thread.join(5)
+    assert not thread.is_alive()
+    assert not os.path.exists(path)
+    assert not os.path.exists(path + '.token')
+    with pytest.raises(OSError):
+        client.health()
+
+@pytest.mark.skipif(not hasattr(socket, 'AF_UNIX'), reason='Unix sockets are not available')
+def test_stale_socket_is_replaced_but_a_live_server_is_not(tmp_path):
+    path = str(tmp_path / 'server.sock')
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stale.bind(path)
+    stale.close()
+    server, thread = start(FakeReaders(), path)
+    try:
+        with pytest.raises(RuntimeError, match='already listening'):
+            ReadServer(FakeReaders(), path)
+    finally:
+        server.shutdown()
+        thread.join(5)
@@ -0,0 +1,38 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+from unittest.mock import patch, MagicMock
+from src.sources import SourceReaders, detect_source
+
+@pytest.mark.parametrize('ref, source', [
+    ('https://github.com/owner/repo/pull/1', 'github'),
+    ('https://docs.google.com/spreadsheets/d/abc123/edit', 'google'),
+    ('https://test.atlassian.net/wiki/spaces/TEST/pages/123/Test+Page', 'confluence'),
+    ('PROJ-123', 'jira'),
+])
+def test_detect_source(ref, source):
+    assert detect_source(ref) == source
+
+def test_readers_are_built_once():
+    with patch('src.jira_ticket_reader.JiraAndConfluenceReader') as mock_reader:
+        mock_reader.return_value.read_ticket.return_value = {'key': 'PROJ-1'}
+        readers = SourceReaders()
+
+        assert readers.read('jira', 'PROJ-1') == {'key': 'PROJ-1'}
+        readers.read('jira', 'PROJ-2')
+        readers.get('confluence')
+
+        mock_reader.assert_called_once_with(cache=None, max_connections=None, scheduler=None, search_index=None)
+
+def test_confluence_errors_raise():
+    with patch('src.jira_ticket_reader.JiraAndConfluenceReader') as mock_reader:
+        mock_reader.return_value.read_confluence_page_by_url.return_value = {'error': 'Page not found'}
+        with pytest.raises(RuntimeError, match='Page not found'):
+            SourceReaders().read('confluence', 'https://test.atlassian.net/wiki/spaces/TEST/pages/1')
+
+def test_github_title_uses_match_mode():
+    with patch('src.github_pr_reader.GitHubPRReader') as mock_reader:
+        SourceReaders(title_match='prefix').read('github', 'Fix login')
+        mock_reader.return_value.read_pr_by_title.assert_called_once_with('Fix login', match='prefix', fields=None, patch_filter=None)
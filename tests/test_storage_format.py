@@ -0,0 +1,99 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+from src.storage_format import StorageConverter, convert_storage, iter_storage_text
+
+PAGE = '''<h1>Release &amp; rollout</h1><p>Read the <a href="https://example.com/plan">plan</a>
+and <ac:link><ri:page ri:content-title="Runbook" /></ac:link> first,&nbsp;<em>then</em> ship.</p>
+<ul><li>one</li><li>two<ol><li>nested</li></ol></li></ul>
+<ac:structured-macro ac:name="code" ac:schema-version="1"><ac:parameter ac:name="language">python</ac:parameter>
+<ac:plain-text-body><![CDATA[
+if a < b:
+
+    print("]]")
+]]></ac:plain-text-body></ac:structured-macro>
+<ac:structured-macro ac:name="warning"><ac:parameter ac:name="title">Careful</ac:parameter>
+<ac:rich-text-body><p>Back up first</p></ac:rich-text-body></ac:structured-macro>
+<table><tbody><tr><th>Step</th><th>Owner</th></tr>
+<tr><td><p>Deploy</p></td><td>ops<br/>| sre</td></tr></tbody></table>
+<ac:task-list><ac:task><ac:task-id>1</ac:task-id><ac:task-status>complete</ac:task-status>
+<ac:task-body>tag release</ac:task-body></ac:task><ac:task><ac:task-id>2</ac:task-id>
+<ac:task-status>incomplete</ac:task-status><ac:task-body>announce</ac:task-body></ac:task></ac:task-list>
+<p><ac:image><ri:attachment ri:filename="diagram.png" /></ac:image></p>'''
+
+MARKDOWN = '''# Release & rollout
+
+Read the [plan](https://example.com/plan) and Runbook first, *then* ship.
+
+- one
+- two
+  1. nested
+
+```python
+if a < b:
+
+    print("]]")
+```
+
+> Back up first
+
+| Step | Owner |
+| --- | --- |
+| Deploy | ops \\| sre |
+
+- [x] tag release
+- [ ] announce
+
+![](diagram.png)
+'''
+
+TEXT = '''Release & rollout
+
+Read the plan and Runbook first, then ship.
+
+* one
+* two
+  1. nested
+
+if a < b:
+
+    print("]]")
+
+Back up first
+
+Step\tOwner
+Deploy\tops | sre
+
+[x] tag release
+[ ] announce
+'''
+
+def test_markdown():
+    assert convert_storage(PAGE, 'markdown') == MARKDOWN
+
+def test_text():
+    assert convert_storage(PAGE, 'text') == TEXT
+
+def test_storage_is_unchanged():
+    assert convert_storage(PAGE, 'storage') is PAGE
+    with pytest.raises(ValueError):
+        convert_storage(PAGE, 'html')
+
+def test_chunk_boundaries_do_not_matter():
+    for size in (1, 7, 64):
+        assert convert_storage(PAGE, 'markdown', chunk_size=size) == MARKDOWN
+
+def test_output_streams_while_feeding():
+    converter = StorageConverter()
+    converter.feed('<p>first</p><p>sec')
+    assert converter.drain() == 'first\n'
+    converter.feed('ond</p>')
+    converter.close()
+    assert converter.drain() == '\nsecond\n'
+    assert list(iter_storage_text(['<pre>a\nb', '\nc</pre>'])) == ['a\n', 'b\nc\n']
+
+def test_nested_tables_are_flattened_into_the_cell():
+    page = '<table><tr><td>a<table><tr><td>in</td><td>ner</td></tr></table></td><td>b</td></tr></table><p>after</p>'
+    assert convert_storage(page, 'text') == 'a in ner\tb\n\nafter\n'
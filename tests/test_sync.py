@@ -0,0 +1,51 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import json
+from src.sync import SyncState, run_sync
+
+class FakeReaders:
+    def __init__(self, versions):
+        self.versions = versions
+        self.watermarks_seen = []
+
+    def sync(self, source, ref, watermark=None, since=None):
+        self.watermarks_seen.append((ref, watermark))
+        if ref == 'BROKEN-1':
+            raise ValueError("Issue does not exist")
+        version = self.versions[ref]
+        if watermark == {'version': version}:
+            return None, watermark
+        return {'version': version}, {'version': version}
+
+def test_sync_state_round_trip(tmp_path):
+    path = str(tmp_path / 'state' / 'sync.json')
+    state = SyncState(path)
+    assert state.get('jira', 'PROJ-1') is None
+    state.set('jira', 'PROJ-1', {'updated': 'x'})
+    state.save()
+
+    assert SyncState(path).get('jira', 'PROJ-1') == {'updated': 'x'}
+
+def test_sync_state_ignores_corrupt_file(tmp_path):
+    path = tmp_path / 'sync.json'
+    path.write_text('{not json')
+    assert SyncState(str(path)).watermarks == {}
+
+def test_run_sync_writes_only_changes(tmp_path):
+    path = str(tmp_path / 'sync.json')
+    readers = FakeReaders({'PROJ-1': 1, 'PROJ-2': 1})
+    entries = [('jira', 'PROJ-1'), ('jira', 'PROJ-2'), ('jira', 'BROKEN-1')]
+
+    records = []
+    assert run_sync(entries, readers, SyncState(path), write=records.append) == 1
+    assert sorted(record.get('changes', {}).get('version', 0) for record in records) == [0, 1, 1]
+
+    readers.versions['PROJ-2'] = 2
+    records = []
+    assert run_sync(entries[:2], readers, SyncState(path), write=records.append) == 0
+    assert records == [{'index': 1, 'source': 'jira', 'ref': 'PROJ-2', 'changes': {'version': 2}}]
+
+    with open(path) as f:
+        assert json.load(f)['watermarks'] == {'jira:PROJ-1': {'version': 1}, 'jira:PROJ-2': {'version': 2}}
@@ -0,0 +1,13 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from datetime import datetime, timezone
+from src.timestamps import parse_timestamp
+
+def test_parse_timestamp():
+    expected = datetime(2024, 1, 2, 3, 4, 5, tzinfo=timezone.utc)
+    assert parse_timestamp('2024-01-02T03:04:05Z') == expected
+    assert parse_timestamp('2024-01-02T03:04:05.000+0000') == expected
+    assert parse_timestamp('2024-01-02T03:04:05') == expected
+    assert parse_timestamp(datetime(2024, 1, 2, 3, 4, 5)) == expected